@@ -0,0 +1,307 @@
+# anomaly_detection/autoencoder.py
+
+import pickle
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import instrumented
+
+try:
+    import numba
+except ImportError:  # optional compiled kernel
+    numba = None
+
+
+class HalfSpaceTreesModel:
+    """
+    Online anomaly detector: Half-Space Trees (Tan, Ting & Liu, 2011).
+
+    Every tree is a complete binary tree of height `height` that halves
+    a random workspace around the (scaled) feature space; the splits do
+    not depend on the data. Each node counts the events that reached it
+    over the latest window_size events (latest mass); when a window is
+    full it becomes the reference mass the next windows are scored
+    against, so the model follows the traffic with one sliding window
+    of memory: n_trees * 2^(height + 1) counters, whatever the stream
+    length.
+
+    update() and score() cost n_trees * height steps per row, no refit.
+    A row's density is reference mass * 2^depth at its deepest node
+    still holding size_limit * window_size reference events; scores are
+    -log2 of the density ratio, normalized with the fit-time range like
+    IsolationForestModel (higher = more anomalous, in [0, 1]).
+
+    Features are sign-log compressed and scaled by their fit-time 1st /
+    99th percentiles, so heavy tails still spread over the workspace.
+
+    With numba the tree walks run compiled, one row at a time (scoring
+    stops at the first node under the size limit); without it they are
+    vectorized NumPy over (row, tree), level by level.
+    """
+
+    def __init__(
+        self,
+        n_trees: int = 25,
+        height: int = 10,
+        window_size: int = 16_384,
+        size_limit: float = 0.1,
+        random_state: int = 42,
+        chunk_size: int = 8192,
+        use_numba: Optional[bool] = None,
+    ):
+        self.n_trees = n_trees
+        self.height = height
+        self.window_size = window_size
+        self.size_limit = size_limit
+        self.random_state = random_state
+        self.chunk_size = chunk_size
+        if use_numba and numba is None:
+            raise ImportError("numba is not installed")
+        self.use_numba = numba is not None if use_numba is None else use_numba
+
+        self.n_nodes = 2 ** (height + 1) - 1
+        self.fitted = False
+        self.fitted_at = None
+        self.calibration = None
+        self.feature_names = None
+
+    @instrumented("half_space_trees_fit")
+    def fit(self, X: pd.DataFrame):
+        """
+        Build the trees and use X as the first reference window
+        """
+        if isinstance(X, pd.DataFrame):
+            self.feature_names = list(X.columns)
+
+        values = self._compress(np.asarray(X, dtype=np.float64))
+        lo, hi = np.percentile(values, [1, 99], axis=0)
+        self.scale = {"lo": lo, "span": np.where(hi > lo, hi - lo, 1.0)}
+
+        self._build_trees(values.shape[1])
+
+        Z = self._transform(X)
+        self.reference = np.zeros((self.n_trees, self.n_nodes))
+        self._count(self.reference, Z)
+        self.reference *= self.window_size / len(Z)
+        self.latest = np.zeros_like(self.reference)
+        self.window_count = 0
+
+        self.fitted = True
+        self.fitted_at = datetime.now(timezone.utc)
+
+        raw_scores = self._raw_scores(Z)
+        self.calibration = {
+            "min": float(raw_scores.min()),
+            "max": float(raw_scores.max()),
+        }
+        return self
+
+    @instrumented("half_space_trees_update")
+    def update(self, X: pd.DataFrame):
+        """
+        Count rows into the latest window; every window_size rows the
+        latest window becomes the reference
+        """
+        if not self.fitted:
+            raise RuntimeError("HalfSpaceTreesModel is not fitted")
+
+        Z = self._transform(X)
+        pos = 0
+        while pos < len(Z):
+            take = min(self.window_size - self.window_count, len(Z) - pos)
+            self._count(self.latest, Z[pos : pos + take])
+            self.window_count += take
+            pos += take
+
+            if self.window_count == self.window_size:
+                self.reference, self.latest = self.latest, np.zeros_like(self.latest)
+                self.window_count = 0
+
+    @instrumented("half_space_trees_score")
+    def score(self, X: pd.DataFrame) -> pd.Series:
+        """
+        Return normalized anomaly score ∈ [0, 1]
+        Higher = more anomalous
+        """
+        if not self.fitted:
+            raise RuntimeError("HalfSpaceTreesModel is not fitted")
+
+        raw_scores = self._raw_scores(self._transform(X))
+
+        min_s, max_s = self.calibration["min"], self.calibration["max"]
+        norm_scores = np.clip((raw_scores - min_s) / (max_s - min_s + 1e-6), 0, 1)
+
+        index = X.index if isinstance(X, pd.DataFrame) else None
+        return pd.Series(norm_scores, index=index)
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    @staticmethod
+    def _compress(values: np.ndarray) -> np.ndarray:
+        return np.sign(values) * np.log1p(np.abs(values))
+
+    def _transform(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None and not X.columns.equals(pd.Index(self.feature_names)):
+                X = X[self.feature_names]
+            X = X.to_numpy(dtype=np.float64)
+        values = self._compress(np.nan_to_num(np.asarray(X, dtype=np.float64)))
+        return (values - self.scale["lo"]) / self.scale["span"]
+
+    def _build_trees(self, n_features: int):
+        """
+        Split dimension / value per internal node, level by level
+        (children of node i are 2i + 1 and 2i + 2)
+        """
+        rng = np.random.default_rng(self.random_state)
+        n_internal = 2**self.height - 1
+        self.split_dim = np.empty((self.n_trees, n_internal), dtype=np.int64)
+        self.split_value = np.empty((self.n_trees, n_internal))
+
+        for tree in range(self.n_trees):
+            # Random workspace enclosing [0, 1] on every dimension
+            sq = rng.random(n_features)
+            span = 2 * np.maximum(sq, 1 - sq)
+            mins, maxs = (sq - span)[None, :], (sq + span)[None, :]
+
+            for level in range(self.height):
+                nodes = np.arange(len(mins))
+                dims = rng.integers(n_features, size=len(mins))
+                mids = (mins[nodes, dims] + maxs[nodes, dims]) / 2
+
+                first = 2**level - 1
+                self.split_dim[tree, first : first + len(mins)] = dims
+                self.split_value[tree, first : first + len(mins)] = mids
+
+                left_maxs, right_mins = maxs.copy(), mins.copy()
+                left_maxs[nodes, dims] = mids
+                right_mins[nodes, dims] = mids
+
+                mins, maxs = np.repeat(mins, 2, axis=0), np.repeat(maxs, 2, axis=0)
+                maxs[0::2] = left_maxs
+                mins[1::2] = right_mins
+
+    def _paths(self, Z: np.ndarray) -> np.ndarray:
+        """Node per (level, row, tree), root to leaf"""
+        rows = np.arange(len(Z))[:, None]
+        trees = np.arange(self.n_trees)[None, :]
+
+        node = np.zeros((len(Z), self.n_trees), dtype=np.int64)
+        paths = np.empty((self.height + 1, len(Z), self.n_trees), dtype=np.int64)
+        paths[0] = node
+        for level in range(self.height):
+            go_right = Z[rows, self.split_dim[trees, node]] >= self.split_value[trees, node]
+            node = 2 * node + 1 + go_right
+            paths[level + 1] = node
+        return paths
+
+    def _count(self, mass: np.ndarray, Z: np.ndarray):
+        """Add every row's path to mass (n_trees, n_nodes), in place"""
+        if self.use_numba:
+            _count_numba(Z, self.split_dim, self.split_value, self.height, mass)
+            return
+
+        flat = mass.reshape(-1)
+        offsets = np.arange(self.n_trees) * self.n_nodes
+        for start in range(0, len(Z), self.chunk_size):
+            nodes = (self._paths(Z[start : start + self.chunk_size]) + offsets).ravel()
+            # bincount allocates the full table: only worth it for big batches
+            if len(nodes) < len(flat) // 8:
+                np.add.at(flat, nodes, 1)
+            else:
+                flat += np.bincount(nodes, minlength=len(flat))
+
+    def _raw_scores(self, Z: np.ndarray) -> np.ndarray:
+        trees = np.arange(self.n_trees)[None, :]
+        limit = self.size_limit * self.window_size
+
+        if self.use_numba:
+            density = np.empty(len(Z))
+            _density_numba(Z, self.split_dim, self.split_value, self.height, self.reference, limit, density)
+            return np.log2(self.window_size) - np.log2(density + 1)
+
+        out = np.empty(len(Z))
+        for start in range(0, len(Z), self.chunk_size):
+            paths = self._paths(Z[start : start + self.chunk_size])
+            density = np.zeros(paths.shape[1:])
+            done = np.zeros(paths.shape[1:], dtype=bool)
+
+            # Mass * 2^depth at the first node below the size limit (or leaf)
+            for level, node in enumerate(paths):
+                mass = self.reference[trees, node]
+                stop = ~done & ((mass < limit) | (level == self.height))
+                density[stop] = mass[stop] * 2.0**level
+                done |= stop
+
+            out[start : start + len(density)] = (
+                np.log2(self.window_size) - np.log2(density.mean(axis=1) + 1)
+            )
+        return out
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+    def __setstate__(self, state):
+        # A pickle from a machine with numba must load without it
+        self.__dict__.update(state)
+        self.use_numba = self.use_numba and numba is not None
+
+    def save(self, path="data/half_space_trees.pkl"):
+        if not self.fitted:
+            raise RuntimeError("HalfSpaceTreesModel is not fitted")
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path="data/half_space_trees.pkl"):
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+# ------------------------------
+# Compiled tree walks (numba)
+# ------------------------------
+if numba is not None:
+
+    @numba.njit(cache=True, nogil=True)
+    def _count_numba(Z, split_dim, split_value, height, mass):
+        for i in range(Z.shape[0]):
+            for tree in range(split_dim.shape[0]):
+                node = 0
+                mass[tree, 0] += 1
+                for _ in range(height):
+                    node = 2 * node + (2 if Z[i, split_dim[tree, node]] >= split_value[tree, node] else 1)
+                    mass[tree, node] += 1
+
+    @numba.njit(cache=True, nogil=True)
+    def _density_numba(Z, split_dim, split_value, height, reference, limit, out):
+        n_trees = split_dim.shape[0]
+        for i in range(Z.shape[0]):
+            total = 0.0
+            for tree in range(n_trees):
+                node = 0
+                level = 0
+                while reference[tree, node] >= limit and level < height:
+                    node = 2 * node + (2 if Z[i, split_dim[tree, node]] >= split_value[tree, node] else 1)
+                    level += 1
+                total += reference[tree, node] * 2.0**level
+            out[i] = total / n_trees
+
+else:
+    _count_numba = None
+    _density_numba = None
@@ -0,0 +1,208 @@
+# anomaly_detection/forest_kernel.py
+
+from typing import Dict, Optional
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+try:
+    import numba
+except ImportError:  # optional compiled kernel
+    numba = None
+
+
+ARRAY_NAMES = ("feature", "threshold", "left", "right", "leaf_value", "roots")
+
+
+def average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    """
+    Average path length of an unsuccessful BST search over n samples
+    (same formula as sklearn's isolation forest)
+    """
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+
+    result[n_samples == 2] = 1.0
+    rest = n_samples > 2
+    result[rest] = (
+        2.0 * (np.log(n_samples[rest] - 1.0) + np.euler_gamma)
+        - 2.0 * (n_samples[rest] - 1.0) / n_samples[rest]
+    )
+    return result
+
+
+class FlatForest:
+    """
+    A fitted IsolationForest flattened into contiguous node arrays.
+
+    All trees share one set of arrays (global node ids). Leaves point
+    to themselves, so every row can take exactly max_depth steps in
+    lock-step. leaf_value holds the path length credited at each leaf:
+    depth + average_path_length(n_node_samples) - 1, with root depth 1.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        left: np.ndarray,
+        right: np.ndarray,
+        leaf_value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        denominator: float,
+        n_features: int,
+        use_numba: Optional[bool] = None,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.denominator = float(denominator)
+        self.n_features = int(n_features)
+
+        self._children = None
+        self._feature = None
+
+        if use_numba and numba is None:
+            raise ImportError("numba is not installed")
+        self.use_numba = numba is not None if use_numba is None else use_numba
+
+    # ------------------------------
+    # Construction
+    # ------------------------------
+    @classmethod
+    def from_sklearn(cls, model: IsolationForest, use_numba: Optional[bool] = None):
+        subsample_features = model._max_features != model.n_features_in_
+
+        feature, threshold, left, right, leaf_value, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+
+        for estimator, features in zip(model.estimators_, model.estimators_features_):
+            tree = estimator.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+
+            # Root has depth 1, as in sklearn's decision path lengths
+            depth = tree.compute_node_depths().astype(np.float64)
+
+            tree_feature = np.where(is_leaf, 0, tree.feature)
+            if subsample_features:
+                tree_feature = np.asarray(features)[tree_feature]
+
+            self_ids = np.arange(offset, offset + n)
+            feature.append(tree_feature)
+            threshold.append(tree.threshold)
+            left.append(np.where(is_leaf, self_ids, tree.children_left + offset))
+            right.append(np.where(is_leaf, self_ids, tree.children_right + offset))
+            leaf_value.append(
+                depth + average_path_length(tree.n_node_samples) - 1.0
+            )
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        denominator = len(model.estimators_) * average_path_length(
+            np.array([model.max_samples_])
+        )[0]
+
+        return cls(
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            leaf_value=np.concatenate(leaf_value),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            denominator=denominator,
+            n_features=model.n_features_in_,
+            use_numba=use_numba,
+        )
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {name: getattr(self, name) for name in ARRAY_NAMES}
+
+    def meta(self) -> dict:
+        return {
+            "max_depth": self.max_depth,
+            "denominator": self.denominator,
+            "n_features": self.n_features,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], meta: dict, use_numba=None):
+        return cls(**{name: arrays[name] for name in ARRAY_NAMES}, **meta, use_numba=use_numba)
+
+    # ------------------------------
+    # Scoring
+    # ------------------------------
+    def score_samples(self, X, chunk_size: int = 512) -> np.ndarray:
+        """
+        Same values as IsolationForest.score_samples (higher = more normal)
+        """
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32))
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"Expected {self.n_features} features, got shape {X.shape}"
+            )
+
+        if self.use_numba:
+            depths = _depths_numba(
+                X, self.feature, self.threshold, self.left, self.right,
+                self.leaf_value, self.roots, self.max_depth,
+            )
+        else:
+            depths = np.concatenate(
+                [
+                    self._depths_numpy(X[i : i + chunk_size])
+                    for i in range(0, max(len(X), 1), chunk_size)
+                ]
+            )[: len(X)]
+
+        return -(2 ** (-np.divide(depths, self.denominator)))
+
+    def _depths_numpy(self, X: np.ndarray) -> np.ndarray:
+        if self._children is None:
+            # children[2 * node + went_right]: one gather per step
+            self._children = np.stack([self.left, self.right], axis=1).ravel().astype(np.intp)
+            self._feature = self.feature.astype(np.intp)
+
+        flat_X = X.ravel()
+        row_base = np.arange(len(X), dtype=np.intp) * X.shape[1]
+        nodes = np.repeat(self.roots.astype(np.intp)[:, None], len(X), axis=1)
+
+        for _ in range(self.max_depth):
+            went_right = flat_X[row_base + self._feature[nodes]] > self.threshold[nodes]
+            nodes = self._children[2 * nodes + went_right]
+
+        # Accumulate tree by tree, in estimator order, like sklearn
+        values = self.leaf_value[nodes]
+        if values.shape[1] == 0:
+            return np.zeros(0)
+        return np.cumsum(values, axis=0)[-1]
+
+
+if numba is not None:
+
+    @numba.njit(cache=True, nogil=True)
+    def _depths_numba(X, feature, threshold, left, right, leaf_value, roots, max_depth):
+        n_rows = X.shape[0]
+        depths = np.zeros(n_rows)
+        for t in range(roots.shape[0]):
+            for i in range(n_rows):
+                node = roots[t]
+                for _ in range(max_depth):
+                    if X[i, feature[node]] <= threshold[node]:
+                        node = left[node]
+                    else:
+                        node = right[node]
+                depths[i] += leaf_value[node]
+        return depths
+
+else:
+    _depths_numba = None
@@ -1,45 +1,165 @@
 # anomaly_detection/isolation_forest.py
 
+import pickle
+from datetime import datetime
+from pathlib import Path
+
 import numpy as np
 import pandas as pd
 from sklearn.ensemble import IsolationForest
 
+from anomaly_detection.forest_kernel import FlatForest
+from utils.metrics import instrumented
+
+
+BACKENDS = ("auto", "sklearn", "flat")
+
 
 class IsolationForestModel:
+    # "auto" uses the flat kernel up to this many rows, sklearn above
+    FLAT_MAX_ROWS = 4096
+
     def __init__(
         self,
         n_estimators: int = 200,
         contamination: float = 0.02,
         random_state: int = 42,
+        backend: str = "auto",
     ):
+        """
+        backend:
+          sklearn - IsolationForest.score_samples
+          flat    - array-based kernel (numba when installed), same scores
+          auto    - flat for micro-batches, sklearn for large batches
+        """
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown scoring backend: {backend}")
+
         self.model = IsolationForest(
             n_estimators=n_estimators,
             contamination=contamination,
             random_state=random_state,
             n_jobs=-1,
         )
+        self.backend = backend
+        self.kernel = None
         self.fitted = False
+        self.fitted_at = None
 
+        # Raw score range seen at fit time, used to normalize every
+        # later batch with the same constants
+        self.calibration = None
+
+    @instrumented("isolation_forest_fit")
     def fit(self, X: pd.DataFrame):
         """
         Train Isolation Forest on normal traffic
         """
         self.model.fit(X)
         self.fitted = True
+        self.fitted_at = datetime.utcnow()
+        self.kernel = None if self.backend == "sklearn" else FlatForest.from_sklearn(self.model)
+
+        raw_scores = self._raw_scores(X)
+        self.calibration = {
+            "min": float(raw_scores.min()),
+            "max": float(raw_scores.max()),
+        }
 
+    @instrumented("isolation_forest_score")
     def score(self, X: pd.DataFrame) -> pd.Series:
         """
         Return normalized anomaly score ∈ [0, 1]
         Higher = more anomalous
+
+        Normalization uses the fit-time calibration, so a row scores
+        the same whatever else is in its batch.
         """
         if not self.fitted:
             raise RuntimeError("IsolationForestModel is not fitted")
 
-        # sklearn: higher = more normal → invert
-        raw_scores = -self.model.score_samples(X)
+        raw_scores = self._raw_scores(X)
 
-        # Min-max normalization
-        min_s, max_s = raw_scores.min(), raw_scores.max()
-        norm_scores = (raw_scores - min_s) / (max_s - min_s + 1e-6)
+        # Min-max normalization against the training score range
+        min_s, max_s = self.calibration["min"], self.calibration["max"]
+        norm_scores = np.clip((raw_scores - min_s) / (max_s - min_s + 1e-6), 0, 1)
 
         return pd.Series(norm_scores, index=X.index)
+
+    def _raw_scores(self, X: pd.DataFrame) -> np.ndarray:
+        use_kernel = self.kernel is not None and (
+            self.backend == "flat" or len(X) <= self.FLAT_MAX_ROWS
+        )
+
+        # sklearn: higher = more normal → invert
+        if not use_kernel:
+            return -self.model.score_samples(X)
+
+        names = getattr(self.model, "feature_names_in_", None)
+        if isinstance(X, pd.DataFrame) and names is not None:
+            X = X[list(names)]
+
+        return -self.kernel.score_samples(np.asarray(X))
+
+    @classmethod
+    def from_fitted(
+        cls,
+        model: IsolationForest,
+        calibration: dict,
+        fitted_at=None,
+        backend: str = "auto",
+        kernel: FlatForest = None,
+    ) -> "IsolationForestModel":
+        """Wrap an already fitted sklearn IsolationForest (used by loaders)"""
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown scoring backend: {backend}")
+
+        instance = cls.__new__(cls)
+        instance.model = model
+        instance.backend = backend
+        instance.kernel = None
+        if backend != "sklearn":
+            instance.kernel = kernel or FlatForest.from_sklearn(model)
+        instance.calibration = calibration
+        instance.fitted_at = fitted_at
+        instance.fitted = True
+        return instance
+
+    # ------------------------------
+    # Persistence
+    # ------------------------------
+    def save(self, path="data/isolation_forest.pkl"):
+        if not self.fitted:
+            raise RuntimeError("IsolationForestModel is not fitted")
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {
+                    "model": self.model,
+                    "calibration": self.calibration,
+                    "fitted_at": self.fitted_at,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path="data/isolation_forest.pkl", backend: str = "auto"):
+        path = Path(path)
+        if not path.exists():
+            return None
+
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+
+        return cls.from_fitted(
+            state["model"],
+            state["calibration"],
+            fitted_at=state["fitted_at"],
+            backend=backend,
+        )
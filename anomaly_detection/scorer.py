@@ -1,7 +1,11 @@
 # anomaly_detection/scorer.py
 
+import numpy as np
 import pandas as pd
-from typing import Dict
+from typing import Dict, Optional
+
+from anomaly_detection.thresholds import AdaptiveThresholds
+from utils.metrics import instrumented
 
 
 class AnomalyScorer:
@@ -10,33 +14,81 @@ class AnomalyScorer:
         if_weight: float = 0.6,
         baseline_weight: float = 0.4,
         anomaly_threshold: float = 0.75,
+        online_weight: float = 0.0,
+        thresholds: Optional[AdaptiveThresholds] = None,
     ):
-        assert abs(if_weight + baseline_weight - 1.0) < 1e-6
+        """
+        online_weight: share of an online detector's score
+        (HalfSpaceTreesModel); batches scored without one blend the
+        other two with their weights rescaled to sum to 1
+
+        thresholds: adaptive per-key alert cutoffs; anomaly_threshold is
+        then only used until they have seen enough rows
+        """
+        assert abs(if_weight + baseline_weight + online_weight - 1.0) < 1e-6
         self.if_weight = if_weight
         self.baseline_weight = baseline_weight
+        self.online_weight = online_weight
         self.anomaly_threshold = anomaly_threshold
+        self.thresholds = thresholds
 
+    @instrumented("scorer")
     def score(
         self,
         if_scores: pd.Series,
         baseline_scores: pd.Series,
+        online_scores: Optional[pd.Series] = None,
+        keys=None,
     ) -> pd.DataFrame:
         """
-        Combine Isolation Forest + baseline deviation
+        Combine Isolation Forest + baseline deviation (+ online detector)
+
+        keys: per-row threshold key (e.g. uri_path), adaptive thresholds only
         """
+        if online_scores is None:
+            scale = self.if_weight + self.baseline_weight
+            final_score = (
+                self.if_weight / scale * if_scores
+                + self.baseline_weight / scale * baseline_scores
+            )
+        else:
+            final_score = (
+                self.if_weight * if_scores
+                + self.baseline_weight * baseline_scores
+                + self.online_weight * online_scores
+            )
 
-        final_score = (
-            self.if_weight * if_scores
-            + self.baseline_weight * baseline_scores
-        )
+        columns = {
+            "if_score": if_scores,
+            "baseline_score": baseline_scores,
+        }
+        if online_scores is not None:
+            columns["online_score"] = online_scores
+
+        threshold = self.cutoffs(final_score, keys)
 
         result = pd.DataFrame(
             {
-                "if_score": if_scores,
-                "baseline_score": baseline_scores,
+                **columns,
                 "final_score": final_score,
-                "is_anomaly": final_score > self.anomaly_threshold,
+                "is_anomaly": final_score > threshold,
             }
         )
+        if self.thresholds is not None:
+            result["threshold"] = threshold
 
         return result
+
+    def cutoffs(self, final_score: pd.Series, keys=None):
+        """
+        Alert cutoff for each row: the fixed anomaly_threshold, or the
+        adaptive thresholds as they were before this batch (which is
+        then counted into them)
+        """
+        if self.thresholds is None:
+            return self.anomaly_threshold
+
+        values = np.asarray(final_score, dtype=np.float64)
+        threshold = self.thresholds.cutoffs(len(values), keys, default=self.anomaly_threshold)
+        self.thresholds.update(values, keys)
+        return threshold
@@ -0,0 +1,255 @@
+# anomaly_detection/scoring_service.py
+
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import pandas as pd
+
+from anomaly_detection.autoencoder import HalfSpaceTreesModel
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.scorer import AnomalyScorer
+from baseline.baseline_trainer import BaselineTrainer
+from storage.models import ModelRegistry
+from training.retrain_pipeline import RetrainService
+from training.retraining_hooks import RetrainingHooks
+from training.train_baseline import train_baseline
+
+
+class ScoringService:
+    """
+    Long-running scorer for micro-batches of feature rows.
+
+    The hot path only calls score(): a persisted, already fitted model
+    with fixed calibration, no refit and no batch renormalization.
+    Refits run in a background thread when RetrainingHooks says so,
+    on a bounded window of recently scored rows, update the baseline
+    (rebuilt from the window when drift triggered them), are published
+    to the model registry and swapped in by replacing the model and
+    baseline references.
+    With a RetrainService the refit runs in a separate, lower-priority
+    process instead and a model is only swapped in once it passed
+    holdout validation.
+
+    An optional online model (HalfSpaceTreesModel) is scored with every
+    batch and then learns from the rows that were not flagged, so
+    attacks do not become the reference traffic. An unfitted one is
+    fitted once the remembered history holds a window of rows.
+
+    With adaptive thresholds on the scorer, alert cutoffs follow the
+    stream row by row; their state is published with every refit.
+    """
+
+    def __init__(
+        self,
+        if_model: IsolationForestModel,
+        baseline_trainer: BaselineTrainer,
+        scorer: Optional[AnomalyScorer] = None,
+        hooks: Optional[RetrainingHooks] = None,
+        registry: Optional[ModelRegistry] = None,
+        check_interval: float = 60.0,
+        history_rows: int = 50_000,
+        online_model: Optional[HalfSpaceTreesModel] = None,
+        retrainer: Optional[RetrainService] = None,
+        group_by: Optional[str] = None,
+    ):
+        """
+        group_by: feature grouping the model is trained on (per-src_ip
+        windows, see ShardedPipeline); recorded with every refit and
+        used to build the matching FeatureExtractor
+        """
+        if not if_model.fitted:
+            raise RuntimeError("ScoringService needs a fitted IsolationForestModel")
+
+        self.if_model = if_model
+        self.baseline_trainer = baseline_trainer
+        self.scorer = scorer or AnomalyScorer()
+        self.hooks = hooks or RetrainingHooks()
+        self.registry = registry
+        self.check_interval = check_interval
+        self.history_rows = history_rows
+        self.online_model = online_model
+        self.retrainer = retrainer
+        self.group_by = group_by
+
+        # The persisted model counts as the last retrain
+        if self.hooks.last_retrain is None:
+            self.hooks.last_retrain = if_model.fitted_at
+
+        self._history = deque()
+        self._history_len = 0
+        self._baseline_score_sum = 0.0
+        self._scored = 0
+        self._last_check = time.monotonic()
+        self._refit_thread = None
+
+    @classmethod
+    def load(
+        cls,
+        registry: Optional[ModelRegistry] = None,
+        group_by: Optional[str] = None,
+        **kwargs,
+    ) -> "ScoringService":
+        """
+        Warm start from the live registry version: no fit on startup.
+        Refuses a model trained on another feature grouping than group_by
+        (its features would not match the caller's extractor).
+        """
+        registry = registry or ModelRegistry()
+        bundle = registry.load()
+        if bundle is None:
+            raise FileNotFoundError(f"No published model in {registry.root}")
+        if bundle.metadata.get("group_by") != group_by:
+            raise ValueError(
+                f"Model {bundle.version} in {registry.root} was trained with "
+                f"group_by={bundle.metadata.get('group_by')!r}, expected group_by={group_by!r}"
+            )
+
+        baseline_trainer = BaselineTrainer()
+        baseline_trainer.baseline = bundle.baseline
+
+        # An adaptive scorer resumes from the persisted threshold state
+        scorer = kwargs.get("scorer")
+        if scorer is not None and scorer.thresholds is not None and bundle.thresholds is not None:
+            scorer.thresholds = bundle.thresholds
+
+        return cls(bundle.if_model, baseline_trainer, registry=registry, group_by=group_by, **kwargs)
+
+    # ------------------------------
+    # Hot path
+    # ------------------------------
+    def score(self, ml_features: pd.DataFrame, keys=None) -> pd.DataFrame:
+        """
+        Score a micro-batch of ml_features rows
+        (keys: per-row threshold key, see AnomalyScorer.score)
+        """
+        if_model = self.if_model  # one consistent model per batch
+        baseline_trainer = self.baseline_trainer
+        online_model = self.online_model
+
+        baseline_scores = baseline_trainer.score_deviation(ml_features)
+        online_scores = None
+        if online_model is not None and online_model.fitted:
+            online_scores = online_model.score(ml_features)
+
+        results = self.scorer.score(
+            if_model.score(ml_features), baseline_scores, online_scores, keys=keys
+        )
+
+        self._remember(ml_features, baseline_scores)
+        if online_model is not None:
+            self._learn_online(online_model, ml_features, results["is_anomaly"].to_numpy(dtype=bool))
+        return results
+
+    def _learn_online(self, online_model: HalfSpaceTreesModel, ml_features: pd.DataFrame, is_anomaly):
+        if online_model.fitted:
+            online_model.update(ml_features[~is_anomaly])
+        elif self._history_len >= online_model.window_size:
+            online_model.fit(pd.concat(list(self._history)))
+
+    def _remember(self, ml_features: pd.DataFrame, baseline_scores: pd.Series):
+        self._history.append(ml_features)
+        self._history_len += len(ml_features)
+        while self._history_len - len(self._history[0]) >= self.history_rows:
+            self._history_len -= len(self._history.popleft())
+
+        self._baseline_score_sum += float(baseline_scores.sum())
+        self._scored += len(baseline_scores)
+
+    # ------------------------------
+    # Refit schedule
+    # ------------------------------
+    def maybe_refit(self, fp_rate: float = 0.0, now=None) -> bool:
+        """
+        Cheap check, meant to be called from the scoring loop.
+        Starts a background refit when one is due; returns True if so.
+        """
+        if time.monotonic() - self._last_check < self.check_interval:
+            return False
+        self._last_check = time.monotonic()
+
+        if self.refitting or not self._history:
+            return False
+
+        avg_baseline_score = self._baseline_score_sum / max(self._scored, 1)
+        trigger = self.hooks.trigger(
+            fp_rate=fp_rate,
+            avg_baseline_score=avg_baseline_score,
+            now=now,
+        )
+        if trigger is None:
+            return False
+
+        history = pd.concat(list(self._history))
+        if self.retrainer is not None:
+            return self.retrainer.submit(
+                history,
+                self.if_model,
+                self.baseline_trainer.get_baseline(),
+                thresholds=self.scorer.thresholds,
+                trigger=trigger,
+                metadata={"group_by": self.group_by},
+                on_done=self._swap_in,
+            )
+
+        self._refit_thread = threading.Thread(
+            target=self._refit, args=(history, trigger), daemon=True
+        )
+        self._refit_thread.start()
+        return True
+
+    @property
+    def refitting(self) -> bool:
+        if self.retrainer is not None and self.retrainer.busy:
+            return True
+        return self._refit_thread is not None and self._refit_thread.is_alive()
+
+    def wait_for_refit(self, timeout: Optional[float] = None):
+        if self.retrainer is not None:
+            self.retrainer.wait(timeout)
+        if self._refit_thread is not None:
+            self._refit_thread.join(timeout)
+
+    def _swap_in(self, result: dict):
+        """RetrainService callback: adopt a model that passed validation"""
+        if result["model"] is None:
+            return
+        self._adopt(result["model"], result["baseline"], result["trigger"])
+
+    def _adopt(self, model: IsolationForestModel, baseline, trigger: Optional[str]):
+        baseline_trainer = BaselineTrainer()
+        baseline_trainer.baseline = baseline
+
+        self.if_model = model
+        self.baseline_trainer = baseline_trainer
+        self.hooks.mark_retrained(trigger)
+        self._baseline_score_sum = 0.0
+        self._scored = 0
+
+    def _refit(self, history: pd.DataFrame, trigger: Optional[str] = None):
+        params = self.if_model.model.get_params()
+        model = IsolationForestModel(
+            n_estimators=params["n_estimators"],
+            contamination=params["contamination"],
+            random_state=params["random_state"],
+        )
+        model.fit(history)
+        # Same baseline policy as RetrainService: rebuilt on drift
+        previous = None if trigger == "drift" else self.baseline_trainer.get_baseline()
+        baseline = train_baseline(history, previous=previous)
+
+        if self.registry is not None:
+            self.registry.publish(
+                model,
+                baseline,
+                feature_names=list(history.columns),
+                metadata={
+                    "trigger": trigger or "scheduled_refit",
+                    "rows": len(history),
+                    "group_by": self.group_by,
+                },
+                thresholds=self.scorer.thresholds,
+            )
+
+        self._adopt(model, baseline, trigger)
@@ -0,0 +1,168 @@
+# anomaly_detection/thresholds.py
+
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class AdaptiveThresholds:
+    """
+    Alert cutoffs from running, decaying quantiles of final_score,
+    globally and per key (e.g. endpoint).
+
+    Scores in [0, 1] are counted into fixed-width histograms; the cutoff
+    is the (1 - target_rate) quantile, so the expected alert rate stays
+    at target_rate whatever the score scale or batch composition. Keys
+    with less than min_weight (decayed) rows use the global cutoff, and
+    the global histogram uses the caller's default until it has that
+    much itself.
+
+    Decay is lazy: instead of scaling every histogram down, each new row
+    weighs growth = 2^(1 / half_life) times the previous one, so an
+    update costs O(1) per row whatever the number of keys. Weights are
+    rescaled before they overflow.
+    """
+
+    def __init__(
+        self,
+        target_rate: float = 0.01,
+        half_life: float = 100_000,
+        bins: int = 256,
+        min_weight: float = 1_000,
+        max_keys: int = 10_000,
+    ):
+        self.target_rate = target_rate
+        self.half_life = half_life
+        self.bins = bins
+        self.min_weight = min_weight
+        self.max_keys = max_keys
+
+        self.growth = 2.0 ** (1.0 / half_life)
+        self.scale = 1.0  # weight of the next row
+        self.global_counts = np.zeros(bins)
+        self.keys: Dict[str, int] = {}
+        self.counts = np.zeros((0, bins))
+
+    def update(self, scores, keys=None):
+        """Count a batch of scored rows (keys: one per row, or None)"""
+        scores = np.asarray(scores, dtype=np.float64)
+        if len(scores) == 0:
+            return
+
+        weights = self.scale * self.growth ** np.arange(len(scores))
+        self.scale *= self.growth ** len(scores)
+
+        bins = self._bins(scores)
+        self.global_counts += np.bincount(bins, weights=weights, minlength=self.bins)
+
+        if keys is not None:
+            codes = self._codes(keys, add=True)
+            known = codes >= 0
+            np.add.at(self.counts, (codes[known], bins[known]), weights[known])
+
+        # Relative weights are all that matter: rescale long before overflow
+        if self.scale > 1e100:
+            self.global_counts /= self.scale
+            self.counts /= self.scale
+            self.scale = 1.0
+
+    def cutoffs(self, n: int, keys=None, default: float = 0.75) -> np.ndarray:
+        """Alert cutoff per row for the next n rows"""
+        cutoff = default
+        if self.weight() >= self.min_weight:
+            cutoff = float(self._quantiles(self.global_counts[None, :])[0])
+
+        out = np.full(n, cutoff)
+        if keys is None or not self.keys:
+            return out
+
+        codes = self._codes(keys, add=False)
+        present = np.unique(codes[codes >= 0])
+        if len(present) == 0:
+            return out
+
+        counts = self.counts[present]
+        enough = counts.sum(axis=1) / self.scale >= self.min_weight
+        per_key = np.full(len(self.keys), np.nan)
+        per_key[present[enough]] = self._quantiles(counts[enough])
+
+        found = codes >= 0
+        values = per_key[codes[found]]
+        out[found] = np.where(np.isnan(values), cutoff, values)
+        return out
+
+    def weight(self, key: Optional[str] = None) -> float:
+        """Decayed number of rows seen (globally or for one key)"""
+        if key is None:
+            return float(self.global_counts.sum() / self.scale)
+        code = self.keys.get(key)
+        return 0.0 if code is None else float(self.counts[code].sum() / self.scale)
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    def _bins(self, scores: np.ndarray) -> np.ndarray:
+        return np.clip((np.nan_to_num(scores) * self.bins).astype(np.int64), 0, self.bins - 1)
+
+    def _codes(self, keys, add: bool) -> np.ndarray:
+        """Row -> histogram row; -1 for unknown keys (or past max_keys)"""
+        keys = np.asarray(keys, dtype=object)
+        uniques, inverse = np.unique(keys.astype(str), return_inverse=True)
+
+        codes = np.empty(len(uniques), dtype=np.int64)
+        for i, key in enumerate(uniques.tolist()):
+            code = self.keys.get(key)
+            if code is None and add and len(self.keys) < self.max_keys:
+                code = self.keys[key] = len(self.keys)
+            codes[i] = -1 if code is None else code
+
+        if len(self.keys) > len(self.counts):
+            grown = np.zeros((max(len(self.keys), 2 * len(self.counts)), self.bins))
+            grown[: len(self.counts)] = self.counts
+            self.counts = grown
+
+        return codes[inverse]
+
+    def _quantiles(self, counts: np.ndarray) -> np.ndarray:
+        """(1 - target_rate) quantile per histogram row, linear inside a bin"""
+        cumulative = np.cumsum(counts, axis=1)
+        rank = (1.0 - self.target_rate) * cumulative[:, -1:]
+
+        index = np.minimum((cumulative < rank).sum(axis=1), self.bins - 1)
+        rows = np.arange(len(counts))
+        below = np.where(index > 0, cumulative[rows, np.maximum(index - 1, 0)], 0.0)
+        in_bin = counts[rows, index]
+        fraction = np.where(in_bin > 0, (rank[:, 0] - below) / np.where(in_bin > 0, in_bin, 1), 0.0)
+
+        return (index + np.clip(fraction, 0.0, 1.0)) / self.bins
+
+    # ------------------------------
+    # Serialization (via ModelRegistry)
+    # ------------------------------
+    def state_dict(self) -> dict:
+        return {
+            "target_rate": self.target_rate,
+            "half_life": self.half_life,
+            "bins": self.bins,
+            "min_weight": self.min_weight,
+            "max_keys": self.max_keys,
+            "scale": self.scale,
+            "global_counts": self.global_counts.copy(),
+            "keys": np.array(list(self.keys), dtype=str),
+            "counts": self.counts[: len(self.keys)].copy(),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "AdaptiveThresholds":
+        thresholds = cls(
+            target_rate=float(state["target_rate"]),
+            half_life=float(state["half_life"]),
+            bins=int(state["bins"]),
+            min_weight=float(state["min_weight"]),
+            max_keys=int(state["max_keys"]),
+        )
+        thresholds.scale = float(state["scale"])
+        thresholds.global_counts = np.array(state["global_counts"], dtype=np.float64)
+        thresholds.keys = {key: i for i, key in enumerate(np.asarray(state["keys"]).tolist())}
+        thresholds.counts = np.array(state["counts"], dtype=np.float64).reshape(-1, thresholds.bins)
+        return thresholds
@@ -0,0 +1,150 @@
+# api/batcher.py
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import METRICS, SIZE_BUCKETS
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent scoring requests into micro-batches.
+
+    Each request awaits submit(rows). A single worker task drains the
+    queue: a batch closes when max_batch_size rows are queued or
+    max_wait_ms has passed since its first request, whichever comes
+    first. The batch is scored with one call to score_fn (run in a
+    dedicated thread, so the event loop keeps accepting requests) and
+    the result rows are handed back to each request.
+
+    score_fn(frame) must return one row per input row, in input order.
+    Batches are scored one at a time, so score_fn may keep state.
+    """
+
+    def __init__(
+        self,
+        score_fn: Callable[[pd.DataFrame], pd.DataFrame],
+        max_batch_size: int = 256,
+        max_wait_ms: float = 5.0,
+        max_queue: int = 10_000,
+        name: str = "scoring",
+    ):
+        self.score_fn = score_fn
+        self.name = name
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue = max_queue
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scoring")
+
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.score_seconds = 0.0
+
+        self._batch_rows = METRICS.histogram(
+            "waf_batcher_batch_rows", "Rows per coalesced scoring batch", ("batcher",), SIZE_BUCKETS
+        ).labels(name)
+        self._batch_seconds = METRICS.histogram(
+            "waf_batcher_score_seconds", "Scoring time per coalesced batch", ("batcher",)
+        ).labels(name)
+        METRICS.gauge(
+            "waf_batcher_queued_requests", "Requests waiting for a batch", ("batcher",)
+        ).labels(name).set_function(lambda: self._queue.qsize() if self._queue else 0)
+
+    # ------------------------------
+    # Lifecycle
+    # ------------------------------
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    # ------------------------------
+    # Request side
+    # ------------------------------
+    async def submit(self, rows: pd.DataFrame) -> pd.DataFrame:
+        if self._worker is None:
+            raise RuntimeError("MicroBatcher is not started")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, future))
+        return await future
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_rows": round(self.rows / max(self.batches, 1), 2),
+            "queued_requests": self._queue.qsize() if self._queue else 0,
+            "score_seconds": round(self.score_seconds, 3),
+        }
+
+    # ------------------------------
+    # Worker
+    # ------------------------------
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            pending = [await self._queue.get()]
+            size = len(pending[0][0])
+            deadline = loop.time() + self.max_wait
+
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                pending.append(item)
+                size += len(item[0])
+
+            await self._score(loop, pending)
+
+    async def _score(self, loop, pending):
+        frames = [rows for rows, _ in pending]
+        start = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self.score_fn, pd.concat(frames)
+            )
+        except Exception as exc:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            elapsed = time.perf_counter() - start
+            self.score_seconds += elapsed
+            self._batch_seconds.observe(elapsed)
+
+        self.requests += len(pending)
+        self.batches += 1
+        self.rows += len(results)
+        self._batch_rows.observe(len(results))
+
+        # Split by position: request i owns rows [bounds[i], bounds[i+1])
+        bounds = np.cumsum([0] + [len(f) for f in frames])
+        for (_, future), lo, hi in zip(pending, bounds[:-1], bounds[1:]):
+            if not future.done():  # client may have gone away
+                future.set_result(results.iloc[lo:hi])
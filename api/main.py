@@ -0,0 +1,130 @@
+# api/main.py
+
+import argparse
+import asyncio
+from contextlib import asynccontextmanager
+
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI
+
+from anomaly_detection.scoring_service import ScoringService
+from api.batcher import MicroBatcher
+from api.routes_alerts import router as alerts_router
+from api.routes_metrics import router as metrics_router
+from api.routes_rules import router as rules_router
+from explainability.explanation_builder import ExplanationBuilder
+from feature_engineering.extractor import FeatureExtractor, StreamingFeatureExtractor
+from storage.database import ResultsStore
+from storage.metrics_store import MetricsStore
+from storage.models import ModelRegistry
+
+
+class Detector:
+    """
+    Scoring callbacks behind the micro-batchers: one coalesced batch
+    of feature rows or raw events in, one result row per input row out
+    """
+
+    def __init__(self, service: ScoringService, window: str = "1min"):
+        self.service = service
+        self.feature_names = list(service.baseline_trainer.get_baseline())
+        # Raw events get the same feature grouping the model was trained on
+        self.stream = StreamingFeatureExtractor(
+            FeatureExtractor(window=window, group_by=service.group_by)
+        )
+
+    def score_features(self, rows: pd.DataFrame) -> pd.DataFrame:
+        return self._score(rows[self.feature_names].reset_index(drop=True))
+
+    def score_events(self, events: pd.DataFrame) -> pd.DataFrame:
+        # Windows are computed in time order; _slot maps rows back
+        events = events.reset_index(drop=True).assign(_slot=np.arange(len(events)))
+        output = self.stream.update(events)
+
+        results = self._score(output["ml_features"].reset_index(drop=True))
+        order = np.argsort(output["context"]["_slot"].to_numpy(), kind="stable")
+        return results.iloc[order].reset_index(drop=True)
+
+    def _score(self, ml_features: pd.DataFrame) -> pd.DataFrame:
+        results = self.service.score(ml_features)
+
+        explanations = ExplanationBuilder(self.service.baseline_trainer.get_baseline()).build(
+            ml_features, mask=results["is_anomaly"]
+        )
+        results["explanations"] = [explanations.get(i, []) for i in results.index]
+        return results
+
+
+def create_app(
+    registry_root: str = "data/models",
+    store_path: str = "data/waf.db",
+    max_batch_size: int = 256,
+    max_wait_ms: float = 5.0,
+    metrics_interval: float = 60.0,
+) -> FastAPI:
+    """
+    Scoring API over the live registry model.
+    Concurrent requests are coalesced by MicroBatcher, so the
+    vectorized scoring cost is shared across callers.
+    Metrics are snapshotted to the metrics store every metrics_interval
+    seconds and served live at /metrics/prometheus.
+    """
+
+    async def record_metrics(store: MetricsStore):
+        while True:
+            await asyncio.sleep(metrics_interval)
+            store.record(source="api")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        registry = ModelRegistry(registry_root)
+        detector = Detector(ScoringService.load(registry))
+
+        app.state.registry = registry
+        app.state.detector = detector
+        app.state.store = ResultsStore(store_path)
+        app.state.feature_batcher = MicroBatcher(
+            detector.score_features, max_batch_size, max_wait_ms, name="features"
+        )
+        app.state.event_batcher = MicroBatcher(
+            detector.score_events, max_batch_size, max_wait_ms, name="events"
+        )
+
+        await app.state.feature_batcher.start()
+        await app.state.event_batcher.start()
+        recorder = asyncio.create_task(record_metrics(MetricsStore(store_path)))
+        yield
+        recorder.cancel()
+        await app.state.feature_batcher.stop()
+        await app.state.event_batcher.stop()
+
+    app = FastAPI(title="ML-WAF Anomaly Detection", lifespan=lifespan)
+    app.include_router(alerts_router)
+    app.include_router(rules_router)
+    app.include_router(metrics_router)
+    return app
+
+
+# uvicorn api.main:app
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registry", default="data/models")
+    parser.add_argument("--store", default="data/waf.db")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        create_app(args.registry, args.store, args.max_batch_size, args.max_wait_ms),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
@@ -0,0 +1,78 @@
+# api/routes_alerts.py
+
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pandas as pd
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+
+router = APIRouter(tags=["alerts"])
+
+
+class FeatureRows(BaseModel):
+    rows: List[Dict[str, float]]
+
+
+class Event(BaseModel):
+    timestamp: datetime
+    src_ip: str
+    method: str = "GET"
+    uri_path: str
+    status_code: int = 200
+    payload_size: int = 0
+    response_time_ms: float = 0.0
+    user_agent: str = ""
+
+
+class Events(BaseModel):
+    events: List[Event]
+
+
+def _response(request: Request, results: pd.DataFrame) -> dict:
+    return {
+        "model_version": request.app.state.registry.current_version(),
+        "results": results.to_dict("records"),
+    }
+
+
+@router.post("/score/features")
+async def score_features(body: FeatureRows, request: Request):
+    """Score precomputed ml_features rows"""
+    names = request.app.state.detector.feature_names
+    missing = sorted({n for row in body.rows for n in names if n not in row})
+    if missing:
+        raise HTTPException(422, f"Missing features: {missing}")
+    if not body.rows:
+        return _response(request, pd.DataFrame())
+
+    rows = pd.DataFrame.from_records(body.rows, columns=names)
+    results = await request.app.state.feature_batcher.submit(rows)
+    return _response(request, results)
+
+
+@router.post("/score/events")
+async def score_events(body: Events, request: Request):
+    """Score raw traffic events (windowed features are kept server-side)"""
+    if not body.events:
+        return _response(request, pd.DataFrame())
+
+    events = pd.DataFrame([e.model_dump() for e in body.events])
+    results = await request.app.state.event_batcher.submit(events)
+    return _response(request, results)
+
+
+@router.get("/alerts")
+def alerts(
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    min_score: Optional[float] = None,
+    src_ip: Optional[str] = None,
+    limit: int = 100,
+):
+    """Stored anomalies, newest first"""
+    df = request.app.state.store.anomalies(
+        start=start, end=end, min_score=min_score, src_ip=src_ip, limit=limit
+    )
+    return df.reset_index(names="timestamp").to_dict("records")
@@ -0,0 +1,31 @@
+# api/routes_metrics.py
+
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics import METRICS
+
+router = APIRouter(tags=["metrics"])
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/health")
+def health(request: Request):
+    return {"status": "ok", "model_version": request.app.state.registry.current_version()}
+
+
+@router.get("/metrics")
+def metrics(request: Request):
+    """Micro-batching counters per scoring endpoint"""
+    return {
+        "model_version": request.app.state.registry.current_version(),
+        "features": request.app.state.feature_batcher.stats(),
+        "events": request.app.state.event_batcher.stats(),
+    }
+
+
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+def prometheus():
+    """Stage timers, batch sizes and queue depths in Prometheus text format"""
+    return PlainTextResponse(METRICS.to_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,13 @@
+# api/routes_rules.py
+
+from typing import Optional
+
+from fastapi import APIRouter, Request
+
+router = APIRouter(tags=["rules"])
+
+
+@router.get("/rules")
+def rules(request: Request, status: Optional[str] = None, limit: int = 100):
+    """Rules proposed by the latest pipeline run"""
+    return request.app.state.store.rules(status=status, limit=limit)
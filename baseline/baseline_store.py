@@ -1,11 +1,23 @@
 import pickle
 from pathlib import Path
+from typing import Optional
 
 
 class BaselineStore:
-    def __init__(self, path="data/baseline.pkl"):
-        self.path = Path(path)
-        self.path.parent.mkdir(parents=True, exist_ok=True)
+    def __init__(self, path="data/baseline.pkl", group_by: Optional[str] = None):
+        """
+        group_by: feature grouping the baseline was learned on (per-src_ip
+        windows of the sharded pipeline, None for global windows). Each
+        grouping keeps its own baseline and sketches, so their statistics
+        never mix; endpoint frequencies and encoders are shared.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.group_by = group_by
+        self.path = path if group_by is None else path.with_name(f"{path.stem}_by_{group_by}{path.suffix}")
+        self.sketch_path = self.path.with_name(self.path.stem + "_sketches.pkl")
+        self.endpoint_path = path.with_name(path.stem + "_endpoints.pkl")
+        self.encoder_path = path.with_name(path.stem + "_encoders.pkl")
 
     def save(self, baseline: dict):
         with open(self.path, "wb") as f:
@@ -16,3 +28,52 @@ class BaselineStore:
             return None
         with open(self.path, "rb") as f:
             return pickle.load(f)
+
+    # ------------------------------
+    # Sketch state (StreamingBaselineTrainer)
+    # ------------------------------
+    def save_sketches(self, state: dict):
+        with open(self.sketch_path, "wb") as f:
+            pickle.dump({"group_by": self.group_by, "sketches": state}, f)
+
+    def load_sketches(self):
+        if not self.sketch_path.exists():
+            return None
+        with open(self.sketch_path, "rb") as f:
+            saved = pickle.load(f)
+
+        # Files written before the grouping was recorded hold global sketches
+        if "sketches" not in saved:
+            saved = {"group_by": None, "sketches": saved}
+        if saved["group_by"] != self.group_by:
+            raise ValueError(
+                f"{self.sketch_path} holds group_by={saved['group_by']!r} sketches, "
+                f"expected group_by={self.group_by!r}"
+            )
+        return saved["sketches"]
+
+    # ------------------------------
+    # Endpoint frequencies (FrequencySketch, endpoint_rarity)
+    # ------------------------------
+    def save_endpoints(self, state: dict):
+        with open(self.endpoint_path, "wb") as f:
+            pickle.dump(state, f)
+
+    def load_endpoints(self):
+        if not self.endpoint_path.exists():
+            return None
+        with open(self.endpoint_path, "rb") as f:
+            return pickle.load(f)
+
+    # ------------------------------
+    # Dictionary encoders (EventEncoders): codes stay stable across runs
+    # ------------------------------
+    def save_encoders(self, state: dict):
+        with open(self.encoder_path, "wb") as f:
+            pickle.dump(state, f)
+
+    def load_encoders(self):
+        if not self.encoder_path.exists():
+            return None
+        with open(self.encoder_path, "rb") as f:
+            return pickle.load(f)
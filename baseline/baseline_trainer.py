@@ -2,6 +2,9 @@ import pandas as pd
 import numpy as np
 from typing import Dict
 
+from baseline.sketches import RunningStats, TDigest
+from utils.metrics import instrumented
+
 
 class BaselineTrainer:
     def __init__(self):
@@ -10,6 +13,7 @@ class BaselineTrainer:
     # ------------------------------
     # Initial fit (cold start)
     # ------------------------------
+    @instrumented("baseline_fit")
     def fit(self, features: pd.DataFrame):
         """
         Learn baseline statistics from scratch
@@ -19,6 +23,7 @@ class BaselineTrainer:
     # ------------------------------
     # Incremental adaptive update
     # ------------------------------
+    @instrumented("baseline_update")
     def update(self, features: pd.DataFrame, alpha: float = 0.1):
         """
         Slowly adapt baseline using exponential moving average
@@ -40,6 +45,7 @@ class BaselineTrainer:
     # ------------------------------
     # Scoring
     # ------------------------------
+    @instrumented("baseline_score")
     def score_deviation(self, features: pd.DataFrame) -> pd.Series:
         scores = []
 
@@ -67,3 +73,89 @@ class BaselineTrainer:
                 "p99": features[col].quantile(0.99),
             }
         return stats
+
+
+class StreamingBaselineTrainer(BaselineTrainer):
+    """
+    Sketch-backed baseline for unbounded streams.
+
+    Per feature it keeps a RunningStats (mean / std) and a TDigest
+    (p95 / p99): O(compression) memory whatever the history length,
+    real quantiles instead of an EMA of quantiles, and states that
+    merge across workers or time partitions.
+    """
+
+    def __init__(self, compression: float = 200.0):
+        super().__init__()
+        self.compression = compression
+        self.stats: Dict[str, RunningStats] = {}
+        self.digests: Dict[str, TDigest] = {}
+
+    def fit(self, features: pd.DataFrame):
+        """
+        Learn baseline statistics from scratch
+        """
+        self.stats, self.digests = {}, {}
+        self.update(features)
+
+    @instrumented("baseline_update")
+    def update(self, features: pd.DataFrame, alpha: float = None):
+        """
+        Fold a batch into the sketches.
+        alpha: optional forgetting rate; history weight is scaled by
+        (1 - alpha) before the batch is added. None keeps everything.
+        """
+        for col in features.columns:
+            if col not in self.stats:
+                self.stats[col] = RunningStats()
+                self.digests[col] = TDigest(self.compression)
+            elif alpha:
+                self.stats[col].decay(1 - alpha)
+                self.digests[col].decay(1 - alpha)
+
+            values = features[col].to_numpy(dtype=np.float64)
+            self.stats[col].update(values)
+            self.digests[col].update(values)
+
+        self.baseline = self._summarize()
+
+    def merge(self, other: "StreamingBaselineTrainer"):
+        """Combine another worker's / partition's sketches into this one"""
+        for col in other.stats:
+            if col not in self.stats:
+                self.stats[col] = RunningStats()
+                self.digests[col] = TDigest(self.compression)
+            self.stats[col].merge(other.stats[col])
+            self.digests[col].merge(other.digests[col])
+
+        self.baseline = self._summarize()
+
+    # ------------------------------
+    # Serialization (via BaselineStore)
+    # ------------------------------
+    def state_dict(self) -> dict:
+        return {
+            "compression": self.compression,
+            "stats": {col: s.to_dict() for col, s in self.stats.items()},
+            "digests": {col: d.to_dict() for col, d in self.digests.items()},
+        }
+
+    def load_state(self, state: dict):
+        self.compression = state["compression"]
+        self.stats = {col: RunningStats.from_dict(s) for col, s in state["stats"].items()}
+        self.digests = {col: TDigest.from_dict(d) for col, d in state["digests"].items()}
+        self.baseline = self._summarize()
+
+    # ------------------------------
+    # Internal helper
+    # ------------------------------
+    def _summarize(self):
+        baseline = {}
+        for col in self.stats:
+            baseline[col] = {
+                "mean": self.stats[col].mean,
+                "std": np.sqrt(self.stats[col].variance()) + 1e-6,
+                "p95": self.digests[col].quantile(0.95),
+                "p99": self.digests[col].quantile(0.99),
+            }
+        return baseline
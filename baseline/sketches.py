@@ -0,0 +1,288 @@
+import numpy as np
+import pandas as pd
+
+
+class RunningStats:
+    """
+    Weighted Welford accumulator for mean / variance.
+    Batches are folded in with Chan's parallel formula, so two
+    accumulators (workers, time partitions) merge exactly.
+    """
+
+    def __init__(self, weight: float = 0.0, mean: float = 0.0, m2: float = 0.0):
+        self.weight = weight
+        self.mean = mean
+        self.m2 = m2
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        batch_mean = values.mean()
+        self._combine(len(values), batch_mean, ((values - batch_mean) ** 2).sum())
+
+    def merge(self, other: "RunningStats"):
+        self._combine(other.weight, other.mean, other.m2)
+
+    def decay(self, factor: float):
+        """Scale the history down (exponential forgetting)"""
+        self.weight *= factor
+        self.m2 *= factor
+
+    def variance(self, ddof: int = 1) -> float:
+        if self.weight - ddof <= 0:
+            return float("nan")
+        return self.m2 / (self.weight - ddof)
+
+    def _combine(self, weight: float, mean: float, m2: float):
+        if weight <= 0:
+            return
+
+        total = self.weight + weight
+        delta = mean - self.mean
+        self.mean += delta * weight / total
+        self.m2 += m2 + delta * delta * self.weight * weight / total
+        self.weight = total
+
+    def to_dict(self) -> dict:
+        return {"weight": self.weight, "mean": self.mean, "m2": self.m2}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningStats":
+        return cls(**state)
+
+
+class TDigest:
+    """
+    Mergeable quantile sketch (merging t-digest, k1 scale function).
+
+    Memory is O(compression) centroids whatever the stream length;
+    accuracy is best in the tails, which is where p95/p99 live.
+    Incoming values are buffered and folded in with one vectorized
+    compression pass per buffer.
+    """
+
+    def __init__(self, compression: float = 200.0, buffer_size: int = 10_000):
+        self.compression = compression
+        self.buffer_size = buffer_size
+
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+        self._buffer_means = []
+        self._buffer_weights = []
+        self._buffered = 0
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum()) + sum(w.sum() for w in self._buffer_weights)
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._add(values, np.ones(len(values)))
+
+    def merge(self, other: "TDigest"):
+        other._compress()
+        if len(other.means) == 0:
+            return
+
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._add(other.means, other.weights)
+
+    def decay(self, factor: float):
+        self._compress()
+        self.weights = self.weights * factor
+
+    def quantile(self, q: float) -> float:
+        self._compress()
+        if len(self.means) == 0:
+            return float("nan")
+
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+
+        return float(
+            np.interp(
+                q * total,
+                np.concatenate(([0.0], centers, [total])),
+                np.concatenate(([self.min], self.means, [self.max])),
+            )
+        )
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    def _add(self, means: np.ndarray, weights: np.ndarray):
+        self._buffer_means.append(means)
+        self._buffer_weights.append(weights)
+        self._buffered += len(means)
+        if self._buffered >= self.buffer_size:
+            self._compress()
+
+    def _compress(self):
+        if not self._buffer_means:
+            return
+
+        means = np.concatenate([self.means] + self._buffer_means)
+        weights = np.concatenate([self.weights] + self._buffer_weights)
+        self._buffer_means, self._buffer_weights, self._buffered = [], [], 0
+
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+
+        # Points falling in the same unit interval of k(q) form one centroid
+        total = weights.sum()
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        bucket = np.floor(k).astype(np.int64)
+
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        merged_weights = np.add.reduceat(weights, starts)
+
+        self.means = np.add.reduceat(means * weights, starts) / merged_weights
+        self.weights = merged_weights
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {
+            "compression": self.compression,
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": float(self.min),
+            "max": float(self.max),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "TDigest":
+        digest = cls(compression=state["compression"])
+        digest.means = np.asarray(state["means"], dtype=np.float64)
+        digest.weights = np.asarray(state["weights"], dtype=np.float64)
+        digest.min = state["min"]
+        digest.max = state["max"]
+        return digest
+
+
+class FrequencySketch:
+    """
+    Decaying per-key counts in bounded memory: a count-min sketch
+    (conservative update) answers any key, a top-k heavy-hitters table
+    keeps the most frequent keys for reporting.
+
+    Keys are hashed with pd.util.hash_array, which is stable across
+    processes, so states persist and merge. With a half_life (in
+    events) every count halves after that many further events,
+    whatever the batch sizes.
+    """
+
+    def __init__(
+        self,
+        width: int = 2**16,
+        depth: int = 4,
+        top_k: int = 1000,
+        half_life: float = None,
+    ):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.half_life = half_life
+
+        self.table = np.zeros((depth, width))
+        self.total = 0.0
+        self.heavy = pd.Series(dtype=np.float64)
+
+    def update(self, keys):
+        codes, uniques = pd.factorize(np.asarray(keys, dtype=object))
+        codes = codes[codes >= 0]
+        if len(codes) == 0:
+            return
+
+        if self.half_life:
+            self.decay(0.5 ** (len(codes) / self.half_life))
+
+        counts = np.bincount(codes, minlength=len(uniques)).astype(np.float64)
+        rows = np.broadcast_to(np.arange(self.depth)[:, None], (self.depth, len(uniques)))
+        cols = self._columns(uniques)
+
+        # Conservative update: raise each cell only up to the new estimate
+        estimate = self.table[rows, cols].min(axis=0) + counts
+        np.maximum.at(self.table, (rows, cols), np.broadcast_to(estimate, cols.shape))
+        self.total += counts.sum()
+
+        self._update_heavy(pd.Index(uniques))
+
+    def merge(self, other: "FrequencySketch"):
+        if self.table.shape != other.table.shape:
+            raise ValueError("Cannot merge sketches of different width / depth")
+
+        self.table += other.table
+        self.total += other.total
+        self._update_heavy(other.heavy.index)
+
+    def decay(self, factor: float):
+        """Scale the history down (exponential forgetting)"""
+        self.table *= factor
+        self.total *= factor
+        self.heavy *= factor
+
+    def estimate(self, keys) -> np.ndarray:
+        """Estimated (never under-) count per key; 0 for missing keys"""
+        keys = np.asarray(keys, dtype=object)
+        out = np.zeros(len(keys))
+        valid = ~pd.isna(keys)
+        if valid.any():
+            cols = self._columns(keys[valid])
+            out[valid] = self.table[np.arange(self.depth)[:, None], cols].min(axis=0)
+        return out
+
+    def frequency(self, keys) -> np.ndarray:
+        """Estimated relative frequency per key"""
+        return self.estimate(keys) / self.total if self.total else np.zeros(len(keys))
+
+    def top(self, n: int = 20) -> pd.Series:
+        return self.heavy.head(n)
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    def _columns(self, keys) -> np.ndarray:
+        """(depth, n) cells via double hashing of one 64-bit hash"""
+        hashed = pd.util.hash_array(np.asarray(keys, dtype=object))
+        h1 = hashed & np.uint64(0xFFFFFFFF)
+        h2 = (hashed >> np.uint64(32)) | np.uint64(1)
+        seeds = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1 + seeds * h2) % np.uint64(self.width)).astype(np.int64)
+
+    def _update_heavy(self, candidates: pd.Index):
+        keys = self.heavy.index.union(candidates, sort=False)
+        counts = pd.Series(self.estimate(keys.to_numpy(dtype=object)), index=keys)
+        self.heavy = counts.nlargest(self.top_k)
+
+    def to_dict(self) -> dict:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "top_k": self.top_k,
+            "half_life": self.half_life,
+            "table": self.table,
+            "total": self.total,
+            "heavy": self.heavy.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "FrequencySketch":
+        sketch = cls(state["width"], state["depth"], state["top_k"], state["half_life"])
+        sketch.table = np.asarray(state["table"], dtype=np.float64)
+        sketch.total = state["total"]
+        sketch.heavy = pd.Series(state["heavy"], dtype=np.float64)
+        return sketch
@@ -1,29 +1,35 @@
 # dashboard/app.py
 
+from datetime import timedelta
+
 import streamlit as st
-import pickle
+
+from storage.database import ResultsStore
+from storage.metrics_store import MetricsStore
+from storage.rule_repository import RuleRepository
 
 st.set_page_config(
     page_title="ML-WAF Anomaly Detection",
     layout="wide",
 )
 
-@st.cache_data
-def load_data():
-    with open("dashboard/data/context.pkl", "rb") as f:
-        context = pickle.load(f)
-    with open("dashboard/data/ml_features.pkl", "rb") as f:
-        ml_features = pickle.load(f)
-    with open("dashboard/data/results.pkl", "rb") as f:
-        results = pickle.load(f)
-    with open("dashboard/data/rules.pkl", "rb") as f:
-        rules = pickle.load(f)
-    with open("dashboard/data/baseline.pkl", "rb") as f:
-        baseline = pickle.load(f)
-    return context, ml_features, results, rules, baseline
+@st.cache_resource
+def get_store():
+    # Pages query this store with filters and limits; nothing is bulk-loaded
+    return ResultsStore("data/waf.db")
+
+
+@st.cache_resource
+def get_metrics_store():
+    return MetricsStore("data/waf.db")
 
 
-context, ml_features, results, rules, baseline = load_data()
+@st.cache_resource
+def get_rule_repository():
+    return RuleRepository("data/waf.db")
+
+
+store = get_store()
 
 st.title("🔐 ML-Enabled WAF Anomaly Detection")
 
@@ -40,18 +46,27 @@ st.write(
 from pages.anomalies import render as anomalies_page
 from pages.baselines import render as baseline_page
 from pages.rules import render as rules_page
+from pages.performance import render as performance_page
 
 page = st.sidebar.radio(
     "Navigation",
-    ["Anomalies", "Baselines", "Rules"]
+    ["Anomalies", "Baselines", "Rules", "Performance"]
 )
 
+# Time window shared by all pages, ending at the newest stored event
+_, latest = store.time_range()
+hours = st.sidebar.slider("Time window (hours)", 1, 168, 24)
+start = latest - timedelta(hours=hours) if latest is not None else None
+
 if page == "Anomalies":
-    anomalies_page(results)
+    anomalies_page(store, start=start)
 
 elif page == "Baselines":
-    baseline_page(ml_features, baseline)
+    baseline_page(store, start=start)
 
 elif page == "Rules":
-    rules_page(rules)
+    rules_page(get_rule_repository())
 
+elif page == "Performance":
+    # Metrics are stamped with wall-clock time, not log time
+    performance_page(get_metrics_store())
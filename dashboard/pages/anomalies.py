@@ -1,18 +1,25 @@
 import streamlit as st
 import pandas as pd
 
-def render(results):
+def render(store, start=None):
     st.header("🚨 Detected Anomalies")
 
-    anomalies = results[results["is_anomaly"]]
+    min_score = st.slider("Minimum score", 0.0, 1.0, 0.0, 0.05)
+    src_ip = st.text_input("Source IP") or None
+    limit = st.number_input("Show latest", 10, 5000, 200, step=50)
 
-    if anomalies.empty:
+    total = store.count_anomalies(start=start, min_score=min_score)
+    if total == 0:
         st.success("No anomalies detected")
         return
 
-    st.metric("Total Anomalies", len(anomalies))
+    st.metric("Total Anomalies", total)
+
+    anomalies = store.anomalies(
+        start=start, min_score=min_score, src_ip=src_ip, limit=int(limit)
+    )
 
     for ts, row in anomalies.iterrows():
-        with st.expander(f"⏱ {ts} | Score: {row['final_score']:.2f}"):
+        with st.expander(f"⏱ {ts} | {row['src_ip']} {row['uri_path']} | Score: {row['final_score']:.2f}"):
             for reason in row["explanations"]:
                 st.markdown(f"- {reason}")
@@ -1,15 +1,20 @@
 import streamlit as st
 import pandas as pd
 
-def render(ml_features, baseline):
+def render(store, start=None):
     st.header("📊 Baseline vs Current Traffic")
 
+    baseline = store.latest_baseline()
+    if not baseline:
+        st.info("No baseline stored yet")
+        return
+
     feature = st.selectbox(
         "Select feature",
         list(baseline.keys())
     )
 
-    st.line_chart(ml_features[feature])
+    st.line_chart(store.feature_series(feature, start=start, limit=10_000))
 
     b = baseline[feature]
     st.markdown(
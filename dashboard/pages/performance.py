@@ -0,0 +1,40 @@
+import streamlit as st
+
+
+def render(metrics_store):
+    st.header("⏱️ Pipeline Performance")
+
+    sources = metrics_store.sources()
+    if not sources:
+        st.info("No metrics recorded yet")
+        return
+
+    source = st.selectbox("Process", sources)
+
+    summary = metrics_store.stage_summary(source)
+    if len(summary):
+        st.subheader("Stages (latest snapshot)")
+        st.dataframe(summary, use_container_width=True)
+        st.bar_chart(summary.set_index("stage")["seconds"])
+
+    st.subheader("Over time")
+    latest = metrics_store.latest(source)
+    # Plain series only; histogram buckets are summarised above
+    plain = latest[~latest["name"].str.endswith("_bucket")]
+    options = sorted({
+        (name, ",".join(f"{k}={v}" for k, v in sorted(labels.items())))
+        for name, labels in zip(plain["name"], plain["labels"])
+    })
+    if not options:
+        return
+
+    name, label_text = st.selectbox(
+        "Metric", options, format_func=lambda o: f"{o[0]}{{{o[1]}}}" if o[1] else o[0]
+    )
+    labels = dict(pair.split("=", 1) for pair in label_text.split(",")) if label_text else None
+    series = metrics_store.series(name, labels=labels, source=source)
+
+    # Counters are cumulative per process: show the per-snapshot increase
+    if name.endswith(("_total", "_sum", "_count")):
+        series = series.diff().clip(lower=0)
+    st.line_chart(series)
@@ -1,16 +1,30 @@
 import streamlit as st
-import json
 
-def render(rules):
+STATUSES = ["proposed", "approved", "active", "rejected", "expired"]
+
+
+def render(repository):
     st.header("🛡 Rule Recommendations")
 
+    status = st.selectbox("Status", STATUSES)
+    st.caption(f"{repository.count(status)} {status} of {repository.count()} rules")
+
+    rules = repository.rules(status=status, limit=100)
+
     if not rules:
-        st.info("No rules proposed yet")
+        st.info(f"No {status} rules")
         return
 
     for rule in rules:
         with st.expander(
-            f"{rule['rule_type']} | Confidence {rule['confidence']}"
+            f"{rule['rule_type']} | {rule['match']['endpoint']} | {rule['match']['src_ip']} "
+            f"| Confidence {rule['confidence_decayed']} | {rule['detections']} detections"
         ):
-            st.json(rule)
-            st.checkbox("Approve rule (demo only)", key=str(rule))
+            st.json(rule, expanded=False)
+            approve, reject = st.columns(2)
+            if approve.button("Approve", key=f"approve-{rule['rule_id']}", disabled=status == "approved"):
+                repository.set_status([rule["rule_id"]], "approved")
+                st.rerun()
+            if reject.button("Reject", key=f"reject-{rule['rule_id']}", disabled=status == "rejected"):
+                repository.set_status([rule["rule_id"]], "rejected")
+                st.rerun()
@@ -0,0 +1,166 @@
+# evaluation/metrics.py
+
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# ------------------------------
+# Stage profiling
+# ------------------------------
+class StageProfiler:
+    """
+    Times and memory-profiles named pipeline stages:
+
+        profiler = StageProfiler()
+        with profiler.stage("feature_extraction", rows=len(events)):
+            ...
+        profiler.save("data/benchmarks/run.json", n_events=...)
+
+    Per stage: wall seconds, rows/sec, peak Python-heap allocation during
+    the stage (tracemalloc; numpy and pandas buffers are included) and
+    the process RSS high-water mark after it. tracemalloc slows
+    allocation-heavy code, so pass trace_memory=False for clean timings.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages: List[dict] = []
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0):
+        """Yields the stage record; rows may be set inside the block"""
+        record = {"stage": name, "rows": rows}
+
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = None
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+            record["seconds"] = round(elapsed, 4)
+            record["rows_per_sec"] = round(record["rows"] / elapsed) if record["rows"] and elapsed > 0 else None
+            record["peak_alloc_mb"] = round(peak / 2**20, 2) if peak is not None else None
+            record["max_rss_mb"] = max_rss_mb()
+            self.stages.append(record)
+
+    def report(self, **params) -> dict:
+        return {"run": run_info(**params), "stages": self.stages}
+
+    def save(self, path, **params) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(**params), f, indent=2, default=str)
+        return path
+
+
+def max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    scale = 2**20 if platform.system() == "Darwin" else 2**10
+    return round(rss / scale, 1)
+
+
+def run_info(**params) -> dict:
+    """Environment of a benchmark run, so results stay comparable over time"""
+    import numpy
+    import pandas
+    import sklearn
+
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "params": params,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=Path(__file__).resolve().parent,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+# ------------------------------
+# Comparing runs
+# ------------------------------
+def load_report(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare_reports(old: dict, new: dict) -> List[dict]:
+    """Per stage present in both reports: seconds, speedup and peak memory"""
+    before = {s["stage"]: s for s in old["stages"]}
+    rows = []
+    for stage in new["stages"]:
+        prev = before.get(stage["stage"])
+        if prev is None:
+            continue
+        rows.append({
+            "stage": stage["stage"],
+            "old_seconds": prev["seconds"],
+            "new_seconds": stage["seconds"],
+            "speedup": round(prev["seconds"] / stage["seconds"], 2) if stage["seconds"] else None,
+            "old_peak_alloc_mb": prev.get("peak_alloc_mb"),
+            "new_peak_alloc_mb": stage.get("peak_alloc_mb"),
+        })
+    return rows
+
+
+# ------------------------------
+# Detection quality (synthetic labels)
+# ------------------------------
+def detection_metrics(is_attack, is_anomaly) -> Dict[str, float]:
+    y_true = np.asarray(is_attack, dtype=bool)
+    y_pred = np.asarray(is_anomaly, dtype=bool)
+
+    tp = int((y_true & y_pred).sum())
+    fp = int((~y_true & y_pred).sum())
+    fn = int((y_true & ~y_pred).sum())
+
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {
+        "precision": round(precision, 4),
+        "recall": round(recall, 4),
+        "f1": round(f1, 4),
+        "true_positives": tp,
+        "false_positives": fp,
+        "false_negatives": fn,
+    }
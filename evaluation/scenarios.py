@@ -0,0 +1,339 @@
+# evaluation/scenarios.py
+
+import argparse
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ingestion.schema import EventBatch, TrafficEvent
+
+
+METHODS = ["GET", "POST", "PUT", "DELETE"]
+STATUS_CODES = [200, 200, 200, 201, 301, 304, 400, 403, 404, 500, 502]
+
+
+def synthetic_events(
+    n_events: int,
+    n_ips: int = 1000,
+    n_endpoints: int = 200,
+    events_per_sec: float = 50.0,
+    seed: int = 42,
+) -> List[TrafficEvent]:
+    """
+    Deterministic synthetic traffic for benchmarks and tests.
+    """
+    rng = np.random.default_rng(seed)
+
+    start = datetime(2025, 1, 1)
+    offsets = np.cumsum(rng.exponential(1.0 / events_per_sec, n_events))
+
+    ips = rng.integers(0, n_ips, n_events)
+    endpoints = rng.zipf(1.3, n_events) % n_endpoints
+    methods = rng.choice(len(METHODS), n_events, p=[0.7, 0.2, 0.05, 0.05])
+    statuses = rng.choice(STATUS_CODES, n_events)
+    payloads = rng.lognormal(6.0, 1.0, n_events).astype(int)
+    response_times = rng.gamma(2.0, 20.0, n_events)
+
+    return [
+        TrafficEvent(
+            timestamp=start + timedelta(seconds=float(offsets[i])),
+            src_ip=f"10.{ips[i] >> 16 & 255}.{ips[i] >> 8 & 255}.{ips[i] & 255}",
+            method=METHODS[methods[i]],
+            uri_path=f"/api/v1/resource/{endpoints[i]}",
+            status_code=int(statuses[i]),
+            payload_size=int(payloads[i]),
+            response_time_ms=float(response_times[i]),
+            user_agent="Mozilla/5.0",
+        )
+        for i in range(n_events)
+    ]
+
+
+def write_nginx_log(events: List[TrafficEvent], path) -> None:
+    """
+    Write events in the nginx JSON access-log format NginxLogReader reads
+    (response_time_ms is logged in seconds, like $request_time)
+    """
+    with open(path, "w") as f:
+        for e in events:
+            f.write(
+                json.dumps(
+                    {
+                        "timestamp": e.timestamp.isoformat(),
+                        "src_ip": e.src_ip,
+                        "method": e.method,
+                        "uri_path": e.uri_path,
+                        "status_code": e.status_code,
+                        "payload_size": e.payload_size,
+                        "response_time_ms": f"{e.response_time_ms / 1000:.3f}",
+                        "user_agent": e.user_agent,
+                    }
+                )
+                + "\n"
+            )
+
+
+# ------------------------------
+# Columnar generator (10k .. 50M events)
+# ------------------------------
+ATTACK_KINDS = ("flood", "scan", "error_storm", "exfiltration")
+
+# Background events are drawn in fixed blocks with their own seeds
+GENERATOR_BLOCK = 65_536
+
+
+@dataclass
+class AttackBurst:
+    """
+    A burst of attack traffic injected into the background mix.
+    start / duration are seconds from the start of the scenario.
+    """
+    kind: str
+    start: float
+    duration: float
+    rate: float = 50.0        # events per second
+    n_ips: int = 5
+
+    def __post_init__(self):
+        if self.kind not in ATTACK_KINDS:
+            raise ValueError(f"Unknown attack kind: {self.kind}")
+
+
+@dataclass
+class TrafficScenario:
+    """
+    Deterministic description of a synthetic traffic day: the same
+    scenario always yields the same events, chunk by chunk.
+    """
+    n_events: int = 100_000
+    n_ips: int = 1000
+    n_endpoints: int = 200
+    endpoint_zipf: float = 1.3
+    endpoints: Optional[Dict[str, float]] = None   # path -> weight, overrides zipf
+    events_per_sec: float = 50.0
+    attacks: List[AttackBurst] = field(default_factory=list)
+    seed: int = 42
+    start: datetime = datetime(2025, 1, 1)
+
+
+def default_attacks(scenario_seconds: float) -> List[AttackBurst]:
+    """One burst of every kind, spread over the scenario"""
+    return [
+        AttackBurst(kind, start=scenario_seconds * (i + 1) / (len(ATTACK_KINDS) + 1), duration=60.0)
+        for i, kind in enumerate(ATTACK_KINDS)
+    ]
+
+
+def generate_traffic(
+    scenario: TrafficScenario,
+    chunk_size: int = 1_000_000,
+    with_labels: bool = False,
+) -> Iterator:
+    """
+    Stream a scenario as time-ordered EventBatch chunks of ~chunk_size
+    background events (plus the attack events that fall in their time
+    range). Memory is bounded by chunk_size, so 50M-event days work.
+    with_labels: yield (batch, is_attack) pairs instead of batches.
+    """
+    root = np.random.SeedSequence(scenario.seed)
+    background_seed, attack_seed = root.spawn(2)
+
+    paths, weights = _endpoint_mix(scenario)
+    attacks = _attack_events(scenario, np.random.default_rng(attack_seed))
+
+    # Background randomness is drawn per fixed block, so the events do not
+    # depend on chunk_size
+    n_blocks = -(-scenario.n_events // GENERATOR_BLOCK)
+    block_seeds = background_seed.spawn(n_blocks)
+    blocks_per_chunk = max(1, chunk_size // GENERATOR_BLOCK)
+
+    clock = 0.0
+    for first in range(0, n_blocks, blocks_per_chunk):
+        last = min(first + blocks_per_chunk, n_blocks)
+        parts = [
+            _background_block(
+                scenario,
+                np.random.default_rng(block_seeds[b]),
+                min(GENERATOR_BLOCK, scenario.n_events - b * GENERATOR_BLOCK),
+                weights,
+            )
+            for b in range(first, last)
+        ]
+        lo = clock if first else -np.inf
+
+        # Clock carried block by block (not per chunk) for identical floats
+        for part in parts:
+            part["offset"] = clock + np.cumsum(part.pop("gap"))
+            clock = part["offset"][-1]
+        columns = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+        hi = clock if last < n_blocks else np.inf
+
+        # Merge in the attack events of this time range
+        in_chunk = (attacks["offset"] > lo) & (attacks["offset"] <= hi)
+        if in_chunk.any():
+            columns = {name: np.concatenate([values, attacks[name][in_chunk]]) for name, values in columns.items()}
+            order = np.argsort(columns["offset"], kind="stable")
+            columns = {name: values[order] for name, values in columns.items()}
+
+        batch = _to_batch(scenario, columns, paths)
+        yield (batch, columns["is_attack"]) if with_labels else batch
+
+
+def _background_block(scenario: TrafficScenario, rng: np.random.Generator, block: int, weights) -> Dict[str, np.ndarray]:
+    return {
+        "gap": rng.exponential(1.0 / scenario.events_per_sec, block),
+        "ip": rng.integers(0, scenario.n_ips, block),
+        "endpoint": rng.choice(len(weights), block, p=weights),
+        "method": rng.choice(len(METHODS), block, p=[0.7, 0.2, 0.05, 0.05]),
+        "status_code": rng.choice(STATUS_CODES, block),
+        "payload_size": rng.lognormal(6.0, 1.0, block).astype(np.int64),
+        "response_time_ms": rng.gamma(2.0, 20.0, block),
+        "is_attack": np.zeros(block, dtype=bool),
+    }
+
+
+def write_nginx_log_batches(batches: Iterable[EventBatch], path) -> int:
+    """
+    Fast nginx JSON-lines writer for generated batches (same format as
+    write_nginx_log); returns the number of lines written
+    """
+    written = 0
+    with open(path, "w") as f:
+        for batch in batches:
+            timestamps = batch.timestamp.strftime("%Y-%m-%dT%H:%M:%S.%f")
+            seconds = [f"{t:.3f}" for t in (batch.response_time_ms / 1000).tolist()]
+            f.writelines(
+                f'{{"timestamp": "{ts}", "src_ip": "{ip}", "method": "{m}", '
+                f'"uri_path": {json.dumps(uri)}, "status_code": {status}, '
+                f'"payload_size": {size}, "response_time_ms": "{rt}", '
+                f'"user_agent": {json.dumps(ua)}}}\n'
+                for ts, ip, m, uri, status, size, rt, ua in zip(
+                    timestamps,
+                    batch.src_ip,
+                    batch.method,
+                    batch.uri_path,
+                    batch.status_code.tolist(),
+                    batch.payload_size.tolist(),
+                    seconds,
+                    batch.user_agent,
+                )
+            )
+            written += len(batch)
+    return written
+
+
+def _endpoint_mix(scenario: TrafficScenario):
+    if scenario.endpoints:
+        paths = list(scenario.endpoints)
+        weights = np.array([scenario.endpoints[p] for p in paths], dtype=np.float64)
+    else:
+        paths = [f"/api/v1/resource/{i}" for i in range(scenario.n_endpoints)]
+        weights = 1.0 / np.arange(1, scenario.n_endpoints + 1) ** scenario.endpoint_zipf
+
+    # Attack-only paths go last, with zero background weight
+    paths += ["/login", "/admin/export"] + [f"/.hidden/probe/{i}" for i in range(1000)]
+    weights = np.concatenate([weights / weights.sum(), np.zeros(len(paths) - len(weights))])
+    return paths, weights
+
+
+def _attack_events(scenario: TrafficScenario, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    n_background_paths = len(scenario.endpoints or ()) or scenario.n_endpoints
+    login, export, probes = n_background_paths, n_background_paths + 1, n_background_paths + 2
+
+    parts = []
+    for a, attack in enumerate(scenario.attacks):
+        n = int(attack.rate * attack.duration)
+        if n == 0:
+            continue
+
+        # Attacker IPs live above the background IP range
+        ips = scenario.n_ips + a * 1000 + rng.integers(0, attack.n_ips, n)
+        part = {
+            "offset": attack.start + np.sort(rng.uniform(0, attack.duration, n)),
+            "ip": ips,
+            "endpoint": np.full(n, login),
+            "method": np.full(n, METHODS.index("POST")),
+            "status_code": rng.choice([200, 401, 429], n),
+            "payload_size": rng.integers(200, 400, n),
+            "response_time_ms": rng.gamma(2.0, 10.0, n),
+        }
+        if attack.kind == "scan":
+            part["endpoint"] = probes + rng.integers(0, 1000, n)
+            part["method"] = np.full(n, METHODS.index("GET"))
+            part["status_code"] = np.full(n, 404)
+        elif attack.kind == "error_storm":
+            part["endpoint"] = rng.integers(0, n_background_paths, n)
+            part["status_code"] = rng.choice([500, 502, 503], n)
+            part["response_time_ms"] = rng.gamma(4.0, 250.0, n)
+        elif attack.kind == "exfiltration":
+            part["endpoint"] = np.full(n, export)
+            part["method"] = np.full(n, METHODS.index("GET"))
+            part["status_code"] = np.full(n, 200)
+            part["payload_size"] = rng.lognormal(13.0, 0.5, n).astype(np.int64)
+
+        part["is_attack"] = np.ones(n, dtype=bool)
+        parts.append(part)
+
+    if not parts:
+        empty = {"offset": np.float64, "ip": np.int64, "endpoint": np.int64, "method": np.int64,
+                 "status_code": np.int64, "payload_size": np.int64,
+                 "response_time_ms": np.float64, "is_attack": bool}
+        return {name: np.empty(0, dtype=dtype) for name, dtype in empty.items()}
+
+    events = {name: np.concatenate([p[name] for p in parts]) for name in parts[0]}
+    order = np.argsort(events["offset"], kind="stable")
+    return {name: values[order] for name, values in events.items()}
+
+
+def _to_batch(scenario: TrafficScenario, columns: Dict[str, np.ndarray], paths: List[str]) -> EventBatch:
+    # Format each distinct IP / path once per chunk
+    ip_codes, ip_uniques = pd.factorize(columns["ip"])
+    ip_strings = np.array(
+        [f"10.{ip >> 16 & 255}.{ip >> 8 & 255}.{ip & 255}" for ip in ip_uniques.tolist()],
+        dtype=object,
+    )
+    path_strings = np.array(paths, dtype=object)
+    method_strings = np.array(METHODS, dtype=object)
+
+    n = len(columns["offset"])
+    user_agents = np.where(columns["is_attack"], "python-requests/2.31", "Mozilla/5.0").astype(object)
+
+    return EventBatch(
+        timestamp=pd.Timestamp(scenario.start) + pd.to_timedelta(columns["offset"], unit="s"),
+        src_ip=ip_strings[ip_codes],
+        method=method_strings[columns["method"]],
+        uri_path=path_strings[columns["endpoint"]],
+        status_code=columns["status_code"].astype(np.int64),
+        payload_size=columns["payload_size"].astype(np.int64),
+        response_time_ms=columns["response_time_ms"].astype(np.float64),
+        user_agent=user_agents if n else np.empty(0, dtype=object),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic nginx JSON access log")
+    parser.add_argument("output")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--ips", type=int, default=10_000)
+    parser.add_argument("--endpoints", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=500.0, help="background events/sec")
+    parser.add_argument("--no-attacks", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    scenario = TrafficScenario(
+        n_events=args.events,
+        n_ips=args.ips,
+        n_endpoints=args.endpoints,
+        events_per_sec=args.rate,
+        seed=args.seed,
+    )
+    if not args.no_attacks:
+        scenario.attacks = default_attacks(args.events / args.rate)
+
+    n = write_nginx_log_batches(generate_traffic(scenario), args.output)
+    print(f"[INFO] Wrote {n} events to {args.output}")
@@ -0,0 +1,580 @@
+# evaluation/stress_test.py
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from evaluation.metrics import StageProfiler, detection_metrics
+from evaluation.scenarios import (
+    TrafficScenario,
+    default_attacks,
+    generate_traffic,
+    synthetic_events,
+    write_nginx_log_batches,
+)
+from ingestion.log_reader import NginxLogReader
+from ingestion.schema import EventBatch
+from feature_engineering.extractor import FeatureExtractor
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.autoencoder import HalfSpaceTreesModel
+from anomaly_detection.scoring_service import ScoringService
+from anomaly_detection.scorer import AnomalyScorer
+from explainability.explanation_builder import ExplanationBuilder
+from rule_engine.rule_generator import RuleGenerator
+from rule_engine.enforcer import RuleEngine
+from baseline.baseline_trainer import BaselineTrainer
+from storage.models import ModelRegistry
+from anomaly_detection import forest_kernel
+from anomaly_detection.forest_kernel import FlatForest
+from pipeline.sharded import ShardedPipeline
+
+
+def bench_stages(
+    scenario: TrafficScenario,
+    output=None,
+    trace_memory: bool = True,
+    log_path=None,
+) -> dict:
+    """
+    Run the batch pipeline once on a generated nginx log, timing and
+    memory-profiling every stage separately. The report (plus detection
+    quality against the injected attacks) is written as JSON to output,
+    default data/benchmarks/stages-<utc time>.json.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        log_path = Path(log_path or Path(tmp) / "access.log")
+        labels = np.concatenate([
+            is_attack for _, is_attack in generate_traffic(scenario, with_labels=True)
+        ])
+        if not log_path.exists():
+            write_nginx_log_batches(generate_traffic(scenario), log_path)
+
+        profiler = StageProfiler(trace_memory=trace_memory)
+        extractor = FeatureExtractor(window="1min")
+
+        with profiler.stage("reader") as stage:
+            events = extractor.batches_to_df(NginxLogReader(log_path).read_batches())
+            stage["rows"] = len(events)
+
+    n = len(events)
+    with profiler.stage("feature_extraction", rows=n):
+        output_frames = extractor.extract_frame(events)
+    ml_features = output_frames["ml_features"]
+
+    with profiler.stage("baseline", rows=n):
+        trainer = BaselineTrainer()
+        trainer.fit(ml_features)
+        baseline_scores = trainer.score_deviation(ml_features)
+
+    model = IsolationForestModel(contamination=0.02)
+    with profiler.stage("isolation_forest_fit", rows=n):
+        model.fit(ml_features)
+    with profiler.stage("isolation_forest_score", rows=n):
+        if_scores = model.score(ml_features)
+
+    with profiler.stage("scorer", rows=n):
+        results = AnomalyScorer().score(if_scores, baseline_scores)
+
+    with profiler.stage("explanations", rows=int(results["is_anomaly"].sum())):
+        ExplanationBuilder(trainer.get_baseline()).build(ml_features, mask=results["is_anomaly"])
+
+    with profiler.stage("rules", rows=int(results["is_anomaly"].sum())):
+        rules = RuleGenerator(
+            template_path="rule_engine/rule_templates.yaml",
+            min_occurrences=1,
+            min_avg_score=0.75,
+        ).generate(context=output_frames["context"], results=results)
+
+    # batches_to_df sorts by time; its index holds the generated positions
+    quality = detection_metrics(labels[events.index.to_numpy()], results["is_anomaly"].to_numpy())
+
+    params = {
+        "n_events": scenario.n_events,
+        "n_ips": scenario.n_ips,
+        "n_endpoints": scenario.n_endpoints,
+        "events_per_sec": scenario.events_per_sec,
+        "attacks": [a.__dict__ for a in scenario.attacks],
+        "seed": scenario.seed,
+        "trace_memory": trace_memory,
+    }
+    report = profiler.report(**params)
+    report["detection"] = quality
+    report["rules"] = len(rules)
+
+    output = Path(output or f"data/benchmarks/stages-{datetime.utcnow():%Y%m%dT%H%M%S}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    report["path"] = str(output)
+    return report
+
+
+def bench_enforcement(n_events: int = 1_000_000, n_rules: int = 10_000, n_ips: int = 100_000) -> dict:
+    """
+    Decisions/sec of RuleEngine on generated traffic with n_rules
+    approved rules (exact IP, IP+endpoint, CIDR and endpoint rate limits)
+    """
+    scenario = TrafficScenario(n_events=n_events, n_ips=n_ips, events_per_sec=1000.0)
+    events = EventBatch.concat(list(generate_traffic(scenario)))
+
+    rng = np.random.default_rng(0)
+    ips = np.unique(events.src_ip)
+    endpoints = np.unique(events.uri_path)
+    # Mostly IP-targeted rules, like RuleGenerator output, plus a few
+    # endpoint-wide per-client limits
+    kinds = rng.choice(3, n_rules - 20, p=[0.4, 0.4, 0.2]).tolist() + [3] * 20
+    rules = []
+    for i, kind in enumerate(kinds):
+        ip = str(rng.choice(ips))
+        match, action = {"src_ip": ip, "endpoint": None}, {"type": "block_ip"}
+        if kind == 1:
+            match["endpoint"] = str(rng.choice(endpoints))
+            action = {"type": "rate_limit", "limit": "10/min"}
+        elif kind == 2:
+            match["src_ip"] = ip.rsplit(".", 1)[0] + ".0/28"
+            action = {"type": "endpoint_protection"}
+        elif kind == 3:
+            match = {"src_ip": None, "endpoint": str(endpoints[i % len(endpoints)])}
+            action = {"type": "rate_limit", "limit": "60/min"}
+        rules.append({
+            "rule_id": f"r{i}", "rule_type": action["type"], "match": match,
+            "action": action, "confidence": float(rng.uniform(0.8, 1.0)), "status": "approved",
+        })
+
+    start = time.perf_counter()
+    engine = RuleEngine(rules)
+    compile_seconds = time.perf_counter() - start
+
+    RuleEngine(rules).replay(events.slice(0, 1000))  # token bucket kernel JIT
+    start = time.perf_counter()
+    decisions = engine.replay(events)
+    replay_seconds = time.perf_counter() - start
+
+    sample = min(n_events, 200_000)
+    ts = (events.timestamp[:sample].as_unit("ns").asi8 / 1e9).tolist()
+    per_event = RuleEngine(rules)
+    start = time.perf_counter()
+    for ip, endpoint, t in zip(events.src_ip[:sample], events.uri_path[:sample], ts):
+        per_event.decide(ip, endpoint, t)
+    decide_seconds = time.perf_counter() - start
+
+    return {
+        "stage": "rule_enforcement",
+        "events": len(events),
+        "rules": n_rules,
+        "compile_seconds": round(compile_seconds, 3),
+        "replay_decisions_per_sec": round(len(events) / replay_seconds),
+        "decide_decisions_per_sec": round(sample / decide_seconds),
+        "decisions": decisions["decision"].value_counts().to_dict(),
+    }
+
+
+def bench_feature_extraction(
+    n_events: int,
+    engine: str = "vectorized",
+    group_by=None,
+    n_ips: int = 1000,
+) -> dict:
+    """
+    Time FeatureExtractor.extract end to end on synthetic traffic
+    """
+    events = synthetic_events(n_events, n_ips=n_ips)
+    extractor = FeatureExtractor(window="1min", engine=engine, group_by=group_by)
+
+    start = time.perf_counter()
+    extractor.extract(events)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "stage": "feature_extraction",
+        "engine": engine,
+        "group_by": group_by,
+        "events": n_events,
+        "seconds": round(elapsed, 3),
+        "events_per_sec": round(n_events / elapsed),
+    }
+
+
+def bench_scoring_latency(
+    batch_size: int = 32,
+    n_batches: int = 500,
+    n_train: int = 50_000,
+) -> dict:
+    """
+    Per-batch latency of ScoringService.score on a persisted-style
+    (already fitted) model: no refit, no renormalization
+    """
+    ml_features = FeatureExtractor().extract(synthetic_events(n_train))["ml_features"]
+
+    if_model = IsolationForestModel()
+    if_model.fit(ml_features)
+    baseline_trainer = BaselineTrainer()
+    baseline_trainer.fit(ml_features)
+
+    service = ScoringService(if_model, baseline_trainer, check_interval=float("inf"))
+
+    rng = np.random.default_rng(0)
+    offsets = rng.integers(0, len(ml_features) - batch_size, n_batches)
+
+    latencies = []
+    for offset in offsets:
+        batch = ml_features.iloc[offset : offset + batch_size]
+        start = time.perf_counter()
+        service.score(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "stage": "scoring_service",
+        "batch_size": batch_size,
+        "batches": n_batches,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def bench_registry_load(n_train: int = 50_000, repeats: int = 5) -> dict:
+    """
+    Cold-start cost for a scoring worker: load + verify the live
+    registry version (200-tree forest, baseline, calibration)
+    """
+    ml_features = FeatureExtractor().extract(synthetic_events(n_train))["ml_features"]
+
+    if_model = IsolationForestModel()
+    if_model.fit(ml_features)
+    baseline_trainer = BaselineTrainer()
+    baseline_trainer.fit(ml_features)
+
+    with tempfile.TemporaryDirectory() as root:
+        registry = ModelRegistry(root)
+        registry.publish(if_model, baseline_trainer.get_baseline(), list(ml_features.columns))
+
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            registry.load()
+            timings.append(time.perf_counter() - start)
+
+    return {
+        "stage": "registry_load",
+        "seconds_best": round(min(timings), 4),
+        "seconds_worst": round(max(timings), 4),
+    }
+
+
+def bench_forest_kernel(batch_sizes=(1, 64, 10_000), n_train: int = 50_000) -> list:
+    """
+    Rows/sec of IsolationForest scoring: sklearn score_samples vs the
+    flattened kernel (numba if installed, else NumPy)
+    """
+    ml_features = FeatureExtractor().extract(synthetic_events(n_train))["ml_features"]
+
+    X = ml_features.to_numpy()
+
+    if_model = IsolationForestModel(backend="sklearn")
+    if_model.fit(X)
+
+    kernels = {
+        "sklearn": if_model.model,
+        "flat_numpy": FlatForest.from_sklearn(if_model.model, use_numba=False),
+    }
+    if forest_kernel.numba is not None:
+        kernels["flat_numba"] = FlatForest.from_sklearn(if_model.model, use_numba=True)
+
+    rows = []
+    for batch_size in batch_sizes:
+        batch = X[:batch_size]
+        for name, kernel in kernels.items():
+            kernel.score_samples(batch)  # warm-up / JIT
+
+            repeats = max(3, 2_000 // batch_size)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                kernel.score_samples(batch)
+            elapsed = time.perf_counter() - start
+
+            rows.append(
+                {
+                    "stage": "forest_kernel",
+                    "backend": name,
+                    "batch_size": batch_size,
+                    "rows_per_sec": round(batch_size * repeats / elapsed),
+                }
+            )
+    return rows
+
+
+def bench_online_detector(
+    batch_sizes=(1, 64, 1024),
+    n_train: int = 50_000,
+    n_stream: int = 20_000,
+) -> list:
+    """
+    Taking in new traffic: Half-Space Trees score + update per
+    micro-batch vs refitting the Isolation Forest on the history
+    window (what ScoringService's background refit does)
+    """
+    ml_features = FeatureExtractor().extract(synthetic_events(n_train + n_stream))["ml_features"]
+    train, stream = ml_features.iloc[:n_train], ml_features.iloc[n_train:]
+
+    online = HalfSpaceTreesModel().fit(train)
+    online.score(stream.iloc[:1])  # warm-up / JIT
+    online.update(stream.iloc[:1])
+
+    rows = []
+    for batch_size in batch_sizes:
+        n = min(len(stream), batch_size * max(200, 2_000 // batch_size))
+        start = time.perf_counter()
+        for i in range(0, n, batch_size):
+            batch = stream.iloc[i : i + batch_size]
+            online.score(batch)
+            online.update(batch)
+        elapsed = time.perf_counter() - start
+        rows.append({
+            "stage": "half_space_trees",
+            "batch_size": batch_size,
+            "rows_per_sec": round(n / elapsed),
+            "ms_per_batch": round(elapsed / -(-n // batch_size) * 1000, 3),
+        })
+
+    if_model = IsolationForestModel()
+    start = time.perf_counter()
+    if_model.fit(train)
+    refit = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if_model.score(stream)
+    score = time.perf_counter() - start
+
+    rows.append({
+        "stage": "isolation_forest_refit",
+        "history_rows": n_train,
+        "refit_seconds": round(refit, 3),
+        "score_rows_per_sec": round(len(stream) / score),
+        # Refit before every batch, as an online update would need
+        **{
+            f"rows_per_sec_batch_{b}": round(b / (refit + score * b / len(stream)), 1)
+            for b in batch_sizes
+        },
+    })
+    return rows
+
+
+def bench_sharded(n_events: int = 1_000_000, workers=(1, 2, 4, 8, 16), n_ips: int = 100_000) -> list:
+    """
+    Events/sec of ShardedPipeline.extract (per-IP windows) by worker
+    count; scaling is bounded by the cores actually available
+    """
+    extractor = FeatureExtractor(group_by="src_ip")
+    events = extractor.events_to_df(synthetic_events(n_events, n_ips=n_ips))
+
+    rows = []
+    for n_workers in workers:
+        with ShardedPipeline(n_workers=n_workers) as pipeline:
+            pipeline.extract(events.iloc[:1_000])  # start the pool
+
+            start = time.perf_counter()
+            pipeline.extract(events)
+            elapsed = time.perf_counter() - start
+
+        rows.append(
+            {
+                "stage": "sharded_features",
+                "workers": n_workers,
+                "cpus": os.cpu_count(),
+                "events": n_events,
+                "seconds": round(elapsed, 3),
+                "events_per_sec": round(n_events / elapsed),
+            }
+        )
+    return rows
+
+
+def bench_api(
+    n_requests: int = 5_000,
+    concurrency: int = 64,
+    rows_per_request: int = 1,
+    max_batch_size: int = 256,
+    max_wait_ms: float = 5.0,
+    n_train: int = 20_000,
+) -> dict:
+    """
+    Load test of the scoring API against a local server process:
+    requests/sec and latency percentiles for /score/features with
+    `concurrency` keep-alive clients
+    """
+    ml_features = FeatureExtractor().extract(synthetic_events(n_train))["ml_features"]
+
+    if_model = IsolationForestModel()
+    if_model.fit(ml_features)
+    baseline_trainer = BaselineTrainer()
+    baseline_trainer.fit(ml_features)
+
+    records = ml_features.to_dict("records")
+    payloads = [
+        json.dumps({"rows": records[i : i + rows_per_request]}).encode()
+        for i in range(0, min(len(records), 1_000 * rows_per_request), rows_per_request)
+    ]
+
+    with tempfile.TemporaryDirectory() as root:
+        ModelRegistry(root).publish(
+            if_model, baseline_trainer.get_baseline(), list(ml_features.columns)
+        )
+
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "api.main",
+                "--registry", root,
+                "--store", str(Path(root) / "waf.db"),
+                "--port", str(port),
+                "--max-batch-size", str(max_batch_size),
+                "--max-wait-ms", str(max_wait_ms),
+            ],
+            cwd=Path(__file__).resolve().parents[1],
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            _wait_for(base + "/health")
+
+            start = time.perf_counter()
+            latencies = asyncio.run(
+                _load(port, "/score/features", payloads, n_requests, concurrency)
+            )
+            elapsed = time.perf_counter() - start
+
+            with urllib.request.urlopen(base + "/metrics") as response:
+                stats = json.load(response)["features"]
+        finally:
+            server.terminate()
+            server.wait()
+
+    latencies = np.asarray(latencies) * 1000
+    return {
+        "stage": "api",
+        "max_batch_size": max_batch_size,
+        "max_wait_ms": max_wait_ms,
+        "concurrency": concurrency,
+        "rows_per_request": rows_per_request,
+        "requests_per_sec": round(n_requests / elapsed),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+        "mean_batch_rows": stats["mean_batch_rows"],
+    }
+
+
+def _wait_for(url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+async def _load(port, path, payloads, n_requests, concurrency):
+    """Minimal keep-alive HTTP/1.1 client, one connection per worker"""
+    latencies = []
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            while sent < n_requests:
+                body = payloads[sent % len(payloads)]
+                sent += 1
+
+                start = time.perf_counter()
+                writer.write(
+                    f"POST {path} HTTP/1.1\r\nHost: localhost\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+
+                status = await reader.readline()
+                length = 0
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    if name.lower() == "content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+
+                if b" 200 " not in status:
+                    raise RuntimeError(f"Scoring request failed: {status!r}")
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--reference-events", type=int, default=20_000)
+    parser.add_argument("--ips", type=int, default=300_000)
+    parser.add_argument(
+        "--stages", action="store_true",
+        help="only run the per-stage pipeline benchmark (JSON report)",
+    )
+    parser.add_argument("--output", help="--stages report path")
+    parser.add_argument("--no-trace-memory", action="store_true")
+    args = parser.parse_args()
+
+    if args.stages:
+        rate = 500.0
+        scenario = TrafficScenario(
+            n_events=args.events,
+            n_ips=min(args.ips, args.events),
+            events_per_sec=rate,
+            attacks=default_attacks(args.events / rate),
+        )
+        report = bench_stages(scenario, args.output, trace_memory=not args.no_trace_memory)
+        for stage in report["stages"]:
+            print(stage)
+        print(report["detection"])
+        print(f"[INFO] Report written to {report['path']}")
+        sys.exit(0)
+
+    print(bench_feature_extraction(args.reference_events, engine="rolling"))
+    print(bench_feature_extraction(args.reference_events, engine="vectorized"))
+    print(bench_feature_extraction(args.events, engine="vectorized"))
+    print(bench_feature_extraction(args.events, group_by="src_ip", n_ips=args.ips))
+
+    for batch_size in (1, 32, 512):
+        print(bench_scoring_latency(batch_size=batch_size))
+
+    print(bench_registry_load())
+
+    for row in bench_forest_kernel():
+        print(row)
+
+    for row in bench_online_detector():
+        print(row)
+
+    for max_batch_size in (1, 256):
+        print(bench_api(max_batch_size=max_batch_size))
+
+    for row in bench_sharded(args.events):
+        print(row)
+
+    print(bench_enforcement(args.events))
@@ -1,23 +1,90 @@
+import numpy as np
 import pandas as pd
 from typing import List, Dict
 
+from explainability.feature_diff import FeatureDiff
 from explainability.templates import ExplanationTemplates
+from utils.metrics import instrumented
 
 
 class ExplanationBuilder:
     def __init__(self, baseline: Dict[str, Dict[str, float]]):
         self.baseline = baseline
 
+    @instrumented("explanations")
     def build(
         self,
         features: pd.DataFrame,
-        diffs: pd.DataFrame,
+        diffs: pd.DataFrame = None,
         min_z: float = 3.0,
+        mask=None,
     ) -> Dict[int, List[str]]:
         """
         Build explanations for each row
+        diffs: FeatureDiff output; computed here for the explained rows
+               only when omitted
+        mask: optional boolean array (e.g. results["is_anomaly"]), aligned
+              with features by position; only those rows are explained.
         Returns:
           { index: [explanations...] }
+
+        Duplicate index labels are explained from their first row, as
+        label-based lookups would.
+        """
+        first = ~features.index.duplicated()
+        if mask is not None:
+            # A label is explained if any of its rows is flagged
+            flagged = pd.Index(features.index[np.asarray(mask, dtype=bool)])
+            first &= features.index.isin(flagged)
+
+        rows = features[first]
+        labels = rows.index
+
+        if diffs is None:
+            diffs = FeatureDiff(self.baseline).diff(
+                rows[[f for f in self.baseline if f in rows.columns]]
+            )
+
+        names = [
+            f for f in self.baseline.keys()
+            if f"{f}_z" in diffs.columns and f in ExplanationTemplates.TEMPLATES
+        ]
+        if not names:
+            return {idx: [] for idx in labels}
+
+        aligned = diffs[~diffs.index.duplicated()].reindex(labels)
+        z = aligned[[f"{f}_z" for f in names]].to_numpy(dtype=np.float64)
+        above_p99 = aligned[[f"{f}_above_p99" for f in names]].to_numpy(
+            dtype=np.float64, na_value=0.0
+        ) != 0
+
+        with np.errstate(invalid="ignore"):
+            hits = (np.abs(z) >= min_z) | above_p99
+
+        # Render column by column, appending in baseline feature order
+        reasons = [[] for _ in range(len(labels))]
+        for j, feature in enumerate(names):
+            positions = np.flatnonzero(hits[:, j])
+            if len(positions) == 0:
+                continue
+
+            template = ExplanationTemplates.TEMPLATES[feature]
+            p99 = float(self.baseline[feature]["p99"])
+            values = rows[feature].to_numpy(dtype=np.float64)[positions].tolist()
+
+            for pos, value in zip(positions.tolist(), values):
+                reasons[pos].append(template.format(value=value, p99=p99))
+
+        return dict(zip(labels, reasons))
+
+    def _build_rowwise(
+        self,
+        features: pd.DataFrame,
+        diffs: pd.DataFrame,
+        min_z: float = 3.0,
+    ) -> Dict[int, List[str]]:
+        """
+        Original row-by-row builder, kept as the reference implementation
         """
 
         explanations = {}
@@ -0,0 +1,178 @@
+# feature_engineering/aggregations.py
+
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+
+class PrecomputedWindowIndexer(BaseIndexer):
+    """
+    Rolling indexer over precomputed [start, end) bounds.
+    Lets pandas' Cython kernels (mean/std/max) run on windows
+    we computed ourselves, e.g. time windows or per-entity windows.
+    """
+
+    def __init__(self, starts: np.ndarray, ends: np.ndarray):
+        super().__init__(window_size=0)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+
+    def get_window_bounds(
+        self,
+        num_values: int = 0,
+        min_periods=None,
+        center=None,
+        closed=None,
+        step=None,
+    ):
+        return self.starts, self.ends
+
+
+# ------------------------------------------------------------------
+# Window bounds
+# ------------------------------------------------------------------
+
+def time_window_starts(timestamps_ns: np.ndarray, window_ns: int) -> np.ndarray:
+    """
+    Start index of the (t - window, t] window ending at each row.
+    Same bounds as pandas' time-based rolling (closed="right").
+    timestamps_ns must be sorted.
+    """
+    return np.searchsorted(
+        timestamps_ns, timestamps_ns - window_ns, side="right"
+    ).astype(np.int64)
+
+
+def grouped_time_window_starts(
+    groups: np.ndarray,
+    timestamps_ns: np.ndarray,
+    window_ns: int,
+) -> np.ndarray:
+    """
+    Per-entity version of time_window_starts.
+    Rows must be sorted by (group, timestamp); windows never cross
+    a group boundary.
+
+    Timestamps are replaced by their dense rank so (group, rank) packs
+    into one sorted int64 key, and all bounds come from a single
+    searchsorted instead of one pass per group.
+    """
+    groups = np.asarray(groups, dtype=np.int64)
+    unique_ts, ts_rank = np.unique(timestamps_ns, return_inverse=True)
+    lower = np.searchsorted(unique_ts, timestamps_ns - window_ns, side="right")
+
+    stride = len(unique_ts) + 1
+    keys = groups * stride + ts_rank
+
+    return np.searchsorted(keys, groups * stride + lower, side="left").astype(np.int64)
+
+
+# ------------------------------------------------------------------
+# Sliding aggregations
+#
+# All functions take the window start of each row (windows end at the
+# row itself) and require starts to be non-decreasing.
+# ------------------------------------------------------------------
+
+def rolling_count(valid: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Number of truthy values per window (cumulative sums)"""
+    csum = np.concatenate(([0], np.cumsum(valid, dtype=np.int64)))
+    return csum[1:] - csum[starts]
+
+
+def rolling_fraction(mask: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Fraction of True values per window (cumulative sums)"""
+    n = np.arange(1, len(starts) + 1) - starts
+    return rolling_count(mask, starts) / n
+
+
+def _previous_occurrence(codes: np.ndarray):
+    """
+    For every row, the index of the previous row with the same code
+    (-1 if none), plus the code-major stable ordering used to build it.
+    """
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+
+    prev_sorted = np.full(len(codes), -1, dtype=np.int64)
+    same = sorted_codes[1:] == sorted_codes[:-1]
+    prev_sorted[1:][same] = order[:-1][same]
+
+    prev = np.empty(len(codes), dtype=np.int64)
+    prev[order] = prev_sorted
+    return prev, order
+
+
+def rolling_nunique(codes: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Distinct codes per window.
+
+    Row j adds one distinct value to every window that contains j but
+    not the previous occurrence of its code, i.e. windows i with
+    j <= i and prev[j] < starts[i] <= j. Those windows form a contiguous
+    range, so the counts come out of one difference array.
+    """
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    codes = np.asarray(codes, dtype=np.int64)
+    prev, _ = _previous_occurrence(codes)
+    rows = np.arange(n)
+
+    lo = np.maximum(rows, np.searchsorted(starts, prev, side="right"))
+    hi = np.searchsorted(starts, rows, side="right")
+
+    keep = lo < hi
+    delta = np.bincount(lo[keep], minlength=n + 1)
+    delta -= np.bincount(hi[keep], minlength=n + 1)
+
+    return np.cumsum(delta)[:n]
+
+
+def _xlogx(c: np.ndarray) -> np.ndarray:
+    c = c.astype(np.float64)
+    return c * np.log(np.where(c > 0, c, 1.0))
+
+
+def rolling_entropy(codes: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """
+    Shannon entropy (nats) of the code histogram per window, equal to
+    scipy.stats.entropy(np.bincount(window)).
+
+    Uses H = log(n) - S / n with S = sum_k c_k log c_k. S is maintained
+    as a sliding counter: moving from window i-1 to i removes the rows
+    in [starts[i-1], starts[i]) and adds row i, and the count each of
+    those rows sees is read off a code-major sort with searchsorted.
+    """
+    n = len(codes)
+    if n == 0:
+        return np.zeros(0, dtype=np.float64)
+
+    codes = np.asarray(codes, dtype=np.int64)
+    codes = codes - codes.min()
+    rows = np.arange(n, dtype=np.int64)
+
+    _, order = _previous_occurrence(codes)
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = rows
+    sorted_keys = codes[order] * n + order
+
+    # Row i joins its window holding c same-code rows in [starts[i], i)
+    c_add = rank - np.searchsorted(sorted_keys, codes * n + starts, side="left")
+    step_delta = _xlogx(c_add + 1) - _xlogx(c_add)
+
+    # Row j leaves at the first window starting after it, when the
+    # window holds c same-code rows in [j, step)
+    leave = np.searchsorted(starts, rows, side="right")
+    gone = leave < n
+    j, step = rows[gone], leave[gone]
+    c_rem = np.searchsorted(sorted_keys, codes[j] * n + step, side="left") - rank[j]
+    step_delta += np.bincount(
+        step, weights=_xlogx(c_rem - 1) - _xlogx(c_rem), minlength=n
+    )
+
+    s = np.cumsum(step_delta.astype(np.longdouble)).astype(np.float64)
+    counts = (rows - starts + 1).astype(np.float64)
+
+    return np.maximum(np.log(counts) - s / counts, 0.0)
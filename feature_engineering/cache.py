@@ -0,0 +1,137 @@
+# feature_engineering/cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import METRICS
+
+
+# Source files whose content defines the feature values
+FEATURE_SOURCES = ("extractor.py", "aggregations.py")
+
+CACHE_LOOKUPS = METRICS.counter(
+    "waf_feature_cache_lookups_total", "Feature cache lookups per partition", ("result",)
+)
+
+
+def feature_code_version() -> str:
+    """Hash of the feature code: any change to it invalidates the cache"""
+    digest = hashlib.sha256()
+    for name in FEATURE_SOURCES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    Content-addressed on-disk cache of behavioral features per time
+    partition (FeatureExtractor(cache=...)).
+
+    Layout:
+      <root>/<code version>/<key>.npz   one columnar frame per partition
+
+    The key hashes the partition's input rows - including the window
+    halo before it - plus the extractor config, so a partition is only
+    recomputed when its input, the config or the feature code changes.
+    Entries of other code versions are deleted on open; past max_bytes
+    the least recently used entries are evicted (file mtime is the
+    access time).
+    """
+
+    def __init__(
+        self,
+        root="data/feature_cache",
+        partition: str = "1h",
+        max_bytes: int = 2**30,
+        version: Optional[str] = None,
+    ):
+        self.root = Path(root)
+        self.partition = partition
+        self.max_bytes = max_bytes
+        self.version = version or feature_code_version()
+
+        self.path = self.root / self.version
+        self.path.mkdir(parents=True, exist_ok=True)
+        for stale in self.root.iterdir():
+            if stale.is_dir() and stale.name != self.version:
+                shutil.rmtree(stale, ignore_errors=True)
+
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, frame: pd.DataFrame, config: dict) -> str:
+        digest = hashlib.sha256(json.dumps(config, sort_keys=True).encode())
+        digest.update(",".join(frame.columns).encode())
+        digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    # ------------------------------
+    # Entries
+    # ------------------------------
+    def load(self, key: str) -> Optional[pd.DataFrame]:
+        path = self.path / f"{key}.npz"
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                columns = data["columns"].tolist()
+                frame = pd.DataFrame(
+                    {name: data[f"c{i}"] for i, name in enumerate(columns)},
+                    index=pd.DatetimeIndex(data["index"], name="timestamp"),
+                )
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            self.misses += 1
+            CACHE_LOOKUPS.labels("miss").inc()
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        CACHE_LOOKUPS.labels("hit").inc()
+        return frame
+
+    def save(self, key: str, frame: pd.DataFrame):
+        # Written under a temporary name, then renamed: readers never
+        # see a partial entry
+        tmp = self.path / f".{key}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                index=frame.index.to_numpy(),
+                columns=np.array(list(frame.columns)),
+                **{f"c{i}": frame[name].to_numpy() for i, name in enumerate(frame.columns)},
+            )
+        os.replace(tmp, self.path / f"{key}.npz")
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        entries = []
+        for path in self.path.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def size_bytes(self) -> int:
+        return sum(path.stat().st_size for path in self.path.glob("*.npz"))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self.path.glob("*.npz"))
+
+    def clear(self):
+        for path in self.path.glob("*.npz"):
+            path.unlink(missing_ok=True)
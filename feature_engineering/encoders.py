@@ -0,0 +1,228 @@
+# feature_engineering/encoders.py
+
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+
+# String columns of TrafficEvent, stored as dictionary codes
+ENCODED_COLUMNS = ("src_ip", "method", "uri_path", "user_agent")
+
+# Narrow dtypes for the numeric event columns
+NUMERIC_DTYPES = {
+    "status_code": np.int16,
+    "payload_size": np.int32,
+    "response_time_ms": np.float32,
+}
+
+# Dictionary size caps: past them, evict() drops the least recently seen
+# values, so an IP / URI scan cannot grow the encoders (and their
+# persisted state) without bound
+MAX_DICTIONARY_SIZES = {
+    "src_ip": 500_000,
+    "method": 1_000,
+    "uri_path": 100_000,
+    "user_agent": 100_000,
+}
+
+
+class DictionaryEncoder:
+    """
+    Persistent, growable value -> int32 code mapping.
+
+    Codes are assigned in order of first appearance, so codes from
+    different batches (or runs, once persisted) compare directly.
+    Missing values are -1, like pd.factorize.
+
+    Values are always stored exactly. Once more than max_size are known,
+    evict() drops the least recently encoded ones and renumbers the rest;
+    it only runs when the caller asks (between batches), since it
+    invalidates codes held outside the encoder.
+    """
+
+    def __init__(self, values: Iterable[str] = (), max_size: Optional[int] = None):
+        self.values = []
+        self.codes: Dict[str, int] = {}
+        self.max_size = max_size
+        self._seen = []  # per code: generation (encode call) it was last seen in
+        self._generation = 0
+        self._categories = None
+        self._decoded = None
+        self.extend(values)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def extend(self, values: Iterable[str]):
+        """Append values as they are, e.g. a dictionary persisted elsewhere"""
+        for value in values:
+            self.codes[value] = len(self.values)
+            self.values.append(value)
+            self._seen.append(self._generation)
+
+    def encode(self, values) -> np.ndarray:
+        # Dictionary lookups once per distinct value in the batch
+        batch_codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        self._generation += 1
+        mapped = np.empty(len(uniques) + 1, dtype=np.int32)
+        mapped[-1] = -1
+        for i, value in enumerate(uniques.tolist()):
+            code = self.codes.get(value)
+            if code is None:
+                code = self.codes[value] = len(self.values)
+                self.values.append(value)
+                self._seen.append(self._generation)
+            else:
+                self._seen[code] = self._generation
+            mapped[i] = code
+        return mapped[batch_codes]
+
+    def evict(self, keep: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Past max_size, keep the most recently seen values (down to 3/4 of
+        max_size, so evictions are rare) plus the codes in keep.
+
+        Returns old code -> new code (-1 if evicted), or None if nothing
+        changed. Kept values keep their relative order.
+        """
+        if self.max_size is None or len(self.values) <= self.max_size:
+            return None
+
+        seen = np.asarray(self._seen)
+        # Most recently seen first, newest code first among equals
+        order = np.lexsort((-np.arange(len(seen)), -seen))
+        kept = np.zeros(len(seen), dtype=bool)
+        kept[order[: self.max_size * 3 // 4]] = True
+        if keep is not None:
+            keep = np.asarray(keep)
+            kept[keep[keep >= 0]] = True
+
+        survivors = np.flatnonzero(kept)
+        remap = np.full(len(seen), -1, dtype=np.int32)
+        remap[survivors] = np.arange(len(survivors), dtype=np.int32)
+
+        self.values = [self.values[i] for i in survivors.tolist()]
+        self.codes = {value: code for code, value in enumerate(self.values)}
+        self._seen = seen[survivors].tolist()
+        self._categories = None
+        self._decoded = None
+        return remap
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        # Rebuilt only after the dictionary changed, like categories
+        if self._decoded is None or len(self._decoded) != len(self.values) + 1:
+            self._decoded = np.asarray(self.values + [None], dtype=object)
+        return self._decoded[np.asarray(codes)]
+
+    @property
+    def categories(self) -> pd.Index:
+        # Rebuilt only after the dictionary changed; one shared Index keeps
+        # categoricals of different batches concatenable
+        if self._categories is None or len(self._categories) != len(self.values):
+            self._categories = pd.Index(self.values, dtype=object)
+        return self._categories
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        return pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(self.categories))
+
+
+class EventEncoders:
+    """
+    Dictionary encoders for the string columns of an event frame, plus
+    narrow numeric dtypes.
+
+    compact() turns an event frame into int32 code columns (cheap to
+    concatenate and to keep); categorize() turns codes back into
+    categoricals sharing the encoders' categories, which is what the
+    feature extractor reads: group-bys and distinct counts run on the
+    codes, while values still read as strings.
+    """
+
+    def __init__(
+        self,
+        encoders: Optional[Dict[str, DictionaryEncoder]] = None,
+        max_sizes: Optional[Dict[str, int]] = None,
+    ):
+        """max_sizes: per-column dictionary caps (default MAX_DICTIONARY_SIZES)"""
+        max_sizes = {**MAX_DICTIONARY_SIZES, **(max_sizes or {})}
+        self.encoders = encoders or {
+            name: DictionaryEncoder(max_size=max_sizes.get(name)) for name in ENCODED_COLUMNS
+        }
+
+    def __getitem__(self, name: str) -> DictionaryEncoder:
+        return self.encoders[name]
+
+    def compact(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Event frame with int32 code columns and narrow numerics"""
+        df = df.copy()
+        for name, encoder in self.encoders.items():
+            if name in df:
+                df[name] = self._codes(encoder, df[name])
+
+        for name, dtype in NUMERIC_DTYPES.items():
+            if name in df:
+                df[name] = df[name].to_numpy().astype(dtype)
+        return df
+
+    def categorize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Code columns (or categoricals with other categories, e.g. from
+        before the encoders grew) to categoricals with the current
+        categories
+        """
+        df = df.copy()
+        for name, encoder in self.encoders.items():
+            if name not in df:
+                continue
+            column = df[name]
+            if isinstance(column.dtype, pd.CategoricalDtype):
+                if column.cat.categories is encoder.categories:
+                    continue
+                codes = self._codes(encoder, column)
+            elif pd.api.types.is_integer_dtype(column.dtype):
+                codes = column.to_numpy()
+            else:
+                codes = encoder.encode(column.to_numpy())
+            df[name] = encoder.categorical(codes)
+        return df
+
+    @staticmethod
+    def _codes(encoder: DictionaryEncoder, column: pd.Series) -> np.ndarray:
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Encode the categories once, then map the codes
+            mapped = np.append(encoder.encode(column.cat.categories), np.int32(-1))
+            return mapped[column.cat.codes.to_numpy()]
+        return encoder.encode(column.to_numpy())
+
+    def encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.categorize(self.compact(df))
+
+    def evict(self, df: Optional[pd.DataFrame] = None) -> Optional[pd.DataFrame]:
+        """
+        Evict past the size caps (DictionaryEncoder.evict). The codes in
+        df's code columns are kept; df is returned with them renumbered.
+        Categoricals built before keep their (old) categories and values.
+        """
+        if df is not None:
+            df = df.copy()
+        for name, encoder in self.encoders.items():
+            codes = df[name].to_numpy() if df is not None and name in df else None
+            remap = encoder.evict(codes)
+            if remap is not None and codes is not None:
+                df[name] = np.where(codes >= 0, remap[codes], -1).astype(np.int32)
+        return df
+
+    # ------------------------------
+    # Serialization (via BaselineStore)
+    # ------------------------------
+    def state_dict(self) -> dict:
+        return {name: list(encoder.values) for name, encoder in self.encoders.items()}
+
+    @classmethod
+    def from_state(cls, state: dict, max_sizes: Optional[Dict[str, int]] = None) -> "EventEncoders":
+        max_sizes = {**MAX_DICTIONARY_SIZES, **(max_sizes or {})}
+        return cls({
+            name: DictionaryEncoder(values, max_size=max_sizes.get(name))
+            for name, values in state.items()
+        })
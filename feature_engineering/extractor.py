@@ -1,20 +1,136 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict
+from dataclasses import fields
+from typing import Iterable, List, Dict, Optional, Union
 from scipy.stats import entropy
 
-from ingestion.schema import TrafficEvent
+from baseline.sketches import FrequencySketch
+from feature_engineering.cache import FeatureCache
+from feature_engineering.encoders import EventEncoders
+from ingestion.schema import TrafficEvent, EventBatch
+from utils.metrics import instrumented
+from feature_engineering.aggregations import (
+    PrecomputedWindowIndexer,
+    time_window_starts,
+    grouped_time_window_starts,
+    rolling_count,
+    rolling_fraction,
+    rolling_nunique,
+    rolling_entropy,
+)
+
+
+ENGINES = ("vectorized", "rolling")
+
+ML_FEATURES = [
+    "req_rate",
+    "unique_uri_count",
+    "payload_size_mean",
+    "payload_entropy",
+    "error_rate_4xx",
+    "error_rate_5xx",
+    "avg_response_time",
+    "endpoint_rarity",
+    "interarrival_mean",
+    "interarrival_std",
+    "burstiness",
+]
+
+# Event columns the features are computed from (plus group_by); the
+# rest of an event frame only travels along as context
+INPUT_COLUMNS = [
+    "timestamp",
+    "method",
+    "uri_path",
+    "status_code",
+    "payload_size",
+    "response_time_ms",
+]
 
 
 class FeatureExtractor:
-    def __init__(self, window: str = "1min"):
+    def __init__(
+        self,
+        window: str = "1min",
+        engine: str = "vectorized",
+        group_by: Optional[Union[str, List[str]]] = None,
+        endpoint_freq: Optional[Union[pd.Series, FrequencySketch]] = None,
+        cache: Optional[FeatureCache] = None,
+        encoders: Optional[EventEncoders] = None,
+    ):
+        """
+        engine:
+          vectorized - sliding counters / cumulative sums (default)
+          rolling    - reference implementation with per-window lambdas
+        group_by:
+          None for one window over all traffic, or entity columns
+          (e.g. "src_ip", ["src_ip", "user_agent"]) to keep a separate
+          window per entity
+        endpoint_freq:
+          uri_path -> relative frequency used for endpoint_rarity instead
+          of the frequencies in the frame being extracted (e.g. global
+          frequencies when each worker only sees one shard), or a
+          FrequencySketch of the traffic history (updated by the caller;
+          StreamingFeatureExtractor updates it with each new batch)
+        cache:
+          FeatureCache: behavioral features are computed per time
+          partition (with the window halo before it) and only for
+          partitions whose input changed. endpoint_rarity depends on
+          global frequencies, so it is never cached.
+        encoders:
+          EventEncoders: event frames are built with dictionary-encoded
+          categorical string columns (codes stable across batches) and
+          narrow numeric dtypes; windows group and count distinct values
+          on the integer codes
+        """
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown feature engine: {engine}")
+
+        if isinstance(group_by, str):
+            group_by = [group_by]
+
+        if group_by and engine != "vectorized":
+            raise ValueError("group_by requires the vectorized engine")
+
         self.window = window
+        self.engine = engine
+        self.group_by = list(group_by) if group_by else []
+        self.endpoint_freq = endpoint_freq
+        self.cache = cache
+        self.encoders = encoders
+
+    @property
+    def input_columns(self) -> List[str]:
+        """Event columns extraction reads (e.g. an EventArchive projection)"""
+        return INPUT_COLUMNS + [c for c in self.group_by if c not in INPUT_COLUMNS]
 
     def events_to_df(self, events: List[TrafficEvent]) -> pd.DataFrame:
         """Convert TrafficEvent list to DataFrame"""
-        df = pd.DataFrame([e.__dict__ for e in events])
+        df = pd.DataFrame(
+            {f.name: [getattr(e, f.name) for e in events] for f in fields(TrafficEvent)}
+        )
         df["timestamp"] = pd.to_datetime(df["timestamp"])
         df = df.sort_values("timestamp")
+        if self.encoders is not None:
+            df = self.encoders.encode(df)
+        return df
+
+    def batches_to_df(self, batches: Iterable[EventBatch]) -> pd.DataFrame:
+        """Concatenate columnar EventBatch blocks into one DataFrame"""
+        # With encoders, every block is reduced to codes as it arrives:
+        # only one block's worth of Python strings is alive at a time
+        frames = [
+            batch.to_frame() if self.encoders is None else self.encoders.compact(batch.to_frame())
+            for batch in batches
+        ]
+        if not frames:
+            frames = [pd.DataFrame(columns=[f.name for f in fields(TrafficEvent)])]
+
+        df = pd.concat(frames, ignore_index=True)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        df = df.sort_values("timestamp")
+        if self.encoders is not None:
+            df = self.encoders.categorize(df)
         return df
 
     def extract(self, events: List[TrafficEvent]) -> Dict[str, pd.DataFrame]:
@@ -27,10 +143,23 @@ class FeatureExtractor:
             ml_features
           }
         """
-        df = self.events_to_df(events)
+        return self.extract_frame(self.events_to_df(events))
+
+    def extract_batches(self, batches: Iterable[EventBatch]) -> Dict[str, pd.DataFrame]:
+        """Same as extract(), from NginxLogReader.read_batches() output"""
+        return self.extract_frame(self.batches_to_df(batches))
+
+    @instrumented("feature_extraction")
+    def extract_frame(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Same as extract(), from an event DataFrame sorted by timestamp"""
+        if self.encoders is not None:
+            df = self.encoders.categorize(df)
         df = self._add_temporal_features(df)
 
-        behavioral = self._compute_behavioral_features(df)
+        if self.cache is not None:
+            behavioral = self._cached_behavioral_features(df)
+        else:
+            behavioral = self._compute_behavioral_features(df)
         ml_features = self._select_ml_features(behavioral)
 
         return {
@@ -44,20 +173,140 @@ class FeatureExtractor:
 
     def _add_temporal_features(self, df: pd.DataFrame) -> pd.DataFrame:
         df["time_of_day"] = df["timestamp"].dt.hour
-        df["interarrival"] = df["timestamp"].diff().dt.total_seconds().fillna(0)
+
+        timestamps = df["timestamp"]
+        if self.group_by:
+            timestamps = df.groupby(self.group_by, sort=False, dropna=False)["timestamp"]
+
+        df["interarrival"] = timestamps.diff().dt.total_seconds().fillna(0)
         return df
 
     def _compute_behavioral_features(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Compute rolling-window behavioral features.
-        Assumes df has timestamp index.
+        Assumes df has timestamp column, sorted.
+        """
+        if self.engine == "rolling":
+            return self._compute_behavioral_features_rolling(df)
+
+        df = df.set_index("timestamp")
+
+        window_ns = pd.to_timedelta(self.window).value
+        timestamps = df.index.as_unit("ns").asi8
+
+        if not self.group_by:
+            starts = time_window_starts(timestamps, window_ns)
+            return self._window_features(df, starts)
+
+        # -------------------------------
+        # Per-entity windows: sort rows into contiguous (entity, time)
+        # segments, compute every window in one pass, restore order
+        # -------------------------------
+        entities = df.groupby(self.group_by, sort=False, dropna=False).ngroup().to_numpy()
+        order = np.argsort(entities, kind="stable")
+
+        starts = grouped_time_window_starts(
+            entities[order], timestamps[order], window_ns
+        )
+        features = self._window_features(df.iloc[order], starts)
+
+        restore = np.empty_like(order)
+        restore[order] = np.arange(len(order))
+        return features.iloc[restore]
+
+    def _window_features(self, df: pd.DataFrame, starts: np.ndarray) -> pd.DataFrame:
+        """
+        Vectorized behavioral features.
+        starts[i] is the first row of the window ending at row i.
+        """
+        ends = np.arange(1, len(df) + 1)
+        indexer = PrecomputedWindowIndexer(starts, ends)
+
+        numeric_cols = [
+            "payload_size",
+            "status_code",
+            "response_time_ms",
+            "interarrival",
+        ]
+
+        rolling = df[numeric_cols].rolling(indexer, min_periods=1)
+
+        features = pd.DataFrame(index=df.index)
+
+        # -------------------------------
+        # Volume / rate
+        # -------------------------------
+        features["req_count"] = rolling_count(
+            df["uri_path"].notna().to_numpy(), starts
+        ).astype(float)
+        features["req_rate"] = (
+            features["req_count"]
+            / pd.to_timedelta(self.window).total_seconds()
+            * 60
+        )
+
+        uri_codes = _codes(df["uri_path"])
+        method_codes = _codes(df["method"])
+
+        features["unique_uri_count"] = rolling_nunique(uri_codes, starts).astype(float)
+        features["unique_method_count"] = rolling_nunique(method_codes, starts).astype(float)
+
+        # -------------------------------
+        # Payload statistics
+        # -------------------------------
+        features["payload_size_mean"] = rolling["payload_size"].mean().to_numpy()
+        features["payload_size_std"] = rolling["payload_size"].std().to_numpy()
+        features["payload_size_max"] = rolling["payload_size"].max().to_numpy()
+
+        # -------------------------------
+        # Payload entropy
+        # -------------------------------
+        payload_codes, _ = pd.factorize(df["payload_size"].to_numpy().astype(int))
+        features["payload_entropy"] = rolling_entropy(payload_codes, starts)
+
+        # -------------------------------
+        # Error rates
+        # -------------------------------
+        status = df["status_code"].to_numpy()
+        features["error_rate_4xx"] = rolling_fraction(
+            (status >= 400) & (status < 500), starts
+        )
+        features["error_rate_5xx"] = rolling_fraction(status >= 500, starts)
+
+        # -------------------------------
+        # Response time
+        # -------------------------------
+        features["avg_response_time"] = rolling["response_time_ms"].mean().to_numpy()
+
+        # -------------------------------
+        # Temporal behavior
+        # -------------------------------
+        features["interarrival_mean"] = rolling["interarrival"].mean().to_numpy()
+        features["interarrival_std"] = rolling["interarrival"].std().to_numpy()
+
+        features["burstiness"] = (
+            features["interarrival_std"]
+            / features["interarrival_mean"].replace(0, np.nan)
+        ).fillna(0)
+
+        # -------------------------------
+        # Endpoint rarity (global)
+        # -------------------------------
+        features["endpoint_rarity"] = self._endpoint_rarity(df["uri_path"])
+
+        return features.fillna(0)
+
+    def _compute_behavioral_features_rolling(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reference implementation: per-window lambdas via rolling().apply.
+        Kept for parity checks against the vectorized engine.
         """
 
         df = df.set_index("timestamp")
 
         # Encode categorical columns for rolling ops
-        df["_uri_code"], _ = pd.factorize(df["uri_path"])
-        df["_method_code"], _ = pd.factorize(df["method"])
+        df["_uri_code"] = _codes(df["uri_path"])
+        df["_method_code"] = _codes(df["method"])
 
         # -------------------------------
         # Numeric-only dataframe
@@ -153,10 +402,7 @@ class FeatureExtractor:
         # -------------------------------
         # Endpoint rarity (global)
         # -------------------------------
-        endpoint_freq = df["uri_path"].value_counts(normalize=True)
-        features["endpoint_rarity"] = df["uri_path"].map(
-            lambda x: 1 / endpoint_freq.get(x, 1)
-        )
+        features["endpoint_rarity"] = self._endpoint_rarity(df["uri_path"])
 
         # -------------------------------
         # Cleanup
@@ -166,20 +412,161 @@ class FeatureExtractor:
 
         return features
 
+    def _cached_behavioral_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Behavioral features per cache partition. Each partition is
+        extracted together with its halo: the rows of the preceding
+        window plus, per entity, the last row before it (interarrival),
+        which is exactly the history its windows see.
+        """
+        if df.empty:
+            return self._compute_behavioral_features(df)
+
+        df = df.reset_index(drop=True)
+        timestamps = df["timestamp"].to_numpy(dtype="M8[ns]")
+        window = np.timedelta64(pd.to_timedelta(self.window).value, "ns")
+
+        partitions = df["timestamp"].dt.floor(self.cache.partition).to_numpy(dtype="M8[ns]")
+        bounds = np.flatnonzero(np.r_[True, partitions[1:] != partitions[:-1], True])
+
+        # Previous row of the same entity, for the per-entity halo rows
+        if self.group_by:
+            entities = df.groupby(self.group_by, sort=False, dropna=False).ngroup().to_numpy()
+        else:
+            entities = np.zeros(len(df), dtype=np.int64)
+        order = np.argsort(entities, kind="stable")
+        previous = np.full(len(df), -1)
+        same = entities[order[1:]] == entities[order[:-1]]
+        previous[order[1:][same]] = order[:-1][same]
+
+        config = {
+            "window": self.window,
+            "engine": self.engine,
+            "group_by": self.group_by,
+            "partition": self.cache.partition,
+            "features": ML_FEATURES,
+        }
+
+        parts = []
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            recent = int(np.searchsorted(timestamps, partitions[lo] - window, side="left"))
+            _, first = np.unique(entities[recent:hi], return_index=True)
+            older = np.sort(previous[recent + first])
+            older = older[(older >= 0) & (older < recent)]
+
+            rows = np.concatenate([older, np.arange(recent, hi)])
+            frame = df.iloc[rows]
+            key = self.cache.key(frame, config)
+
+            features = self.cache.load(key)
+            if features is None:
+                features = self._compute_behavioral_features(frame.copy())
+                features = features.iloc[len(rows) - (hi - lo):].drop(columns="endpoint_rarity")
+                # The open (last) partition still grows: not worth keeping
+                if hi < len(df):
+                    self.cache.save(key, features)
+            parts.append(features)
+
+        behavioral = pd.concat(parts)
+        behavioral["endpoint_rarity"] = self._endpoint_rarity(df["uri_path"])
+        return behavioral
+
+    def _endpoint_rarity(self, uri_path: pd.Series) -> np.ndarray:
+        """1 / relative frequency; unknown endpoints get 1 (as before)"""
+        if isinstance(uri_path.dtype, pd.CategoricalDtype):
+            # Once per endpoint present in the batch (not per dictionary
+            # entry), then gathered by code
+            present, inverse = np.unique(uri_path.cat.codes.to_numpy(), return_inverse=True)
+            known = present >= 0
+            rarity = np.ones(len(present))
+            if self.endpoint_freq is None:
+                counts = np.bincount(inverse, minlength=len(present))[known]
+                rarity[known] = 1 / (counts / max(counts.sum(), 1))
+            else:
+                rarity[known] = self._endpoint_rarity(
+                    pd.Series(uri_path.cat.categories.take(present[known]), dtype=object)
+                )
+            return rarity[inverse]
+
+        endpoint_freq = self.endpoint_freq
+        if endpoint_freq is None:
+            endpoint_freq = uri_path.value_counts(normalize=True)
+
+        if isinstance(endpoint_freq, FrequencySketch):
+            freq = endpoint_freq.frequency(uri_path.to_numpy(dtype=object))
+            freq[freq == 0] = 1
+        else:
+            freq = uri_path.map(endpoint_freq).fillna(1).to_numpy(dtype=np.float64)
+        return 1 / freq
+
     def _select_ml_features(self, behavioral: pd.DataFrame) -> pd.DataFrame:
         """Final ML feature vector"""
-        return behavioral[
-            [
-                "req_rate",
-                "unique_uri_count",
-                "payload_size_mean",
-                "payload_entropy",
-                "error_rate_4xx",
-                "error_rate_5xx",
-                "avg_response_time",
-                "endpoint_rarity",
-                "interarrival_mean",
-                "interarrival_std",
-                "burstiness",
-            ]
-        ]
+        return behavioral[ML_FEATURES]
+
+
+def _codes(column: pd.Series) -> np.ndarray:
+    """Integer codes of a column: the dictionary codes when encoded"""
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return pd.factorize(column)[0]
+
+
+class StreamingFeatureExtractor:
+    """
+    Incremental wrapper around FeatureExtractor for follow mode.
+
+    Keeps the trailing window of already-seen events (plus the last
+    older event, per entity when grouping) as a halo, so features for
+    newly arrived events see the same window they would in a full
+    batch run, without recomputing the history.
+    """
+
+    def __init__(self, extractor: FeatureExtractor):
+        self.extractor = extractor
+        self.window = pd.to_timedelta(extractor.window)
+        self.halo: Optional[pd.DataFrame] = None
+
+    def update(self, batch: Union[EventBatch, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+        """
+        Features for the events in batch only (same keys as extract())
+        """
+        new = batch.to_frame() if isinstance(batch, EventBatch) else batch.copy()
+        new["timestamp"] = pd.to_datetime(new["timestamp"])
+
+        # Halo events were counted with their own batch
+        if isinstance(self.extractor.endpoint_freq, FrequencySketch):
+            self.extractor.endpoint_freq.update(new["uri_path"])
+
+        # Encoded: the halo is kept as codes, categories are only
+        # attached to the frame being extracted
+        if self.extractor.encoders is not None:
+            new = self.extractor.encoders.compact(new)
+        new["_new"] = True
+
+        frames = [new] if self.halo is None else [self.halo.assign(_new=False), new]
+        df = pd.concat(frames, ignore_index=True)
+        df = df.sort_values("timestamp", kind="stable")
+
+        is_new = df.pop("_new").to_numpy(dtype=bool)
+        self._update_halo(df)
+
+        output = self.extractor.extract_frame(df.copy())
+
+        # Past the dictionary caps: the output already holds its values
+        # as categoricals, only the halo codes need to survive
+        if self.extractor.encoders is not None:
+            self.halo = self.extractor.encoders.evict(self.halo)
+
+        return {key: frame[is_new] for key, frame in output.items()}
+
+    def _update_halo(self, df: pd.DataFrame):
+        cutoff = df["timestamp"].iloc[-1] - self.window
+        recent = df["timestamp"] > cutoff
+
+        older = df[~recent]
+        if self.extractor.group_by:
+            older = older.groupby(self.extractor.group_by, sort=False, dropna=False).tail(1)
+        else:
+            older = older.tail(1)
+
+        self.halo = pd.concat([older, df[recent]], ignore_index=True)
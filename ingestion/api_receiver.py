@@ -0,0 +1,392 @@
+# ingestion/api_receiver.py
+
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from ingestion.log_reader import NginxLogReader, _decode_lines
+from ingestion.schema import EventBatch
+from utils.logger import get_logger
+from utils.metrics import METRICS, SIZE_BUCKETS
+
+try:
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.responses import PlainTextResponse
+except ImportError:  # optional HTTP endpoint
+    FastAPI = None
+
+
+POLICIES = ("block", "drop_newest", "drop_oldest")
+
+logger = get_logger()
+
+# Field -> check; nginx renders $request_time etc. as strings, so numeric
+# fields accept anything the column dtypes in parse_lines can convert
+REQUIRED_FIELDS = {
+    "timestamp": datetime.fromisoformat,
+    "src_ip": str,
+    "method": str,
+    "uri_path": str,
+    "status_code": int,
+    "payload_size": int,
+    "response_time_ms": float,
+    "user_agent": str,
+}
+
+
+def parse_push_lines(lines: List[bytes]) -> Tuple[Optional[EventBatch], int]:
+    """
+    Validate pushed JSON lines into an EventBatch (same field mapping as
+    NginxLogReader). Returns (batch or None, number of rejected lines).
+    The whole block is parsed in one go; only a block that fails falls
+    back to line-by-line validation.
+    """
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return None, 0
+
+    try:
+        return NginxLogReader.parse_lines(lines), 0
+    except (ValueError, KeyError, TypeError):
+        pass
+
+    valid = []
+    for line in lines:
+        try:
+            row = _decode_lines([line])[0]
+        except ValueError:
+            continue
+        if _is_valid(row):
+            valid.append(line)
+
+    batch = NginxLogReader.parse_lines(valid) if valid else None
+    return batch, len(lines) - len(valid)
+
+
+def _is_valid(row) -> bool:
+    if not isinstance(row, dict):
+        return False
+    for name, check in REQUIRED_FIELDS.items():
+        value = row.get(name)
+        if value is None or isinstance(value, (bool, dict, list)):
+            return False
+        if check is str:
+            if not isinstance(value, str):
+                return False
+            continue
+        try:
+            check(value)
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+class IngestQueue:
+    """
+    Bounded in-memory buffer of pushed events (counted in events, not
+    requests) between the receivers and the feature stage.
+
+    When full, policy decides:
+      block        - producers wait; socket senders see TCP backpressure
+      drop_newest  - incoming events beyond capacity are dropped
+      drop_oldest  - queued events are evicted to make room
+    """
+
+    def __init__(self, max_events: int = 1_000_000, policy: str = "block", rate_window: float = 10.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+
+        self.max_events = max_events
+        self.policy = policy
+        self.rate_window = rate_window
+
+        self._chunks = deque()
+        self._depth = 0
+        self._changed = asyncio.Condition()
+
+        self.accepted = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.consumed = 0
+        self._arrivals = deque()  # (monotonic time, events) for the ingest rate
+
+        # Read at collection time only (latest queue wins)
+        for name, help, fn in (
+            ("waf_ingest_queue_depth", "Events waiting in the ingest queue", lambda: self._depth),
+            ("waf_ingest_queue_capacity", "Ingest queue capacity in events", lambda: self.max_events),
+            ("waf_ingest_accepted_events", "Events accepted by the ingest queue", lambda: self.accepted),
+            ("waf_ingest_dropped_events", "Events dropped by the queue policy or a failed ingest", lambda: self.dropped),
+            ("waf_ingest_rejected_events", "Pushed lines that failed validation", lambda: self.rejected),
+        ):
+            METRICS.gauge(name, help).set_function(fn)
+        self._batch_events = METRICS.histogram(
+            "waf_ingest_batch_events", "Events per block handed to the feature stage", buckets=SIZE_BUCKETS
+        )
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    # ------------------------------
+    # Producer side
+    # ------------------------------
+    async def put(self, batch: EventBatch, timeout: Optional[float] = None) -> int:
+        """
+        Enqueue a batch; returns how many of its events were accepted.
+        With the block policy, raises asyncio.TimeoutError after timeout.
+        """
+        async with self._changed:
+            if self.policy == "block":
+                # An oversized batch is admitted once the queue is empty
+                await asyncio.wait_for(
+                    self._changed.wait_for(
+                        lambda: self._depth == 0
+                        or self._depth + len(batch) <= self.max_events
+                    ),
+                    timeout,
+                )
+
+            elif self.policy == "drop_newest":
+                room = max(self.max_events - self._depth, 0)
+                if len(batch) > room:
+                    self.dropped += len(batch) - room
+                    batch = batch.slice(0, room)
+
+            else:  # drop_oldest
+                if len(batch) > self.max_events:
+                    self.dropped += len(batch) - self.max_events
+                    batch = batch.slice(len(batch) - self.max_events)
+                self._evict(self._depth + len(batch) - self.max_events)
+
+            if len(batch):
+                self._chunks.append(batch)
+                self._depth += len(batch)
+                self.accepted += len(batch)
+                self._arrivals.append((time.monotonic(), len(batch)))
+                self._prune_arrivals()
+                self._changed.notify_all()
+
+            return len(batch)
+
+    def _evict(self, n: int):
+        while n > 0 and self._chunks:
+            chunk = self._chunks[0]
+            if len(chunk) <= n:
+                self._chunks.popleft()
+                removed = len(chunk)
+            else:
+                self._chunks[0] = chunk.slice(n)
+                removed = n
+            self._depth -= removed
+            self.dropped += removed
+            n -= removed
+
+    # ------------------------------
+    # Consumer side (feature stage)
+    # ------------------------------
+    async def get_batch(
+        self,
+        max_events: int = 4096,
+        linger: float = 0.05,
+        timeout: Optional[float] = None,
+    ) -> Optional[EventBatch]:
+        """
+        Next block of up to max_events. Waits up to `linger` seconds for
+        the block to fill once events are available; returns None if
+        nothing arrives within timeout.
+        """
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self._depth > 0), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+            if self._depth < max_events and linger > 0:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: self._depth >= max_events), linger
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+            taken, n = [], 0
+            while self._chunks and n < max_events:
+                chunk = self._chunks.popleft()
+                if n + len(chunk) > max_events:
+                    self._chunks.appendleft(chunk.slice(max_events - n))
+                    chunk = chunk.slice(0, max_events - n)
+                taken.append(chunk)
+                n += len(chunk)
+
+            self._depth -= n
+            self.consumed += n
+            self._batch_events.observe(n)
+            self._changed.notify_all()
+
+        return EventBatch.concat(taken)
+
+    async def batches(self, max_events: int = 4096, linger: float = 0.05) -> AsyncIterator[EventBatch]:
+        while True:
+            batch = await self.get_batch(max_events, linger)
+            if batch is not None:
+                yield batch
+
+    def _prune_arrivals(self):
+        now = time.monotonic()
+        while self._arrivals and now - self._arrivals[0][0] > self.rate_window:
+            self._arrivals.popleft()
+
+    def stats(self) -> dict:
+        self._prune_arrivals()
+        return {
+            "policy": self.policy,
+            "depth": self._depth,
+            "capacity": self.max_events,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "consumed": self.consumed,
+            "ingest_rate": round(sum(n for _, n in self._arrivals) / self.rate_window, 1),
+        }
+
+
+class PushReceiver:
+    """
+    Accepts newline-delimited JSON events pushed by nginx / a log shipper
+    over TCP, a Unix socket, or HTTP bulk POST (see create_app), and
+    feeds them to an IngestQueue in blocks of up to block_lines lines,
+    or whatever a socket sent within `linger` seconds of its oldest
+    pending line.
+    """
+
+    def __init__(
+        self,
+        queue: IngestQueue,
+        block_lines: int = 4096,
+        linger: float = 0.5,
+        read_size: int = 1 << 16,
+        http_timeout: float = 5.0,
+    ):
+        self.queue = queue
+        self.block_lines = block_lines
+        self.linger = linger
+        self.read_size = read_size
+        self.http_timeout = http_timeout
+        self._servers = []
+
+    async def start(self, host: str = "127.0.0.1", port: Optional[int] = 9514, unix_path: Optional[str] = None):
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._handle, host, port))
+        if unix_path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._handle, unix_path))
+
+    async def stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers = []
+
+    @property
+    def sockets(self):
+        return [sock for server in self._servers for sock in server.sockets]
+
+    async def ingest(self, lines: List[bytes], timeout: Optional[float] = None) -> dict:
+        """Validate and enqueue a block of lines"""
+        batch, rejected = parse_push_lines(lines)
+        self.queue.rejected += rejected
+
+        accepted = 0
+        if batch is not None:
+            accepted = await self.queue.put(batch, timeout=timeout)
+
+        return {
+            "accepted": accepted,
+            "rejected": rejected,
+            "dropped": (len(batch) if batch is not None else 0) - accepted,
+        }
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """
+        Socket stream: read in large chunks, split on newlines. With the
+        block policy, ingest() awaits queue space and reading stops, so
+        the sender is throttled by TCP flow control. A slow sender's
+        lines are flushed after `linger` seconds instead of waiting for
+        a full block.
+        """
+        pending, tail, since = [], b"", None
+        try:
+            while True:
+                timeout = None if since is None else max(self.linger - (time.monotonic() - since), 0.0)
+                try:
+                    chunk = await asyncio.wait_for(reader.read(self.read_size), timeout)
+                except asyncio.TimeoutError:
+                    await self._flush(pending)
+                    pending, since = [], None
+                    continue
+                if not chunk:
+                    break
+
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                if lines and since is None:
+                    since = time.monotonic()
+                pending.extend(lines)
+
+                if len(pending) >= self.block_lines:
+                    await self._flush(pending)
+                    pending, since = [], None
+
+            if tail.strip():
+                pending.append(tail)
+            if pending:
+                await self._flush(pending)
+        finally:
+            writer.close()
+
+    async def _flush(self, lines: List[bytes]):
+        """
+        ingest() for a socket: a failing block is logged and counted as
+        dropped, and the connection keeps going
+        """
+        try:
+            await self.ingest(lines)
+        except Exception:
+            dropped = sum(1 for line in lines if line.strip())
+            self.queue.dropped += dropped
+            logger.exception(f"Ingest failed, dropped {dropped} pushed lines")
+
+    # ------------------------------
+    # HTTP bulk endpoint
+    # ------------------------------
+    def create_app(self) -> "FastAPI":
+        """
+        POST /ingest   body: JSON lines; 503 when the queue stays full
+        GET  /ingest/stats
+        GET  /metrics  Prometheus text format
+        """
+        if FastAPI is None:
+            raise ImportError("fastapi is not installed")
+
+        app = FastAPI(title="ML-WAF ingest")
+
+        @app.post("/ingest")
+        async def ingest(request: Request):
+            lines = (await request.body()).split(b"\n")
+            try:
+                return await self.ingest(lines, timeout=self.http_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPException(503, "Ingest queue full", headers={"Retry-After": "1"})
+
+        @app.get("/ingest/stats")
+        def stats():
+            return self.queue.stats()
+
+        @app.get("/metrics", response_class=PlainTextResponse)
+        def metrics():
+            return PlainTextResponse(
+                METRICS.to_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8"
+            )
+
+        return app
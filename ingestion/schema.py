@@ -1,7 +1,11 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
+from typing import List
 
-@dataclass
+import numpy as np
+import pandas as pd
+
+@dataclass(slots=True)
 class TrafficEvent:
     timestamp: datetime
     src_ip: str
@@ -11,3 +15,44 @@ class TrafficEvent:
     payload_size: int
     response_time_ms: float
     user_agent: str
+
+
+@dataclass
+class EventBatch:
+    """
+    Columnar block of traffic events: one array per TrafficEvent field
+    """
+    timestamp: pd.DatetimeIndex
+    src_ip: np.ndarray
+    method: np.ndarray
+    uri_path: np.ndarray
+    status_code: np.ndarray
+    payload_size: np.ndarray
+    response_time_ms: np.ndarray
+    user_agent: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {f.name: getattr(self, f.name) for f in fields(self)}
+        )
+
+    def slice(self, start: int, stop: int = None) -> "EventBatch":
+        return EventBatch(
+            **{f.name: getattr(self, f.name)[start:stop] for f in fields(self)}
+        )
+
+    @classmethod
+    def concat(cls, batches: List["EventBatch"]) -> "EventBatch":
+        if len(batches) == 1:
+            return batches[0]
+        return cls(
+            timestamp=batches[0].timestamp.append([b.timestamp for b in batches[1:]]),
+            **{
+                f.name: np.concatenate([getattr(b, f.name) for b in batches])
+                for f in fields(cls)
+                if f.name != "timestamp"
+            },
+        )
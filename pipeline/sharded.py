@@ -0,0 +1,399 @@
+# pipeline/sharded.py
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection.scorer import AnomalyScorer
+from baseline.baseline_trainer import BaselineTrainer
+from baseline.sketches import FrequencySketch
+from feature_engineering.extractor import ML_FEATURES, FeatureExtractor
+from storage.models import ModelRegistry
+from utils.metrics import instrumented
+
+
+# String columns are shipped to workers as int32 codes (-1 = missing);
+# window features only need equality, so codes give identical values
+CODED_COLUMNS = ("src_ip", "method", "uri_path")
+NUMERIC_COLUMNS = ("status_code", "payload_size", "response_time_ms")
+
+SCORE_COLUMNS = ("if_score", "baseline_score", "final_score")
+
+
+# ------------------------------
+# Shared memory
+# ------------------------------
+@dataclass
+class SharedArraysSpec:
+    """Picklable handle: segment name + (name, dtype, shape, offset) layout"""
+    name: str
+    layout: List[Tuple[str, str, tuple, int]]
+
+
+class SharedArrays:
+    """
+    Several NumPy arrays packed into one shared memory segment.
+    Workers attach by name and get zero-copy views.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, spec: SharedArraysSpec, owner: bool):
+        self.shm = shm
+        self.spec = spec
+        self.owner = owner
+        self.arrays: Dict[str, np.ndarray] = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, dtype, shape, offset in spec.layout
+        }
+
+    @classmethod
+    def create(cls, shapes: Dict[str, Tuple[tuple, np.dtype]]) -> "SharedArrays":
+        layout, offset = [], 0
+        for name, (shape, dtype) in shapes.items():
+            dtype = np.dtype(dtype)
+            offset = -(-offset // 64) * 64  # cache-line aligned
+            layout.append((name, dtype.str, tuple(shape), offset))
+            offset += int(np.prod(shape)) * dtype.itemsize
+
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        return cls(shm, SharedArraysSpec(shm.name, layout), owner=True)
+
+    @classmethod
+    def attach(cls, spec: SharedArraysSpec) -> "SharedArrays":
+        # Pool workers share the creator's resource tracker, so the
+        # segment stays registered once and is unlinked by the creator
+        return cls(shared_memory.SharedMemory(name=spec.name), spec, owner=False)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+# ------------------------------
+# Worker side
+# ------------------------------
+_worker_state = {}
+
+
+def _init_worker(window: str, scorer_params: dict):
+    _worker_state.clear()
+    _worker_state["window"] = window
+    _worker_state["scorer"] = AnomalyScorer(**scorer_params)
+
+
+def _load_model(model: Tuple[str, str]):
+    """Registry bundle for (root, version), loaded once per worker"""
+    if _worker_state.get("model") != model:
+        # Forest arrays are memory-mapped: one copy in the page cache
+        bundle = ModelRegistry(model[0]).load(model[1])
+        bundle.if_model.model.set_params(n_jobs=1)  # parallelism is across workers
+
+        baseline_trainer = BaselineTrainer()
+        baseline_trainer.baseline = bundle.baseline
+
+        _worker_state["model"] = model
+        _worker_state["bundle"] = bundle
+        _worker_state["baseline_trainer"] = baseline_trainer
+
+    return _worker_state["bundle"], _worker_state["baseline_trainer"]
+
+
+def _run_shard(
+    inputs: SharedArraysSpec,
+    outputs: SharedArraysSpec,
+    lo: int,
+    hi: int,
+    mode: str,
+    model: Optional[Tuple[str, str]] = None,
+):
+    """
+    mode:
+      features - window features for rows [lo, hi) into outputs["features"]
+      score    - score the feature rows already in outputs["features"]
+      both     - features, then score
+    """
+    src = SharedArrays.attach(inputs)
+    dst = SharedArrays.attach(outputs)
+    try:
+        if mode in ("features", "both"):
+            dst["features"][lo:hi] = _shard_features(src, lo, hi)
+
+        if mode in ("score", "both"):
+            bundle, baseline_trainer = _load_model(model)
+            ml_features = pd.DataFrame(dst["features"][lo:hi], columns=bundle.feature_names)
+
+            baseline_scores = baseline_trainer.score_deviation(ml_features)
+            results = _worker_state["scorer"].score(
+                bundle.if_model.score(ml_features), baseline_scores
+            )
+            dst["scores"][lo:hi] = results[list(SCORE_COLUMNS)].to_numpy(dtype=np.float64)
+    finally:
+        src.close()
+        dst.close()
+
+    return os.getpid(), hi - lo
+
+
+def _shard_features(src: SharedArrays, lo: int, hi: int) -> np.ndarray:
+    columns = {
+        "timestamp": pd.to_datetime(src["timestamp"][lo:hi]),
+        **{
+            # -1 -> NaN, so missing values behave like missing strings
+            name: np.where(src[name][lo:hi] < 0, np.nan, src[name][lo:hi])
+            for name in CODED_COLUMNS
+        },
+        **{name: src[name][lo:hi].copy() for name in NUMERIC_COLUMNS},
+    }
+
+    endpoint_freq = pd.Series(src["endpoint_freq"])
+    extractor = FeatureExtractor(
+        window=_worker_state["window"],
+        group_by="src_ip",
+        endpoint_freq=endpoint_freq,
+    )
+    return extractor.extract_frame(pd.DataFrame(columns))["ml_features"].to_numpy(dtype=np.float64)
+
+
+# ------------------------------
+# Coordinator
+# ------------------------------
+class ShardedPipeline:
+    """
+    Parallel feature extraction and scoring, hash-partitioned by src_ip.
+
+    Events are sorted into shards (hash(src_ip) % n_shards), packed
+    column-wise into shared memory and processed by a process pool:
+    workers read their row range, compute per-IP window features
+    (group_by="src_ip", so a shard holds complete entity histories) and
+    optionally score them with a registry model, writing into a shared
+    output matrix. Nothing but (spec, row range) crosses the process
+    boundary. endpoint_rarity uses global frequencies computed here
+    (or looked up in an endpoint_freq FrequencySketch).
+
+    Features equal FeatureExtractor(group_by="src_ip") on the same
+    events; the context frame is rebuilt centrally from the input.
+    """
+
+    def __init__(
+        self,
+        n_workers: Optional[int] = None,
+        window: str = "1min",
+        shards_per_worker: int = 4,
+        scorer: Optional[AnomalyScorer] = None,
+        mp_context: Optional[str] = None,
+        endpoint_freq: Optional[FrequencySketch] = None,
+    ):
+        """
+        mp_context: multiprocessing start method. Defaults to fork where
+        available: the run_* scripts have no __main__ guard, which spawn
+        and forkserver need. The pool starts on first use and is reused,
+        so it forks before model fitting starts any threads.
+        """
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.window = window
+        self.n_shards = self.n_workers * shards_per_worker
+        self.scorer = scorer or AnomalyScorer()
+        if mp_context is None:
+            mp_context = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self.mp_context = mp_context
+        self.endpoint_freq = endpoint_freq
+
+        self.feature_names = list(ML_FEATURES)
+
+        self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # ------------------------------
+    # Public API
+    # ------------------------------
+    @instrumented("sharded_extract")
+    def extract(self, events: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """
+        Per-IP window features for an event DataFrame.
+        Returns {context, ml_features} like FeatureExtractor.extract_frame
+        """
+        return self._run(events, mode="features")
+
+    @instrumented("sharded_extract_and_score")
+    def extract_and_score(
+        self,
+        events: pd.DataFrame,
+        registry: ModelRegistry,
+        version: Optional[str] = None,
+    ) -> Dict[str, pd.DataFrame]:
+        """Features and scores in one pass, with a published model"""
+        return self._run(events, mode="both", registry=registry, version=version)
+
+    @instrumented("sharded_score")
+    def score(
+        self,
+        ml_features: pd.DataFrame,
+        registry: ModelRegistry,
+        version: Optional[str] = None,
+        keys=None,
+    ) -> pd.DataFrame:
+        """
+        Score feature rows in parallel (row chunks, no partitioning needed).
+        keys: per-row threshold key, see AnomalyScorer.score
+        """
+        model = self._model_key(registry, version)
+
+        n = len(ml_features)
+        inputs = SharedArrays.create({})
+        outputs = SharedArrays.create(
+            {
+                "features": ((n, len(self.feature_names)), np.float64),
+                "scores": ((n, len(SCORE_COLUMNS)), np.float64),
+            }
+        )
+        try:
+            outputs["features"][:] = ml_features[self.feature_names].to_numpy(dtype=np.float64)
+            bounds = np.linspace(0, n, self.n_shards + 1).astype(int)
+            self._map(inputs, outputs, bounds, "score", model)
+            return self._results(outputs["scores"].copy(), ml_features.index, keys)
+        finally:
+            inputs.close()
+            outputs.close()
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    @staticmethod
+    def _model_key(registry: Optional[ModelRegistry], version: Optional[str]):
+        if registry is None:
+            return None
+        version = version or registry.current_version()
+        if version is None:
+            raise FileNotFoundError(f"No published model in {registry.root}")
+        return str(registry.root), version
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.n_workers,
+                mp_context=multiprocessing.get_context(self.mp_context),
+                initializer=_init_worker,
+                initargs=(
+                    self.window,
+                    {
+                        "if_weight": self.scorer.if_weight,
+                        "baseline_weight": self.scorer.baseline_weight,
+                        "anomaly_threshold": self.scorer.anomaly_threshold,
+                    },
+                ),
+            )
+        return self._executor
+
+    def _run(self, events, mode, registry=None, version=None):
+        model = self._model_key(registry, version)
+
+        events = events.sort_values("timestamp", kind="stable").reset_index(drop=True)
+        n = len(events)
+
+        codes = {}
+        for name in CODED_COLUMNS:
+            codes[name], uniques = pd.factorize(events[name])
+            if name == "src_ip":
+                ip_uniques = uniques
+            elif name == "uri_path":
+                uri_uniques = uniques
+
+        # Shard = hash(src_ip) % n_shards; stable sort keeps time order
+        ip_shards = pd.util.hash_array(np.asarray(ip_uniques, dtype=object)) % self.n_shards
+        shard = np.where(codes["src_ip"] < 0, 0, ip_shards[codes["src_ip"]])
+        order = np.argsort(shard, kind="stable")
+        bounds = np.searchsorted(shard[order], np.arange(self.n_shards + 1))
+
+        uri = codes["uri_path"]
+        if self.endpoint_freq is not None:
+            endpoint_freq = self.endpoint_freq.frequency(np.asarray(uri_uniques, dtype=object))
+            endpoint_freq[endpoint_freq == 0] = 1
+        else:
+            endpoint_freq = np.bincount(uri[uri >= 0]) / max((uri >= 0).sum(), 1)
+
+        inputs = SharedArrays.create(
+            {
+                "timestamp": ((n,), "M8[ns]"),
+                **{name: ((n,), np.int32) for name in CODED_COLUMNS},
+                "status_code": ((n,), np.int64),
+                "payload_size": ((n,), np.int64),
+                "response_time_ms": ((n,), np.float64),
+                "endpoint_freq": ((len(endpoint_freq),), np.float64),
+            }
+        )
+        outputs = SharedArrays.create(
+            {
+                "features": ((n, len(self.feature_names)), np.float64),
+                "scores": ((n if mode == "both" else 0, len(SCORE_COLUMNS)), np.float64),
+            }
+        )
+        try:
+            inputs["timestamp"][:] = events["timestamp"].to_numpy(dtype="M8[ns]")[order]
+            for name in CODED_COLUMNS:
+                inputs[name][:] = codes[name][order]
+            for name in NUMERIC_COLUMNS:
+                inputs[name][:] = events[name].to_numpy()[order]
+            inputs["endpoint_freq"][:] = endpoint_freq
+
+            self._map(inputs, outputs, bounds, mode, model)
+
+            # Back to time order
+            restore = np.empty_like(order)
+            restore[order] = np.arange(n)
+
+            context = events.set_index("timestamp")
+            output = {
+                "context": context,
+                "ml_features": pd.DataFrame(
+                    outputs["features"][restore], index=context.index, columns=self.feature_names
+                ),
+            }
+            if mode == "both":
+                output["results"] = self._results(
+                    outputs["scores"][restore], context.index, events["uri_path"].to_numpy()
+                )
+            return output
+        finally:
+            inputs.close()
+            outputs.close()
+
+    def _map(self, inputs: SharedArrays, outputs: SharedArrays, bounds: np.ndarray, mode: str, model=None):
+        pool = self._pool()
+        futures = [
+            pool.submit(_run_shard, inputs.spec, outputs.spec, lo, hi, mode, model)
+            for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist())
+            if hi > lo
+        ]
+        for future in futures:
+            future.result()
+
+    def _results(self, scores: np.ndarray, index: pd.Index, keys=None) -> pd.DataFrame:
+        # Alert cutoffs are applied here, in order: adaptive thresholds
+        # live in the parent's scorer only
+        results = pd.DataFrame(scores, index=index, columns=list(SCORE_COLUMNS))
+        threshold = self.scorer.cutoffs(results["final_score"], keys)
+        results["is_anomaly"] = results["final_score"] > threshold
+        if self.scorer.thresholds is not None:
+            results["threshold"] = threshold
+        return results
+
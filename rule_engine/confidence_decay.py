@@ -1,13 +1,16 @@
 from datetime import datetime
-import math
+
+import numpy as np
 
 
 class ConfidenceDecay:
-    def __init__(self, decay_rate: float = 0.1):
+    def __init__(self, decay_rate: float = 0.1, expire_below: float = 0.5):
         """
         decay_rate: higher = faster decay
+        expire_below: decayed confidence at which a rule expires
         """
         self.decay_rate = decay_rate
+        self.expire_below = expire_below
 
     def apply(self, rule: dict, now: datetime = None) -> dict:
         now = now or datetime.utcnow()
@@ -17,15 +20,17 @@ class ConfidenceDecay:
             return rule
 
         age_days = (now - created_at).days
-        decayed = rule["confidence"] * math.exp(
-            -self.decay_rate * age_days
-        )
+        decayed = float(self.decayed(rule["confidence"], age_days))
 
         rule["confidence_decayed"] = round(decayed, 3)
         rule["age_days"] = age_days
 
         # Auto-expire suggestion
-        if rule["confidence_decayed"] < 0.5:
+        if rule["confidence_decayed"] < self.expire_below:
             rule["status"] = "expired"
 
         return rule
+
+    def decayed(self, confidence, age_days):
+        """Decayed confidence after whole age_days (scalars or arrays)"""
+        return confidence * np.exp(-self.decay_rate * np.asarray(age_days))
@@ -0,0 +1,480 @@
+# rule_engine/enforcer.py
+
+import ipaddress
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ingestion.schema import EventBatch
+
+try:
+    import numba
+except ImportError:  # optional compiled token-bucket kernel
+    numba = None
+
+
+ALLOW, CHALLENGE, RATE_LIMIT, BLOCK = "allow", "challenge", "rate_limit", "block"
+DECISIONS = (ALLOW, CHALLENGE, RATE_LIMIT, BLOCK)  # increasing severity
+SEVERITY = {d: i for i, d in enumerate(DECISIONS)}
+
+# rule_templates.yaml action type -> decision
+ACTION_DECISIONS = {
+    "block_ip": BLOCK,
+    "rate_limit": RATE_LIMIT,
+    "endpoint_protection": CHALLENGE,
+}
+
+ENFORCED_STATUSES = ("approved", "active")
+
+PERIODS = {
+    "s": 1, "sec": 1, "second": 1,
+    "m": 60, "min": 60, "minute": 60,
+    "h": 3600, "hour": 3600,
+    "d": 86400, "day": 86400,
+}
+
+
+def parse_limit(limit: str) -> Tuple[float, float]:
+    """'10/min' -> (10 requests, 60 seconds); '100/5min' is accepted too"""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*/\s*(\d*)\s*([a-z]+?)s?\s*", str(limit).lower())
+    if not m or m.group(3) not in PERIODS:
+        raise ValueError(f"Invalid rate limit: {limit!r}")
+    return float(m.group(1)), PERIODS[m.group(3)] * float(m.group(2) or 1)
+
+
+def rule_id(rule: dict) -> str:
+    if rule.get("rule_id"):
+        return rule["rule_id"]
+    match = rule.get("match", {})
+    return f"{rule['rule_type']}:{match.get('src_ip') or '*'}:{match.get('endpoint') or '*'}"
+
+
+@dataclass
+class CompiledRule:
+    order: int                  # evaluation order (confidence, highest first)
+    rule_id: str
+    decision: str
+    endpoint: Optional[str]
+    capacity: float = 0.0       # token bucket burst, rate_limit only
+    refill: float = 0.0         # tokens per second
+
+
+# ------------------------------
+# CIDR prefix trie
+# ------------------------------
+class PrefixTrie:
+    """
+    Binary trie over IPv4 / IPv6 prefixes. lookup() walks at most
+    32 / 128 bits (only as deep as the longest stored prefix) and
+    returns the values of every prefix containing the address.
+    """
+
+    def __init__(self):
+        # node: [child 0, child 1, values]
+        self._roots = {4: [None, None, []], 6: [None, None, []]}
+        self._depth = {4: 0, 6: 0}
+
+    def insert(self, network, value):
+        network = ipaddress.ip_network(network, strict=False)
+        bits = network.max_prefixlen
+        address = int(network.network_address)
+
+        node = self._roots[network.version]
+        for i in range(network.prefixlen):
+            bit = (address >> (bits - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, []]
+            node = node[bit]
+
+        node[2].append(value)
+        self._depth[network.version] = max(self._depth[network.version], network.prefixlen)
+
+    def __bool__(self):
+        return any(self._depth.values()) or any(root[2] for root in self._roots.values())
+
+    def lookup(self, ip) -> list:
+        parsed = _parse_ip(ip)
+        if parsed is None:
+            return []
+
+        version, value = parsed
+        bits = 32 if version == 4 else 128
+        node = self._roots[version]
+        found = list(node[2])
+        for i in range(self._depth[version]):
+            node = node[(value >> (bits - 1 - i)) & 1]
+            if node is None:
+                break
+            found += node[2]
+        return found
+
+
+def _parse_ip(ip) -> Optional[Tuple[int, int]]:
+    """(version, integer) of an address string; None if not an IP"""
+    if not isinstance(ip, str):
+        return None
+    parts = ip.split(".")
+    if len(parts) == 4 and all(p.isdigit() and len(p) <= 3 for p in parts):
+        a, b, c, d = (int(p) for p in parts)
+        if max(a, b, c, d) <= 255:
+            return 4, (a << 24) | (b << 16) | (c << 8) | d
+    try:
+        address = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    return address.version, int(address)
+
+
+# ------------------------------
+# Token bucket kernel
+# ------------------------------
+def _token_buckets_py(bucket, ts, tokens, last, capacity, refill):
+    """
+    Token buckets over time-ordered requests: request i goes through
+    bucket[i]. Bucket state (tokens, last) is updated in place.
+    Returns the allowed mask.
+    """
+    allowed = np.zeros(ts.shape[0], dtype=np.bool_)
+    for i in range(ts.shape[0]):
+        b = bucket[i]
+        if ts[i] > last[b]:
+            tokens[b] = min(capacity[b], tokens[b] + (ts[i] - last[b]) * refill[b])
+            last[b] = ts[i]
+        if tokens[b] >= 1.0:
+            tokens[b] -= 1.0
+            allowed[i] = True
+    return allowed
+
+
+if numba is not None:
+    _token_buckets = numba.njit(cache=True, nogil=True)(_token_buckets_py)
+else:
+    _token_buckets = _token_buckets_py
+
+
+# ------------------------------
+# Engine
+# ------------------------------
+class RuleEngine:
+    """
+    In-process enforcement of generated rules.
+
+    Rules are compiled once into hash indexes - (src_ip, endpoint),
+    src_ip only, endpoint only - plus a CIDR prefix trie for network
+    matches. The matching rules of an (ip, endpoint) pair are resolved
+    once and cached, so a decision is a dict lookup plus one token
+    bucket update per rate_limit rule: O(1) amortized per event.
+
+    Decisions, most severe wins: block > rate_limit > challenge > allow.
+    Blocked requests never reach the rate limiter. Rate limits are per
+    (rule, src_ip), so a rule without src_ip limits each client.
+
+    Only rules whose status is in `statuses` are enforced; pass
+    statuses=None to shadow-test proposed rules as well.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[dict],
+        statuses: Optional[Tuple[str, ...]] = ENFORCED_STATUSES,
+        max_cache: int = 1_000_000,
+    ):
+        self.statuses = statuses
+        self.max_cache = max_cache
+
+        self._buckets: Dict[tuple, List[float]] = {}  # (rule_id, src_ip) -> [tokens, last]
+        self.matched = Counter()
+        self.fired = Counter()
+        self.decisions = Counter()
+
+        self.compile(rules)
+
+    def compile(self, rules: Iterable[dict]):
+        """(Re)build the indexes; buckets of rules still present are kept"""
+        enforced = [
+            r for r in rules
+            if (self.statuses is None or r.get("status") in self.statuses)
+            and r.get("action", {}).get("type") in ACTION_DECISIONS
+        ]
+        enforced.sort(key=lambda r: -float(r.get("confidence", 0.0)))
+
+        self.rules: List[CompiledRule] = []
+        self._by_pair = defaultdict(list)
+        self._pair_ips = set()
+        self._by_ip = defaultdict(list)
+        self._by_endpoint = defaultdict(list)
+        self._everything = []
+        self._trie = PrefixTrie()
+        self._cache = {}
+        self._rules_by_id: Dict[str, CompiledRule] = {}
+
+        for order, rule in enumerate(enforced):
+            action = rule["action"]
+            match = rule.get("match", {})
+            ip, endpoint = match.get("src_ip"), match.get("endpoint")
+
+            compiled = CompiledRule(order, rule_id(rule), ACTION_DECISIONS[action["type"]], endpoint)
+            if compiled.decision == RATE_LIMIT:
+                count, period = parse_limit(action.get("limit", "10/min"))
+                compiled.capacity, compiled.refill = count, count / period
+            self.rules.append(compiled)
+            self._rules_by_id[compiled.rule_id] = compiled
+
+            if ip and "/" in ip:
+                self._trie.insert(ip, compiled)  # endpoint checked at lookup
+            elif ip and endpoint:
+                self._by_pair[(ip, endpoint)].append(compiled)
+                self._pair_ips.add(ip)
+            elif ip:
+                self._by_ip[ip].append(compiled)
+            elif endpoint:
+                self._by_endpoint[endpoint].append(compiled)
+            else:
+                self._everything.append(compiled)
+
+    # ------------------------------
+    # Matching
+    # ------------------------------
+    def match(self, src_ip: Optional[str], endpoint: Optional[str]) -> Tuple[CompiledRule, ...]:
+        """Rules applying to an (ip, endpoint) pair, in evaluation order"""
+        key = (src_ip, endpoint)
+        rules = self._cache.get(key)
+        if rules is None:
+            found = self._by_endpoint.get(endpoint, []) + self._everything
+            if src_ip is not None:
+                found += self._by_pair.get(key, []) + self._by_ip.get(src_ip, [])
+                if self._trie:
+                    found += [r for r in self._trie.lookup(src_ip) if r.endpoint in (None, endpoint)]
+            rules = tuple(sorted(found, key=lambda r: r.order)) if len(found) > 1 else tuple(found)
+
+            if len(self._cache) >= self.max_cache:
+                self._cache.clear()
+            self._cache[key] = rules
+        return rules
+
+    def _has_ip_rules(self, src_ip) -> bool:
+        return src_ip is not None and (
+            src_ip in self._by_ip
+            or src_ip in self._pair_ips
+            or (bool(self._trie) and bool(self._trie.lookup(src_ip)))
+        )
+
+    @staticmethod
+    def _static(rules) -> Tuple[str, Optional[CompiledRule], list]:
+        """Most severe non-rate decision, its rule, and the rate_limit rules"""
+        decision, by, limits = ALLOW, None, []
+        for rule in rules:
+            if rule.decision == RATE_LIMIT:
+                limits.append(rule)
+            elif SEVERITY[rule.decision] > SEVERITY[decision]:
+                decision, by = rule.decision, rule
+        return decision, by, limits
+
+    # ------------------------------
+    # Per-event decision
+    # ------------------------------
+    def decide(self, src_ip: Optional[str], endpoint: Optional[str], ts: float) -> Tuple[str, Optional[str]]:
+        """Decision and deciding rule_id for one request at ts (seconds)"""
+        rules = self.match(src_ip, endpoint)
+        for rule in rules:
+            self.matched[rule.rule_id] += 1
+
+        decision, by, limits = self._static(rules)
+        if decision != BLOCK:
+            for rule in limits:
+                if not self._consume(rule, src_ip, ts) and decision != RATE_LIMIT:
+                    decision, by = RATE_LIMIT, rule
+
+        self.decisions[decision] += 1
+        if by is not None:
+            self.fired[by.rule_id] += 1
+        return decision, by.rule_id if by is not None else None
+
+    def _consume(self, rule: CompiledRule, src_ip, ts: float) -> bool:
+        """One request through the (rule, src_ip) bucket; False when limited"""
+        state = self._bucket(rule, src_ip, ts)
+        if ts > state[1]:
+            state[0] = min(rule.capacity, state[0] + (ts - state[1]) * rule.refill)
+            state[1] = ts
+        if state[0] >= 1.0:
+            state[0] -= 1.0
+            return True
+        return False
+
+    def _bucket(self, rule: CompiledRule, src_ip, ts: float) -> List[float]:
+        state = self._buckets.get((rule.rule_id, src_ip))
+        if state is None:
+            state = self._buckets[(rule.rule_id, src_ip)] = [rule.capacity, ts]
+        return state
+
+    # ------------------------------
+    # Replay / shadow traffic
+    # ------------------------------
+    def replay(self, events) -> pd.DataFrame:
+        """
+        Decide a whole block of events (EventBatch, or a DataFrame with
+        src_ip, uri_path and a timestamp column or DatetimeIndex) with
+        the same semantics as decide() in time order.
+        Returns decision / rule_id per event, aligned with the input.
+        """
+        ts, src_ip, endpoint, index = _event_columns(events)
+        n = len(ts)
+
+        ip_codes, ips = pd.factorize(src_ip, use_na_sentinel=False)
+        ep_codes, endpoints = pd.factorize(endpoint, use_na_sentinel=False)
+        pair_codes, pairs = pd.factorize(ip_codes.astype(np.int64) * max(len(endpoints), 1) + ep_codes)
+        pair_counts = np.bincount(pair_codes, minlength=len(pairs))
+
+        severity = np.zeros(len(pairs), dtype=np.int8)
+        deciding = np.full(len(pairs), -1, dtype=np.int64)
+        buckets = {}      # (rule order, ip code) -> bucket id
+        entries = []      # (pair id, bucket id): the pair's events go through the bucket
+
+        # Only pairs whose IP or endpoint has any rule need matching
+        n_endpoints = max(len(endpoints), 1)
+        ip_active = np.array([self._has_ip_rules(_value(ip)) for ip in ips], dtype=bool)
+        ep_active = np.array(
+            [bool(self._everything) or _value(ep) in self._by_endpoint for ep in endpoints], dtype=bool
+        )
+        active = ip_active[pairs // n_endpoints] | ep_active[pairs % n_endpoints]
+
+        for p in np.flatnonzero(active).tolist():
+            code = int(pairs[p])
+            ip_code = code // n_endpoints
+            rules = self.match(_value(ips[ip_code]), _value(endpoints[code % n_endpoints]))
+            if not rules:
+                continue
+            for rule in rules:
+                self.matched[rule.rule_id] += int(pair_counts[p])
+
+            decision, by, limits = self._static(rules)
+            severity[p] = SEVERITY[decision]
+            deciding[p] = by.order if by is not None else -1
+            if decision != BLOCK:
+                for rule in limits:
+                    entries.append((p, buckets.setdefault((rule.order, ip_code), len(buckets))))
+
+        event_severity = severity[pair_codes]
+        event_rule = deciding[pair_codes]
+
+        if entries:
+            limited, limit_rule = self._replay_buckets(ts, ips, pair_codes, pair_counts, buckets, entries)
+            limited &= event_severity < SEVERITY[RATE_LIMIT]
+            event_severity[limited] = SEVERITY[RATE_LIMIT]
+            event_rule[limited] = limit_rule[limited]
+
+        decisions = np.asarray(DECISIONS, dtype=object)[event_severity]
+        rule_ids = np.asarray([r.rule_id for r in self.rules] + [None], dtype=object)[event_rule]
+
+        for decision, count in zip(*np.unique(event_severity, return_counts=True)):
+            self.decisions[DECISIONS[decision]] += int(count)
+        for rule_order, count in zip(*np.unique(event_rule[event_rule >= 0], return_counts=True)):
+            self.fired[self.rules[rule_order].rule_id] += int(count)
+
+        return pd.DataFrame(
+            {"decision": pd.Categorical(decisions, categories=DECISIONS), "rule_id": rule_ids},
+            index=index if index is not None else pd.RangeIndex(n),
+        )
+
+    def _replay_buckets(self, ts, ips, pair_codes, pair_counts, buckets, entries):
+        """
+        Run every (pair, bucket) entry's events through its token bucket
+        in one time-ordered pass. Returns (limited mask, first limiting
+        rule order) per event.
+        """
+        entry_pair, entry_bucket = (np.array(col, dtype=np.int64) for col in zip(*entries))
+
+        # Events grouped by pair, then expanded once per entry of the pair
+        by_pair = np.argsort(pair_codes, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(pair_counts)])
+        lengths = pair_counts[entry_pair]
+        offsets = np.repeat(starts[entry_pair] - np.cumsum(lengths) + lengths, lengths)
+        rows = by_pair[offsets + np.arange(lengths.sum())]
+        row_bucket = np.repeat(entry_bucket, lengths)
+
+        order = np.argsort(ts[rows], kind="stable")
+        rows, row_bucket = rows[order], row_bucket[order]
+
+        # Bucket state in, run, state back out
+        keys = list(buckets)
+        rules = [self.rules[rule_order] for rule_order, _ in keys]
+        states = [self._buckets.get((rule.rule_id, _value(ips[ip]))) for rule, (_, ip) in zip(rules, keys)]
+        capacity = np.array([rule.capacity for rule in rules])
+        refill = np.array([rule.refill for rule in rules])
+        tokens = np.array([s[0] if s else rule.capacity for s, rule in zip(states, rules)])
+        last = np.array([s[1] if s else -np.inf for s in states])
+
+        allowed = _token_buckets(row_bucket, ts[rows], tokens, last, capacity, refill)
+
+        for (rule, (_, ip)), t, l in zip(zip(rules, keys), tokens.tolist(), last.tolist()):
+            self._buckets[(rule.rule_id, _value(ips[ip]))] = [t, l]
+
+        # First limiting rule in evaluation order decides
+        limit_rule = np.full(len(ts), len(self.rules), dtype=np.int64)
+        bucket_rule = np.array([rule.order for rule in rules], dtype=np.int64)
+        denied = ~allowed
+        np.minimum.at(limit_rule, rows[denied], bucket_rule[row_bucket[denied]])
+        limited = limit_rule < len(self.rules)
+        return limited, np.where(limited, limit_rule, -1)
+
+    # ------------------------------
+    # Maintenance / reporting
+    # ------------------------------
+    def prune_buckets(self, now: float) -> int:
+        """Forget buckets that have refilled completely by now (seconds)"""
+        full = []
+        for key, (tokens, last) in self._buckets.items():
+            rule = self._rules_by_id.get(key[0])
+            if rule is None or tokens + (now - last) * rule.refill >= rule.capacity:
+                full.append(key)
+        for key in full:
+            del self._buckets[key]
+        return len(full)
+
+    def report(self) -> pd.DataFrame:
+        """Per rule: how many events it matched and how many it decided"""
+        return pd.DataFrame(
+            [
+                {
+                    "rule_id": r.rule_id,
+                    "decision": r.decision,
+                    "matched": self.matched.get(r.rule_id, 0),
+                    "fired": self.fired.get(r.rule_id, 0),
+                }
+                for r in self.rules
+            ],
+            columns=["rule_id", "decision", "matched", "fired"],
+        )
+
+    def stats(self) -> dict:
+        return {
+            "rules": len(self.rules),
+            "decisions": dict(self.decisions),
+            "buckets": len(self._buckets),
+            "cached_pairs": len(self._cache),
+        }
+
+
+def _value(value):
+    return value if isinstance(value, str) else None
+
+
+def _event_columns(events):
+    if isinstance(events, EventBatch):
+        return events.timestamp.as_unit("ns").asi8 / 1e9, events.src_ip, events.uri_path, None
+
+    if "timestamp" in events.columns:
+        timestamps = pd.DatetimeIndex(events["timestamp"])
+    else:
+        timestamps = pd.DatetimeIndex(events.index)
+    endpoint = events["uri_path"] if "uri_path" in events.columns else events["endpoint"]
+    return (
+        timestamps.as_unit("ns").asi8 / 1e9,
+        events["src_ip"].to_numpy(dtype=object),
+        endpoint.to_numpy(dtype=object),
+        events.index,
+    )
@@ -1,10 +1,16 @@
 # rule_engine/rule_generator.py
 
+import re
 from collections import defaultdict, Counter
+from itertools import chain
 from typing import Dict, List
+import numpy as np
+import pandas as pd
 import yaml
 from datetime import datetime
 
+from utils.metrics import instrumented
+
 class RuleGenerator:
     def __init__(
         self,
@@ -18,6 +24,17 @@ class RuleGenerator:
         self.min_occurrences = min_occurrences
         self.min_avg_score = min_avg_score
 
+        # One combined trigger regex per rule type, in template order
+        self._matchers = [
+            (
+                rule_type,
+                re.compile("|".join(re.escape(t) for t in spec["triggers"]))
+                if spec.get("triggers") else None,
+            )
+            for rule_type, spec in self.templates.items()
+        ]
+
+    @instrumented("rules")
     def generate(
         self,
         context: Dict,
@@ -26,7 +43,123 @@ class RuleGenerator:
         """
         context: DataFrame-like dict with uri_path, src_ip, method
         results: DataFrame with is_anomaly, final_score, explanations
+
+        Columnar: anomalies are joined to context by position (the
+        index may repeat timestamps) and aggregated per (endpoint, src_ip)
+        with array ops; only the explanation lists of groups that pass
+        the thresholds are expanded.
         """
+        if len(context) != len(results):
+            # Label alignment is only defined for a unique index
+            if not context.index.is_unique:
+                raise ValueError(
+                    "context and results differ in length and the context "
+                    "index repeats labels: cannot align them"
+                )
+            context = context.reindex(results.index)
+
+        anomalous = results["is_anomaly"].to_numpy(dtype=bool)
+        if not anomalous.any():
+            return []
+
+        keys = pd.DataFrame(
+            {
+                "endpoint": context["uri_path"].to_numpy()[anomalous],
+                "src_ip": context["src_ip"].to_numpy()[anomalous],
+            }
+        )
+        scores = results["final_score"].to_numpy(dtype=np.float64)[anomalous]
+
+        # Groups numbered by first appearance, like the dict they replace
+        grouped = keys.groupby(["endpoint", "src_ip"], sort=False, dropna=False)
+        codes = grouped.ngroup().to_numpy()
+        n_groups = grouped.ngroups
+
+        # bincount sums in row order, so averages match a Python sum()
+        counts = np.bincount(codes, minlength=n_groups)
+        avg_scores = np.bincount(codes, weights=scores, minlength=n_groups) / counts
+
+        keep = (counts >= self.min_occurrences) & (avg_scores >= self.min_avg_score)
+        if not keep.any():
+            return []
+
+        first_rows = np.full(n_groups, len(codes))
+        np.minimum.at(first_rows, codes, np.arange(len(codes)))
+
+        # Expand explanations of the kept groups only
+        rows = np.flatnonzero(keep[codes])
+        if "explanations" in results.columns:
+            lists = results["explanations"].to_numpy()[anomalous][rows]
+        else:
+            lists = np.empty(len(rows), dtype=object)
+            lists[:] = [[] for _ in range(len(rows))]
+
+        lengths = np.fromiter((len(e) for e in lists), dtype=np.int64, count=len(lists))
+        flat = list(chain.from_iterable(lists))
+        flat_groups = np.repeat(codes[rows], lengths)
+
+        text_codes, texts = pd.factorize(pd.Series(flat, dtype=object))
+        texts = np.asarray(texts, dtype=object)
+
+        # Rule type index per distinct explanation (len(matchers) = none)
+        n_types = len(self._matchers)
+        text_types = np.full(len(texts), n_types)
+        for t, (_, pattern) in reversed(list(enumerate(self._matchers))):
+            if pattern is None or len(texts) == 0:
+                continue
+            hit = pd.Series(texts, dtype=object).str.contains(pattern).to_numpy(dtype=bool)
+            text_types[hit] = t
+
+        group_types = np.full(n_groups, n_types)
+        np.minimum.at(group_types, flat_groups, text_types[text_codes])
+
+        # Evidence: Counter.most_common(3) order (count desc, first seen)
+        pairs = flat_groups * max(len(texts), 1) + text_codes
+        pair_keys, pair_first, pair_counts = np.unique(
+            pairs, return_index=True, return_counts=True
+        )
+        pair_groups = pair_keys // max(len(texts), 1)
+        order = np.lexsort((pair_first, -pair_counts, pair_groups))
+        pair_groups, pair_texts, pair_counts = (
+            pair_groups[order], (pair_keys % max(len(texts), 1))[order], pair_counts[order]
+        )
+        group_starts = np.searchsorted(pair_groups, np.arange(n_groups))
+        rank = np.arange(len(pair_groups)) - group_starts[pair_groups]
+
+        evidence = defaultdict(list)
+        top = rank < 3
+        for g, text, count in zip(
+            pair_groups[top].tolist(), texts[pair_texts[top]].tolist(), pair_counts[top].tolist()
+        ):
+            evidence[g].append((text, count))
+
+        endpoints = keys["endpoint"].to_numpy()
+        src_ips = keys["src_ip"].to_numpy()
+
+        rules = []
+        for g in np.flatnonzero(keep & (group_types < n_types)).tolist():
+            rule_type = self._matchers[group_types[g]][0]
+            rules.append(
+                self._rule(
+                    rule_type=rule_type,
+                    endpoint=endpoints[first_rows[g]],
+                    src_ip=src_ips[first_rows[g]],
+                    confidence=float(avg_scores[g]),
+                    evidence=evidence[g],
+                )
+            )
+
+        return rules
+
+    def _generate_rowwise(
+        self,
+        context: Dict,
+        results,
+    ) -> List[Dict]:
+        """
+        Original iterrows implementation, kept as the reference
+        """
+
 
         grouped = defaultdict(list)
 
@@ -83,27 +216,42 @@ class RuleGenerator:
         for rule_type, spec in self.templates.items():
             for trigger in spec["triggers"]:
                 if any(trigger in e for e in explanation_counts):
+                    return self._rule(
+                        rule_type=rule_type,
+                        endpoint=endpoint,
+                        src_ip=src_ip,
+                        confidence=confidence,
+                        evidence=explanation_counts.most_common(3),
+                    )
 
-                    return {
-                        "rule_type": rule_type,
+        return None
 
-                        # --- match condition ---
-                        "match": {
-                            "endpoint": endpoint,
-                            "src_ip": src_ip,
-                        },
+    def _rule(
+        self,
+        rule_type: str,
+        endpoint: str,
+        src_ip: str,
+        confidence: float,
+        evidence: list,
+    ) -> dict:
+        return {
+            "rule_type": rule_type,
 
-                        # --- action ---
-                        "action": spec["action"],
+            # --- match condition ---
+            "match": {
+                "endpoint": endpoint,
+                "src_ip": src_ip,
+            },
 
-                        # --- lifecycle metadata ---
-                        "confidence": round(confidence, 2),
-                        "confidence_decayed": round(confidence, 2),
-                        "created_at": datetime.utcnow(),
-                        "status": "proposed",
+            # --- action ---
+            "action": self.templates[rule_type]["action"],
 
-                        # --- explainability ---
-                        "evidence": explanation_counts.most_common(3),
-                    }
+            # --- lifecycle metadata ---
+            "confidence": round(confidence, 2),
+            "confidence_decayed": round(confidence, 2),
+            "created_at": datetime.utcnow(),
+            "status": "proposed",
 
-        return None
\ No newline at end of file
+            # --- explainability ---
+            "evidence": evidence,
+        }
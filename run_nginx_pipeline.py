@@ -1,44 +1,130 @@
-import pickle
-from pathlib import Path
+import argparse
+import copy
+
+import pandas as pd
 
 from ingestion.log_reader import NginxLogReader
-from feature_engineering.extractor import FeatureExtractor
-from baseline.baseline_trainer import BaselineTrainer
+from feature_engineering.extractor import FeatureExtractor, StreamingFeatureExtractor
+from feature_engineering.cache import FeatureCache
+from feature_engineering.encoders import EventEncoders
+from baseline.baseline_trainer import StreamingBaselineTrainer
 from anomaly_detection.isolation_forest import IsolationForestModel
 from anomaly_detection.scorer import AnomalyScorer
-from explainability.feature_diff import FeatureDiff
+from anomaly_detection.thresholds import AdaptiveThresholds
 from explainability.explanation_builder import ExplanationBuilder
 from rule_engine.rule_generator import RuleGenerator
 from rule_engine.rule_validator import RuleValidator
+from rule_engine.enforcer import RuleEngine
 from baseline.baseline_store import BaselineStore
+from baseline.sketches import FrequencySketch
 from training.retraining_hooks import RetrainingHooks
+from storage.archive import EventArchive
+from storage.models import ModelRegistry
+from storage.database import ResultsStore
+from storage.metrics_store import MetricsStore
+from storage.rule_repository import RuleRepository
+from pipeline.sharded import ShardedPipeline
+from utils.logger import get_logger, log_stage_summary
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--workers", type=int, default=1,
+    help="> 1: shard by src_ip across a process pool (per-IP windows)",
+)
+parser.add_argument(
+    "--train-days", type=float, default=None,
+    help="fit the Isolation Forest and the baseline on this many days of "
+         "archived events instead of the current log only",
+)
+parser.add_argument(
+    "--train-endpoints", nargs="*", default=None,
+    help="with --train-days: train on the rows of these endpoints only",
+)
+args = parser.parse_args()
 
 # --------------------------------------------------
 # 1. Read traffic logs
 # --------------------------------------------------
 
 log_path = "/home/nirmal-yadagani/synthetic_logs/ml_access.log"
-events = list(NginxLogReader(log_path).read())
 
+# Sharded runs compute per-src_ip windows: their baseline and models are
+# kept apart from the global-window ones the stream / API / push
+# receiver score with (endpoint frequencies and encoders are shared)
+group_by = "src_ip" if args.workers > 1 else None
+
+baseline_store = BaselineStore(group_by=group_by)
+
+# Columnar batches: no per-event objects are ever built, and each batch
+# is reduced to dictionary codes (persistent across runs) as it is read.
+# Features of hourly partitions whose events did not change come from
+# the cache
+encoder_state = baseline_store.load_encoders()
+encoders = EventEncoders.from_state(encoder_state) if encoder_state else EventEncoders()
+extractor = FeatureExtractor(
+    window="1min", cache=FeatureCache("data/feature_cache"), encoders=encoders,
+)
+events = extractor.batches_to_df(
+    NginxLogReader(log_path).read_batches(batch_size=65536)
+)
+# Past the dictionary caps, only recently seen values are persisted
+encoders.evict()
+baseline_store.save_encoders(encoders.state_dict())
 
+# The log is re-read on every run: only events not archived yet are
+# appended to it (including late ones in the archive's last second)
+archive = EventArchive("data/archive")
+new_events = archive.unarchived(events)
+print(f"[INFO] Archived {archive.append(new_events)} new events")
 
 print(f"[INFO] Loaded {len(events)} traffic events")
 
 if len(events) < 50:
     raise RuntimeError("Not enough traffic yet. Generate some requests.")
 
+# Endpoint rarity from the decaying traffic history, not this batch alone.
+# Only the events not seen by an earlier run are counted (the same
+# delta as the archive), or frequencies would scale with the run count
+endpoint_state = baseline_store.load_endpoints()
+endpoint_sketch = (
+    FrequencySketch.from_dict(endpoint_state) if endpoint_state
+    else FrequencySketch(half_life=5_000_000)
+)
+endpoint_sketch.update(new_events["uri_path"])
+baseline_store.save_endpoints(endpoint_sketch.to_dict())
+extractor.endpoint_freq = endpoint_sketch
+
 # --------------------------------------------------
 # 2. Feature extraction
 # --------------------------------------------------
 
-extractor = FeatureExtractor(window="1min")
-output = extractor.extract(events)
+# Alert cutoffs carry over between runs with the published model
+registry = ModelRegistry("data/models" if group_by is None else f"data/models_by_{group_by}")
+
+scorer = AnomalyScorer(
+    if_weight=0.6,
+    baseline_weight=0.4,
+    anomaly_threshold=0.75,
+    thresholds=registry.load_thresholds() or AdaptiveThresholds(target_rate=0.01),
+)
+
+sharded = None
+if group_by is not None:
+    sharded = ShardedPipeline(
+        n_workers=args.workers, window="1min", scorer=scorer, endpoint_freq=endpoint_sketch,
+    )
+    output = sharded.extract(events)
+else:
+    output = extractor.extract_frame(events)
 
 context = output["context"]
-behavioral = output["behavioral_features"]
 ml_features = output["ml_features"]
 
-print("[INFO] Feature extraction complete")
+print(
+    "[INFO] Feature extraction complete "
+    f"({extractor.cache.hits} cached / {extractor.cache.misses} computed partitions)"
+    if sharded is None else "[INFO] Feature extraction complete"
+)
 
 # --------------------------------------------------
 # 3. Baseline learning
@@ -48,11 +134,15 @@ print("[INFO] Feature extraction complete")
 # Adaptive baseline
 # -------------------------
 
-baseline_store = BaselineStore()
-baseline_trainer = BaselineTrainer()
+baseline_trainer = StreamingBaselineTrainer()
 
+existing_sketches = baseline_store.load_sketches()
 existing_baseline = baseline_store.load()
-if existing_baseline:
+if existing_sketches:
+    baseline_trainer.load_state(existing_sketches)
+    print("[INFO] Loaded existing baseline sketches")
+elif existing_baseline:
+    # Pre-sketch baseline: used for scoring, sketches start with this batch
     baseline_trainer.baseline = existing_baseline
     print("[INFO] Loaded existing baseline")
 else:
@@ -66,24 +156,33 @@ baseline_scores = baseline_trainer.score_deviation(ml_features) \
 # Retraining decision
 # -------------------------
 
-hooks = RetrainingHooks()
+# Persisted next to the baseline: the retrain interval counts across runs
+hooks = RetrainingHooks(
+    path=baseline_store.path.with_name(f"{baseline_store.path.stem}_retraining.json")
+)
 avg_baseline_score = baseline_scores.mean()
 
-should_update = hooks.should_retrain(
+trigger = hooks.trigger(
     fp_rate=0.0,   # hook for admin feedback later
     avg_baseline_score=avg_baseline_score,
 )
 
-if should_update:
+if trigger is not None:
     if baseline_trainer.baseline:
-        baseline_trainer.update(ml_features, alpha=0.1)
-        print("[INFO] Baseline updated adaptively")
+        # The persisted sketches already hold the events earlier runs
+        # read: fold in the features of this run's new events only (the
+        # archive delta, like the endpoint sketch)
+        new_features = ml_features[events.index.isin(new_events.index)]
+        if len(new_features):
+            baseline_trainer.update(new_features, alpha=0.1)
+        print(f"[INFO] Baseline updated adaptively ({len(new_features)} new events)")
     else:
         baseline_trainer.fit(ml_features)
         print("[INFO] Baseline trained (cold start)")
 
     baseline_store.save(baseline_trainer.get_baseline())
-    hooks.mark_retrained()
+    baseline_store.save_sketches(baseline_trainer.state_dict())
+    hooks.mark_retrained(trigger)
 else:
     print("[INFO] Baseline remains unchanged")
 
@@ -95,24 +194,75 @@ baseline_scores = baseline_trainer.score_deviation(ml_features)
 # 4. Isolation Forest
 # --------------------------------------------------
 
-if_model = IsolationForestModel(contamination=0.02)
-if_model.fit(ml_features)
+train_features = ml_features
+if args.train_days:
+    # Longer history from the archive: only the columns the extractor
+    # reads, streamed one segment at a time. The same rows refit the
+    # baseline sketches
+    train_extractor = FeatureExtractor(
+        window="1min",
+        group_by=group_by,
+        endpoint_freq=copy.deepcopy(endpoint_sketch),  # already counted these events
+        encoders=archive.encoders,
+    )
+    train_stream = StreamingFeatureExtractor(train_extractor)
+    archive_baseline = StreamingBaselineTrainer()
+    parts = []
+    for frame in archive.scan(
+        start=events["timestamp"].max() - pd.Timedelta(days=args.train_days),
+        columns=train_extractor.input_columns,
+    ):
+        output = train_stream.update(frame)
+        # Windows see all traffic; only the requested endpoints' rows are kept
+        if args.train_endpoints:
+            output["ml_features"] = output["ml_features"][
+                output["context"]["uri_path"].isin(args.train_endpoints).to_numpy()
+            ]
+        if len(output["ml_features"]):
+            archive_baseline.update(output["ml_features"])
+        parts.append(output["ml_features"])
+
+    if parts and sum(map(len, parts)):
+        train_features = pd.concat(parts)
+
+        baseline_trainer = archive_baseline
+        baseline_store.save(baseline_trainer.get_baseline())
+        baseline_store.save_sketches(baseline_trainer.state_dict())
+        hooks.mark_retrained("archive")
+        baseline = baseline_trainer.get_baseline()
+        baseline_scores = baseline_trainer.score_deviation(ml_features)
+        print("[INFO] Baseline refit on the archived rows")
+    print(f"[INFO] Training on {len(train_features)} archived rows ({args.train_days} days)")
 
-if_scores = if_model.score(ml_features)
+if_model = IsolationForestModel(contamination=0.02)
+if_model.fit(train_features)
+
+# Publish model + baseline + calibration for the streaming scorer
+model_version = registry.publish(
+    if_model,
+    baseline_trainer.get_baseline(),
+    feature_names=list(ml_features.columns),
+    metadata={"group_by": group_by},
+    thresholds=scorer.thresholds,
+)
 
-print("[INFO] Isolation Forest trained")
+print(f"[INFO] Isolation Forest trained (registry version {model_version})")
 
 # --------------------------------------------------
 # 5. Hybrid anomaly scoring
 # --------------------------------------------------
 
-scorer = AnomalyScorer(
-    if_weight=0.6,
-    baseline_weight=0.4,
-    anomaly_threshold=0.75
-)
+# Per-endpoint alert cutoffs, learned across runs
+keys = context["uri_path"].to_numpy()
+
+if sharded:
+    # Workers score their row ranges with the version just published
+    results = sharded.score(ml_features, registry, model_version, keys=keys)
+    sharded.close()
+else:
+    results = scorer.score(if_model.score(ml_features), baseline_scores, keys=keys)
 
-results = scorer.score(if_scores, baseline_scores)
+registry.save_thresholds(scorer.thresholds, model_version)
 
 print("[INFO] Anomaly scoring complete")
 
@@ -122,11 +272,9 @@ print("[INFO] Anomaly scoring complete")
 
 baseline = baseline_trainer.get_baseline()
 
-diff_engine = FeatureDiff(baseline)
-diffs = diff_engine.diff(ml_features)
-
+# Only anomalous rows are explained (diffs computed for those rows only)
 explainer = ExplanationBuilder(baseline)
-explanations = explainer.build(ml_features, diffs)
+explanations = explainer.build(ml_features, mask=results["is_anomaly"])
 
 results["explanations"] = results.index.map(
     lambda i: explanations.get(i, [])
@@ -155,6 +303,11 @@ validator = RuleValidator(
 
 rules = [r for r in raw_rules if validator.validate(r)]
 
+# Shadow mode: replay this batch through the proposed rules to see
+# which would have fired, without enforcing anything
+shadow = RuleEngine(rules, statuses=None)
+shadow.replay(context)
+
 # --------------------------------------------------
 # 8. Print results
 # --------------------------------------------------
@@ -171,21 +324,36 @@ print("\n=== PROPOSED RULES ===")
 for rule in rules:
     print(rule)
 
+print("\n=== SHADOW REPLAY ===")
+print(shadow.report().to_string(index=False))
 
 
-Path("dashboard/data").mkdir(parents=True, exist_ok=True)
-
-with open("dashboard/data/context.pkl", "wb") as f:
-    pickle.dump(context, f)
+# --------------------------------------------------
+# 9. Persist run for the dashboard
+# --------------------------------------------------
 
-with open("dashboard/data/ml_features.pkl", "wb") as f:
-    pickle.dump(ml_features, f)
+run_id = ResultsStore("data/waf.db").append_run(
+    results,
+    context=context,
+    ml_features=ml_features,
+    rules=rules,
+    baseline=baseline,
+    model_version=model_version,
+    replace=True,  # the whole log is rescored every run
+)
 
-with open("dashboard/data/results.pkl", "wb") as f:
-    pickle.dump(results, f)
+print(f"[INFO] Run {run_id} stored in data/waf.db")
 
-with open("dashboard/data/rules.pkl", "wb") as f:
-    pickle.dump(rules, f)
+# Rule lifecycle: merge repeated detections, then decay / expire the
+# rules that are due
+repository = RuleRepository("data/waf.db")
+merged = repository.upsert(rules)
+swept = repository.sweep()
+print(
+    f"[INFO] Rules: {merged['inserted']} new, {merged['merged']} merged, "
+    f"{swept['decayed']} decayed, {swept['expired']} expired"
+)
 
-with open("dashboard/data/baseline.pkl", "wb") as f:
-    pickle.dump(baseline, f)
+# Stage timings / rows / bytes / peak RSS of this run
+MetricsStore("data/waf.db").record(source="pipeline")
+log_stage_summary(get_logger())
@@ -0,0 +1,171 @@
+import time
+
+import pandas as pd
+
+from ingestion.log_reader import NginxLogReader, ReaderCheckpoint
+from feature_engineering.extractor import FeatureExtractor, StreamingFeatureExtractor
+from feature_engineering.encoders import EventEncoders
+from baseline.baseline_trainer import BaselineTrainer
+from baseline.baseline_store import BaselineStore
+from baseline.sketches import FrequencySketch
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.autoencoder import HalfSpaceTreesModel
+from anomaly_detection.scorer import AnomalyScorer
+from anomaly_detection.thresholds import AdaptiveThresholds
+from anomaly_detection.scoring_service import ScoringService
+from explainability.explanation_builder import ExplanationBuilder
+from storage.models import ModelRegistry
+from storage.database import ResultsStore
+from storage.metrics_store import MetricsStore
+from training.retrain_pipeline import RetrainService
+from training.retraining_hooks import RetrainingHooks
+
+# --------------------------------------------------
+# Follow mode: tail the access log and score new events
+# as they arrive, instead of rerunning the batch pipeline
+# --------------------------------------------------
+
+log_path = "/home/nirmal-yadagani/synthetic_logs/ml_access.log"
+min_warmup_events = 50
+
+reader = NginxLogReader(log_path, batch_size=4096)
+checkpoint = ReaderCheckpoint("data/ml_access.checkpoint.json")
+baseline_store = BaselineStore()
+
+# Endpoint rarity from the decaying traffic history; the stream
+# extractor folds every new batch in
+endpoint_state = baseline_store.load_endpoints()
+endpoint_sketch = (
+    FrequencySketch.from_dict(endpoint_state) if endpoint_state
+    else FrequencySketch(half_life=5_000_000)
+)
+# Dictionary codes for IPs / URIs / methods / user agents, stable across restarts
+encoder_state = baseline_store.load_encoders()
+encoders = EventEncoders.from_state(encoder_state) if encoder_state else EventEncoders()
+stream = StreamingFeatureExtractor(
+    FeatureExtractor(window="1min", endpoint_freq=endpoint_sketch, encoders=encoders)
+)
+
+registry = ModelRegistry("data/models")
+results_store = ResultsStore("data/waf.db")
+metrics_store = MetricsStore("data/waf.db")
+metrics_interval = 60.0
+last_metrics = time.monotonic()
+
+scorer = AnomalyScorer(
+    if_weight=0.5,
+    baseline_weight=0.3,
+    online_weight=0.2,
+    anomaly_threshold=0.75,
+    # Per-endpoint cutoffs for a 1% alert rate; the persisted state
+    # replaces this one when a model is loaded
+    thresholds=AdaptiveThresholds(target_rate=0.01),
+)
+
+# Refits run in a niced worker process and are validated on the newest
+# rows before the live model is swapped; the hook state (last retrain)
+# survives restarts. Started before any thread so the worker forks clean
+hooks = RetrainingHooks(path="data/retraining_hooks.json")
+retrainer = RetrainService(registry, nice=10, n_jobs=1, cooldown=600.0).start()
+
+# Online detector: follows the traffic between Isolation Forest refits.
+# Fitted by the scoring service once it has seen a window of rows
+online_model = HalfSpaceTreesModel.load() or HalfSpaceTreesModel()
+
+# --------------------------------------------------
+# Persisted model + calibration: no fit on startup
+# --------------------------------------------------
+try:
+    service = ScoringService.load(
+        registry, scorer=scorer, hooks=hooks, check_interval=60.0,
+        online_model=online_model, retrainer=retrainer,
+    )
+    print(f"[INFO] Loaded model {registry.current_version()} from registry")
+except FileNotFoundError:
+    service = None
+    print("[INFO] No persisted model found, fitting on first events")
+
+warmup = []
+
+print(f"[INFO] Following {log_path}")
+
+for batch in reader.follow(checkpoint, poll_interval=1.0):
+    output = stream.update(batch)
+    ml_features = output["ml_features"]
+
+    # --------------------------------------------------
+    # Warm-up (first run only): fit once, persist, then only score
+    # --------------------------------------------------
+    if service is None:
+        warmup.append(ml_features)
+        history = pd.concat(warmup)
+        if len(history) < min_warmup_events:
+            continue
+
+        baseline_trainer = BaselineTrainer()
+        baseline_trainer.baseline = baseline_store.load() or {}
+        if not baseline_trainer.baseline:
+            baseline_trainer.fit(history)
+            baseline_store.save(baseline_trainer.get_baseline())
+            print("[INFO] Baseline trained (cold start)")
+
+        if_model = IsolationForestModel(contamination=0.02)
+        if_model.fit(history)
+        version = registry.publish(
+            if_model,
+            baseline_trainer.get_baseline(),
+            feature_names=list(history.columns),
+            thresholds=scorer.thresholds,
+        )
+        print(f"[INFO] Isolation Forest trained on {len(history)} events ({version})")
+
+        service = ScoringService(
+            if_model, baseline_trainer, scorer=scorer,
+            hooks=hooks, registry=registry, check_interval=60.0,
+            online_model=online_model, retrainer=retrainer,
+        )
+        warmup = []
+        ml_features = history
+
+    # --------------------------------------------------
+    # Incremental scoring of the new events only
+    # --------------------------------------------------
+    # Warm-up batches score the whole history; context only covers the last batch
+    context = output["context"] if len(output["context"]) == len(ml_features) else None
+    keys = context["uri_path"].to_numpy() if context is not None else None
+    results = service.score(ml_features, keys=keys)
+
+    # Refits run in the background on RetrainingHooks' schedule
+    if service.maybe_refit():
+        print("[INFO] Background Isolation Forest refit started")
+
+    baseline = service.baseline_trainer.get_baseline()
+
+    explanations = ExplanationBuilder(baseline).build(
+        ml_features, mask=results["is_anomaly"]
+    )
+    results["explanations"] = results.index.map(
+        lambda i: explanations.get(i, [])
+    )
+
+    results_store.append_run(
+        results, context=context, ml_features=ml_features,
+        model_version=registry.current_version(),
+    )
+
+    if time.monotonic() - last_metrics >= metrics_interval:
+        metrics_store.record(source="stream")
+        baseline_store.save_endpoints(endpoint_sketch.to_dict())
+        baseline_store.save_encoders(encoders.state_dict())
+        registry.save_thresholds(scorer.thresholds)
+        if online_model.fitted:
+            online_model.save()
+        last_metrics = time.monotonic()
+
+    anomalies = results[results["is_anomaly"]]
+    print(f"[INFO] Scored {len(results)} new events, {len(anomalies)} anomalies")
+
+    for ts, row in anomalies.iterrows():
+        print(f"\n{ts} Score: {row['final_score']:.2f}")
+        for reason in row["explanations"]:
+            print(" -", reason)
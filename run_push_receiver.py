@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+
+from ingestion.api_receiver import IngestQueue, PushReceiver, POLICIES
+from feature_engineering.extractor import FeatureExtractor, StreamingFeatureExtractor
+from feature_engineering.encoders import EventEncoders
+from baseline.baseline_store import BaselineStore
+from anomaly_detection.scorer import AnomalyScorer
+from anomaly_detection.scoring_service import ScoringService
+from storage.models import ModelRegistry
+from storage.metrics_store import MetricsStore
+
+# --------------------------------------------------
+# Push mode: nginx / a log shipper sends JSON lines to us
+# (TCP, Unix socket or HTTP bulk POST) instead of us tailing a file
+# --------------------------------------------------
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=9514)
+parser.add_argument("--unix", default=None)
+parser.add_argument("--http-port", type=int, default=9515)
+parser.add_argument("--max-events", type=int, default=1_000_000)
+parser.add_argument("--policy", choices=POLICIES, default="block")
+parser.add_argument("--batch-size", type=int, default=4096)
+args = parser.parse_args()
+
+registry = ModelRegistry("data/models")
+service = ScoringService.load(
+    registry,
+    scorer=AnomalyScorer(if_weight=0.6, baseline_weight=0.4, anomaly_threshold=0.75),
+)
+# Dictionary codes shared with the stream / batch scripts, stable across restarts
+baseline_store = BaselineStore()
+encoder_state = baseline_store.load_encoders()
+encoders = EventEncoders.from_state(encoder_state) if encoder_state else EventEncoders()
+stream = StreamingFeatureExtractor(FeatureExtractor(window="1min", encoders=encoders))
+
+queue = IngestQueue(max_events=args.max_events, policy=args.policy)
+receiver = PushReceiver(queue)
+metrics_store = MetricsStore("data/waf.db")
+
+
+def score(batch):
+    results = service.score(stream.update(batch)["ml_features"])
+    service.maybe_refit()
+    return results
+
+
+async def consume():
+    loop = asyncio.get_running_loop()
+    async for batch in queue.batches(max_events=args.batch_size):
+        # Feature stage + scoring off the event loop, receivers keep reading
+        results = await loop.run_in_executor(None, score, batch)
+        anomalies = results[results["is_anomaly"]]
+        if len(anomalies):
+            print(f"[INFO] {len(anomalies)} anomalies in {len(results)} events")
+
+
+async def report(interval: float = 10.0):
+    while True:
+        await asyncio.sleep(interval)
+        print(f"[INFO] ingest {queue.stats()}")
+        metrics_store.record(source="push")
+        baseline_store.save_encoders(encoders.state_dict())
+
+
+async def main():
+    import uvicorn
+
+    await receiver.start(args.host, args.port, unix_path=args.unix)
+    print(f"[INFO] Receiving on tcp://{args.host}:{args.port} ({args.policy} policy)")
+
+    http = uvicorn.Server(
+        uvicorn.Config(receiver.create_app(), host=args.host, port=args.http_port, log_level="warning")
+    )
+    await asyncio.gather(consume(), report(), http.serve())
+
+
+asyncio.run(main())
@@ -0,0 +1,339 @@
+# storage/archive.py
+
+import json
+import pickle
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from feature_engineering.encoders import ENCODED_COLUMNS, EventEncoders
+from ingestion.schema import EventBatch
+
+
+HOUR_NS = 3_600_000_000_000
+
+ARCHIVE_COLUMNS = (
+    "timestamp", "src_ip", "method", "uri_path", "status_code",
+    "payload_size", "response_time_ms", "user_agent",
+)
+
+# Segments listing more distinct endpoints than this skip the
+# endpoint list in their metadata (and are never pruned by endpoint)
+MAX_SEGMENT_ENDPOINTS = 4096
+
+
+def _ns(value) -> Optional[int]:
+    if value is None:
+        return None
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+class EventArchive:
+    """
+    Hour-partitioned columnar archive of raw events, for retraining on
+    any time range instead of whatever one log file holds.
+
+    Layout:
+      <root>/dictionary.pkl             EventEncoders state shared by all segments
+      <root>/2025-01-01T00/             one directory per hour
+          <first ts>-<id>/              one segment per append
+              _meta.json                rows, time / status range, endpoint codes
+              <column>.npz | .npy       one file per column
+
+    String columns are stored as dictionary codes, numerics in narrow
+    dtypes; with compress=True every column file is also zlib
+    compressed, otherwise it is a plain .npy that reads memory-map.
+
+    Reads prune hour directories by time range and segments by their
+    metadata (time, status, endpoints), load only the projected columns
+    (plus the ones a filter needs) and yield one segment at a time, so
+    a week of traffic is streamed, never held in memory at once.
+    Segments are written under a temporary name and renamed into place,
+    after the dictionary: readers only see complete segments whose codes
+    they can decode. One writer at a time; any number of readers.
+    """
+
+    def __init__(self, root="data/archive", compress: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.compress = compress
+        self.dictionary_path = self.root / "dictionary.pkl"
+
+        # Uncapped: stored segments reference every code ever assigned
+        self.encoders = EventEncoders(max_sizes=dict.fromkeys(ENCODED_COLUMNS))
+        self._refresh_dictionary()
+
+    # ------------------------------
+    # Write
+    # ------------------------------
+    def append(self, events: Union[pd.DataFrame, EventBatch]) -> int:
+        """Archive a block of events (any order); returns rows written"""
+        df = events.to_frame() if isinstance(events, EventBatch) else events
+        if len(df) == 0:
+            return 0
+
+        self._refresh_dictionary()
+        df = self.encoders.compact(df[list(ARCHIVE_COLUMNS)])
+
+        ts = pd.to_datetime(df["timestamp"]).to_numpy(dtype="M8[ns]").view(np.int64)
+        order = np.argsort(ts, kind="stable")
+        ts = ts[order]
+        columns = {"timestamp": ts}
+        for name in ARCHIVE_COLUMNS[1:]:
+            columns[name] = df[name].to_numpy()[order]
+
+        # Codes must be decodable before any segment using them is visible
+        self._save_dictionary()
+
+        hours = ts // HOUR_NS
+        bounds = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1], True])
+        for lo, hi in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            self._write_segment(int(hours[lo]), {name: values[lo:hi] for name, values in columns.items()})
+
+        return len(df)
+
+    def unarchived(self, events: pd.DataFrame) -> pd.DataFrame:
+        """
+        Rows of a reread source (an append-only log) not archived yet:
+        everything after the archive's last timestamp, plus the rows at
+        that timestamp beyond the identical ones already stored - with
+        one-second log timestamps, events written in the same second
+        after the previous run would otherwise be lost.
+        """
+        _, until = self.time_range()
+        if until is None or len(events) == 0:
+            return events
+
+        ts = pd.to_datetime(events["timestamp"]).to_numpy(dtype="M8[ns]")
+        keep = ts > until.to_datetime64()
+        boundary = np.flatnonzero(ts == until.to_datetime64())
+        if len(boundary) == 0:
+            return events[keep]
+
+        keys = list(ARCHIVE_COLUMNS[1:])
+        stored = self.read(start=until, end=until + pd.Timedelta(1, "ns"), columns=keys)
+        self._refresh_dictionary()
+        fresh = self.encoders.compact(events.iloc[boundary][keys]).reset_index(drop=True)
+        for name in ENCODED_COLUMNS:
+            stored[name] = stored[name].cat.codes.to_numpy().astype(np.int32)
+
+        # Multiset difference: the n-th copy of a row is new if fewer
+        # than n identical rows are stored
+        fresh["_n"] = fresh.groupby(keys, sort=False, dropna=False).cumcount()
+        stored["_n"] = stored.groupby(keys, sort=False, dropna=False).cumcount()
+        seen = fresh.merge(stored.assign(_seen=True), on=keys + ["_n"], how="left")["_seen"]
+        keep[boundary] = seen.isna().to_numpy()
+        return events[keep]
+
+    def prune(self, before) -> int:
+        """Drop every hour partition older than `before`; returns rows removed"""
+        hour = _ns(before) // HOUR_NS
+        removed = 0
+        for hour_dir in self._hour_dirs():
+            if self._hour(hour_dir) >= hour:
+                break
+            removed += sum(meta["rows"] for _, meta in self._segments_in(hour_dir))
+            shutil.rmtree(hour_dir, ignore_errors=True)
+        return removed
+
+    # ------------------------------
+    # Read
+    # ------------------------------
+    def scan(
+        self,
+        start=None,
+        end=None,
+        columns: Optional[Sequence[str]] = None,
+        endpoints: Optional[Sequence[str]] = None,
+        status: Optional[Sequence[int]] = None,
+        mmap: bool = True,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Events in [start, end), one frame per segment in time order.
+        columns: projection (default: all); string columns come back as
+        categoricals over self.encoders' categories.
+        endpoints / status: keep only events with these uri_path values /
+        status codes.
+        """
+        columns = list(columns or ARCHIVE_COLUMNS)
+        unknown = set(columns) - set(ARCHIVE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown archive columns: {sorted(unknown)}")
+
+        start_ns, end_ns = _ns(start), _ns(end)
+        segments = list(self._segments(start_ns, end_ns))
+        # Listed first, then the dictionary: it covers every listed segment
+        self._refresh_dictionary()
+
+        uri_codes = None
+        if endpoints is not None:
+            known = [self.encoders["uri_path"].codes.get(e) for e in endpoints]
+            uri_codes = np.array([c for c in known if c is not None], dtype=np.int32)
+            if len(uri_codes) == 0:
+                return
+        status = None if status is None else np.asarray(status, dtype=np.int64)
+
+        for path, meta in segments:
+            if not self._may_match(meta, start_ns, end_ns, uri_codes, status):
+                continue
+
+            loaded = {}
+
+            def column(name):
+                if name not in loaded:
+                    loaded[name] = self._load(path, name, mmap)
+                return loaded[name]
+
+            mask = np.ones(meta["rows"], dtype=bool)
+            if start_ns is not None and meta["ts_min"] < start_ns:
+                mask &= column("timestamp") >= start_ns
+            if end_ns is not None and meta["ts_max"] >= end_ns:
+                mask &= column("timestamp") < end_ns
+            if uri_codes is not None:
+                mask &= np.isin(column("uri_path"), uri_codes)
+            if status is not None:
+                mask &= np.isin(column("status_code"), status)
+
+            if not mask.any():
+                continue
+            everything = mask.all()
+            yield self._frame({
+                name: column(name) if everything else column(name)[mask]
+                for name in columns
+            })
+
+    def read(self, start=None, end=None, columns=None, endpoints=None, status=None) -> pd.DataFrame:
+        """Same as scan(), concatenated into one frame sorted by timestamp"""
+        frames = list(self.scan(start, end, columns, endpoints, status, mmap=False))
+        if not frames:
+            return self._frame({name: np.empty(0, dtype=np.int64) for name in columns or ARCHIVE_COLUMNS})
+
+        df = pd.concat(frames, ignore_index=True)
+        if "timestamp" in df:
+            df = df.sort_values("timestamp", kind="stable", ignore_index=True)
+        return df
+
+    def time_range(self) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        lo = hi = None
+        for _, meta in self._segments():
+            lo = meta["ts_min"] if lo is None else min(lo, meta["ts_min"])
+            hi = meta["ts_max"] if hi is None else max(hi, meta["ts_max"])
+        if lo is None:
+            return None, None
+        return pd.Timestamp(lo), pd.Timestamp(hi)
+
+    def count(self, start=None, end=None) -> int:
+        """Rows of the segments overlapping [start, end) (metadata only)"""
+        return sum(meta["rows"] for _, meta in self._segments(_ns(start), _ns(end)))
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    def _write_segment(self, hour: int, columns: Dict[str, np.ndarray]):
+        hour_dir = self.root / pd.Timestamp(hour * HOUR_NS).strftime("%Y-%m-%dT%H")
+        hour_dir.mkdir(exist_ok=True)
+
+        ts = columns["timestamp"]
+        status, uri = columns["status_code"], columns["uri_path"]
+        uri_codes = np.unique(uri[uri >= 0])
+        meta = {
+            "rows": len(ts),
+            "ts_min": int(ts[0]),
+            "ts_max": int(ts[-1]),
+            "status_min": int(status.min()),
+            "status_max": int(status.max()),
+            "uri_codes": uri_codes.tolist() if len(uri_codes) <= MAX_SEGMENT_ENDPOINTS else None,
+        }
+
+        tmp = hour_dir / f".tmp-{uuid.uuid4().hex}"
+        tmp.mkdir()
+        for name, values in columns.items():
+            if self.compress:
+                np.savez_compressed(tmp / f"{name}.npz", values=values)
+            else:
+                np.save(tmp / f"{name}.npy", values)
+        (tmp / "_meta.json").write_text(json.dumps(meta))
+        tmp.rename(hour_dir / f"{meta['ts_min']:020d}-{uuid.uuid4().hex[:8]}")
+
+    @staticmethod
+    def _load(path: Path, name: str, mmap: bool) -> np.ndarray:
+        plain = path / f"{name}.npy"
+        if plain.exists():
+            return np.load(plain, mmap_mode="r" if mmap else None)
+        with np.load(path / f"{name}.npz") as data:
+            return data["values"]
+
+    def _frame(self, data: Dict[str, np.ndarray]) -> pd.DataFrame:
+        frame = {}
+        for name, values in data.items():
+            if name == "timestamp":
+                frame[name] = np.asarray(values, dtype=np.int64).view("M8[ns]")
+            elif name in ENCODED_COLUMNS:
+                frame[name] = self.encoders[name].categorical(np.asarray(values, dtype=np.int32))
+            else:
+                frame[name] = np.asarray(values)
+        return pd.DataFrame(frame)
+
+    @staticmethod
+    def _may_match(meta: dict, start_ns, end_ns, uri_codes, status) -> bool:
+        if start_ns is not None and meta["ts_max"] < start_ns:
+            return False
+        if end_ns is not None and meta["ts_min"] >= end_ns:
+            return False
+        if status is not None and not (
+            (status >= meta["status_min"]) & (status <= meta["status_max"])
+        ).any():
+            return False
+        if uri_codes is not None and meta["uri_codes"] is not None:
+            return bool(np.isin(uri_codes, meta["uri_codes"]).any())
+        return True
+
+    def _hour_dirs(self) -> List[Path]:
+        return sorted(p for p in self.root.iterdir() if p.is_dir() and not p.name.startswith("."))
+
+    @staticmethod
+    def _hour(hour_dir: Path) -> int:
+        return pd.Timestamp(hour_dir.name + ":00").value // HOUR_NS
+
+    @staticmethod
+    def _segments_in(hour_dir: Path):
+        for path in sorted(hour_dir.iterdir()):
+            if path.name.startswith("."):
+                continue
+            try:
+                meta = json.loads((path / "_meta.json").read_text())
+            except FileNotFoundError:  # pruned meanwhile
+                continue
+            yield path, meta
+
+    def _segments(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None):
+        """(path, meta) of every segment in hours overlapping [start, end)"""
+        for hour_dir in self._hour_dirs():
+            hour = self._hour(hour_dir)
+            if start_ns is not None and hour < start_ns // HOUR_NS:
+                continue
+            if end_ns is not None and hour * HOUR_NS >= end_ns:
+                break
+            yield from self._segments_in(hour_dir)
+
+    def _refresh_dictionary(self):
+        """Pick up codes appended by other writers (dictionaries only grow)"""
+        if not self.dictionary_path.exists():
+            return
+        with open(self.dictionary_path, "rb") as f:
+            state = pickle.load(f)
+        for name, values in state.items():
+            encoder = self.encoders[name]
+            if len(values) > len(encoder):
+                # As stored: codes are positions in the stored lists
+                encoder.extend(values[len(encoder):])
+
+    def _save_dictionary(self):
+        tmp = self.dictionary_path.with_name(f".dictionary-{uuid.uuid4().hex}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(self.encoders.state_dict(), f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(self.dictionary_path)
@@ -0,0 +1,364 @@
+# storage/database.py
+
+import json
+import sqlite3
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+HOUR_NS = 3_600_000_000_000
+
+# Context columns kept next to each scored row: table column -> extractor column
+CONTEXT_COLUMNS = {
+    "src_ip": "src_ip",
+    "method": "method",
+    "uri_path": "uri_path",
+    "status": "status_code",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id        TEXT PRIMARY KEY,
+    created_at    TEXT NOT NULL,
+    model_version TEXT,
+    n_rows        INTEGER
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id         TEXT NOT NULL,
+    hour           INTEGER NOT NULL,
+    ts             INTEGER NOT NULL,
+    src_ip         TEXT,
+    method         TEXT,
+    uri_path       TEXT,
+    status         INTEGER,
+    if_score       REAL,
+    baseline_score REAL,
+    final_score    REAL,
+    is_anomaly     INTEGER NOT NULL,
+    explanations   TEXT
+);
+CREATE INDEX IF NOT EXISTS results_hour ON results (hour);
+CREATE INDEX IF NOT EXISTS results_anomaly_ts ON results (is_anomaly, ts);
+CREATE TABLE IF NOT EXISTS features (
+    run_id TEXT NOT NULL,
+    hour   INTEGER NOT NULL,
+    ts     INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS features_ts ON features (ts);
+CREATE TABLE IF NOT EXISTS rules (
+    run_id     TEXT NOT NULL,
+    created_at TEXT,
+    rule_type  TEXT,
+    endpoint   TEXT,
+    src_ip     TEXT,
+    confidence REAL,
+    status     TEXT,
+    rule       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS baselines (
+    run_id  TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    mean    REAL,
+    std     REAL,
+    p95     REAL,
+    p99     REAL
+);
+"""
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _ns(value) -> Optional[int]:
+    if value is None:
+        return None
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+class ResultsStore:
+    """
+    Queryable store for pipeline output (SQLite, stdlib only).
+
+    Every pipeline run appends its results, features, rules and baseline
+    under a run_id. Rows carry their timestamp (ns) and hour partition,
+    both indexed, so the dashboard asks for a time range / score filter /
+    limit and only those rows leave the database. Old partitions are
+    dropped with prune().
+
+    WAL mode lets the dashboard read while a pipeline run is writing.
+    """
+
+    def __init__(self, path="data/waf.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:  # commit / rollback
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------
+    # Write
+    # ------------------------------
+    def append_run(
+        self,
+        results: pd.DataFrame,
+        context: Optional[pd.DataFrame] = None,
+        ml_features: Optional[pd.DataFrame] = None,
+        rules: Optional[List[dict]] = None,
+        baseline: Optional[Dict[str, Dict[str, float]]] = None,
+        model_version: Optional[str] = None,
+        replace: bool = False,
+    ) -> str:
+        """
+        Append one pipeline run. context and ml_features are aligned
+        with results by position (the timestamp index may repeat).
+        replace: first drop the stored results / features in the time
+        range these results cover, in the same transaction - a run that
+        rescores a range already stored (the batch pipeline rereads the
+        whole log) replaces it instead of counting it twice. Leave it off
+        for streams whose batches only hold new events.
+        """
+        now = datetime.now(timezone.utc)
+        run_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+        with self._connect() as conn:
+            if replace and len(results):
+                ts = results.index.as_unit("ns").asi8
+                bounds = (int(ts.min()), int(ts.max()))
+                conn.execute("DELETE FROM results WHERE ts BETWEEN ? AND ?", bounds)
+                conn.execute("DELETE FROM features WHERE ts BETWEEN ? AND ?", bounds)
+            conn.execute(
+                "INSERT INTO runs VALUES (?, ?, ?, ?)",
+                (run_id, now.isoformat(), model_version, len(results)),
+            )
+            self._insert_results(conn, run_id, results, context)
+            if ml_features is not None:
+                self._insert_features(conn, run_id, ml_features)
+            if rules:
+                self._insert_rules(conn, run_id, rules)
+            if baseline:
+                conn.executemany(
+                    "INSERT INTO baselines VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (run_id, feature, *(float(s[k]) for k in ("mean", "std", "p95", "p99")))
+                        for feature, s in baseline.items()
+                    ],
+                )
+
+        return run_id
+
+    def _insert_results(self, conn, run_id, results, context):
+        ts = results.index.as_unit("ns").asi8
+        n = len(results)
+
+        def column(frame, name, dtype=object):
+            if frame is None or name not in frame.columns:
+                return [None] * n
+            values = frame[name].to_numpy()
+            if dtype is not object:
+                values = values.astype(dtype)
+            return values.tolist()
+
+        is_anomaly = results["is_anomaly"].to_numpy(dtype=bool)
+
+        # Explanations are only kept for anomalies
+        explanations = [None] * n
+        if "explanations" in results.columns:
+            texts = results["explanations"].to_numpy()
+            for i in np.flatnonzero(is_anomaly).tolist():
+                if texts[i]:
+                    explanations[i] = json.dumps(list(texts[i]))
+
+        conn.executemany(
+            "INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            zip(
+                [run_id] * n,
+                (ts // HOUR_NS).tolist(),
+                ts.tolist(),
+                *(column(context, c) for c in CONTEXT_COLUMNS.values()),
+                column(results, "if_score", float),
+                column(results, "baseline_score", float),
+                column(results, "final_score", float),
+                is_anomaly.astype(int).tolist(),
+                explanations,
+            ),
+        )
+
+    def _insert_features(self, conn, run_id, ml_features):
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(features)")}
+        for name in ml_features.columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE features ADD COLUMN {_quote(name)} REAL")
+
+        ts = ml_features.index.as_unit("ns").asi8
+        names = ", ".join(_quote(c) for c in ml_features.columns)
+        marks = ", ".join("?" * (3 + ml_features.shape[1]))
+        conn.executemany(
+            f"INSERT INTO features (run_id, hour, ts, {names}) VALUES ({marks})",
+            zip(
+                [run_id] * len(ts),
+                (ts // HOUR_NS).tolist(),
+                ts.tolist(),
+                *(ml_features[c].to_numpy(dtype=np.float64).tolist() for c in ml_features.columns),
+            ),
+        )
+
+    def _insert_rules(self, conn, run_id, rules):
+        conn.executemany(
+            "INSERT INTO rules VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    run_id,
+                    str(rule.get("created_at")),
+                    rule.get("rule_type"),
+                    rule.get("match", {}).get("endpoint"),
+                    rule.get("match", {}).get("src_ip"),
+                    rule.get("confidence"),
+                    rule.get("status"),
+                    json.dumps(rule, default=str),
+                )
+                for rule in rules
+            ],
+        )
+
+    def prune(self, before) -> int:
+        """Drop every hour partition older than `before`; returns rows removed"""
+        hour = _ns(before) // HOUR_NS
+        with self._connect() as conn:
+            removed = conn.execute("DELETE FROM results WHERE hour < ?", (hour,)).rowcount
+            conn.execute("DELETE FROM features WHERE hour < ?", (hour,))
+        return removed
+
+    # ------------------------------
+    # Read (filters and limits run in SQL)
+    # ------------------------------
+    def time_range(self):
+        with self._connect() as conn:
+            lo, hi = conn.execute("SELECT MIN(ts), MAX(ts) FROM results").fetchone()
+        if lo is None:
+            return None, None
+        return pd.Timestamp(lo), pd.Timestamp(hi)
+
+    def count_anomalies(self, start=None, end=None, min_score: Optional[float] = None) -> int:
+        where, params = self._where(start, end, min_score, anomalies_only=True)
+        with self._connect() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+
+    def anomalies(
+        self,
+        start=None,
+        end=None,
+        min_score: Optional[float] = None,
+        src_ip: Optional[str] = None,
+        limit: int = 200,
+    ) -> pd.DataFrame:
+        """Most recent anomalies first, explanations decoded to lists"""
+        where, params = self._where(start, end, min_score, anomalies_only=True)
+        if src_ip:
+            where += " AND src_ip = ?"
+            params.append(src_ip)
+
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                "SELECT ts, src_ip, method, uri_path, status, if_score, "
+                f"baseline_score, final_score, explanations FROM results{where} "
+                "ORDER BY ts DESC LIMIT ?",
+                conn,
+                params=params + [limit],
+            )
+
+        df["explanations"] = [json.loads(e) if e else [] for e in df["explanations"]]
+        return df.set_index(pd.to_datetime(df.pop("ts"), unit="ns"))
+
+    def feature_names(self) -> List[str]:
+        with self._connect() as conn:
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(features)")]
+        return [c for c in columns if c not in ("run_id", "hour", "ts")]
+
+    def feature_series(
+        self,
+        feature: str,
+        start=None,
+        end=None,
+        limit: int = 10_000,
+    ) -> pd.Series:
+        """One feature column over a time range (latest `limit` points)"""
+        if feature not in self.feature_names():
+            raise KeyError(f"Unknown feature: {feature}")
+
+        where, params = self._where(start, end)
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                f"SELECT ts, {_quote(feature)} AS value FROM features{where} "
+                "ORDER BY ts DESC LIMIT ?",
+                conn,
+                params=params + [limit],
+            )
+
+        index = pd.to_datetime(df["ts"].to_numpy()[::-1], unit="ns")
+        return pd.Series(df["value"].to_numpy()[::-1], index=index, name=feature)
+
+    def rules(self, status: Optional[str] = None, limit: int = 100) -> List[dict]:
+        """Rules of the latest run that proposed any, highest confidence first"""
+        sql = (
+            "SELECT rule FROM rules WHERE run_id = "
+            "(SELECT run_id FROM rules ORDER BY rowid DESC LIMIT 1)"
+        )
+        params = []
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                sql + " ORDER BY confidence DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def latest_baseline(self) -> Dict[str, Dict[str, float]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT feature, mean, std, p95, p99 FROM baselines WHERE run_id = "
+                "(SELECT run_id FROM baselines ORDER BY rowid DESC LIMIT 1)"
+            ).fetchall()
+        return {
+            feature: {"mean": mean, "std": std, "p95": p95, "p99": p99}
+            for feature, mean, std, p95, p99 in rows
+        }
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    @staticmethod
+    def _where(start=None, end=None, min_score=None, anomalies_only=False):
+        clauses, params = [], []
+        if anomalies_only:
+            clauses.append("is_anomaly = 1")
+        if start is not None:
+            clauses += ["ts >= ?", "hour >= ?"]
+            params += [_ns(start), _ns(start) // HOUR_NS]
+        if end is not None:
+            clauses += ["ts < ?", "hour <= ?"]
+            params += [_ns(end), _ns(end) // HOUR_NS]
+        if min_score is not None:
+            clauses.append("final_score >= ?")
+            params.append(float(min_score))
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params
@@ -0,0 +1,167 @@
+# storage/metrics_store.py
+
+import json
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from utils.metrics import METRICS, MetricsRegistry, histogram_quantile
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metric_samples (
+    ts     INTEGER NOT NULL,
+    source TEXT NOT NULL,
+    name   TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    value  REAL
+);
+CREATE INDEX IF NOT EXISTS metric_samples_name_ts ON metric_samples (name, ts);
+"""
+
+
+def _ns(value) -> Optional[int]:
+    if value is None:
+        return None
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+class MetricsStore:
+    """
+    Snapshots of a MetricsRegistry over time (SQLite, next to the
+    results store by default).
+
+    Counters and histograms are cumulative per process, so each snapshot
+    is tagged with its source (pipeline, stream, api, ...); per-interval
+    rates are differences between consecutive snapshots of one source.
+    """
+
+    def __init__(self, path="data/waf.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------
+    # Write
+    # ------------------------------
+    def record(self, registry: MetricsRegistry = METRICS, source: str = "pipeline", ts=None) -> int:
+        """Store one snapshot of every sample; returns the sample count"""
+        ts = _ns(ts) if ts is not None else time.time_ns()
+        rows = [
+            (ts, source, name, json.dumps(labels, sort_keys=True), float(value))
+            for name, labels, value in registry.snapshot()
+        ]
+        with self._connect() as conn:
+            conn.executemany("INSERT INTO metric_samples VALUES (?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def prune(self, before) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM metric_samples WHERE ts < ?", (_ns(before),)).rowcount
+
+    # ------------------------------
+    # Read
+    # ------------------------------
+    def sources(self) -> List[str]:
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT source FROM metric_samples ORDER BY source")]
+
+    def names(self) -> List[str]:
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT name FROM metric_samples ORDER BY name")]
+
+    def series(
+        self,
+        name: str,
+        labels: Optional[Dict[str, str]] = None,
+        source: Optional[str] = None,
+        start=None,
+        end=None,
+    ) -> pd.Series:
+        """One sample over time (exact label match; None = no labels)"""
+        sql = "SELECT ts, value FROM metric_samples WHERE name = ? AND labels = ?"
+        params = [name, json.dumps(labels or {}, sort_keys=True)]
+        if source:
+            sql += " AND source = ?"
+            params.append(source)
+        if start is not None:
+            sql += " AND ts >= ?"
+            params.append(_ns(start))
+        if end is not None:
+            sql += " AND ts < ?"
+            params.append(_ns(end))
+
+        with self._connect() as conn:
+            rows = conn.execute(sql + " ORDER BY ts", params).fetchall()
+
+        return pd.Series(
+            [v for _, v in rows],
+            index=pd.to_datetime([t for t, _ in rows], unit="ns"),
+            name=name,
+            dtype="float64",
+        )
+
+    def latest(self, source: str = "pipeline") -> pd.DataFrame:
+        """Every sample of the newest snapshot of a source"""
+        with self._connect() as conn:
+            df = pd.read_sql_query(
+                "SELECT name, labels, value FROM metric_samples WHERE source = ? AND ts = "
+                "(SELECT MAX(ts) FROM metric_samples WHERE source = ?)",
+                conn,
+                params=[source, source],
+            )
+        df["labels"] = [json.loads(labels) for labels in df["labels"]]
+        return df
+
+    def stage_summary(self, source: str = "pipeline") -> pd.DataFrame:
+        """
+        Per stage from the latest snapshot: calls, total / mean / p95
+        seconds, rows and rows per second
+        """
+        df = self.latest(source)
+        stages = {}
+        for name, labels, value in df.itertuples(index=False):
+            stage = labels.get("stage")
+            if stage is None:
+                continue
+            row = stages.setdefault(stage, {"stage": stage, "buckets": []})
+            if name == "waf_stage_seconds_count":
+                row["calls"] = int(value)
+            elif name == "waf_stage_seconds_sum":
+                row["seconds"] = value
+            elif name == "waf_stage_seconds_bucket":
+                row["buckets"].append((float(labels["le"]), value))
+            elif name == "waf_stage_rows_total":
+                row["rows"] = int(value)
+
+        rows = []
+        for row in stages.values():
+            calls, seconds = row.get("calls", 0), row.get("seconds", 0.0)
+            rows.append({
+                "stage": row["stage"],
+                "calls": calls,
+                "seconds": round(seconds, 4),
+                "mean_seconds": round(seconds / calls, 6) if calls else None,
+                "p95_seconds": histogram_quantile(0.95, row["buckets"]),
+                "rows": row.get("rows", 0),
+                "rows_per_sec": round(row.get("rows", 0) / seconds) if seconds else None,
+            })
+
+        columns = ["stage", "calls", "seconds", "mean_seconds", "p95_seconds", "rows", "rows_per_sec"]
+        return pd.DataFrame(rows, columns=columns).sort_values("seconds", ascending=False, ignore_index=True)
@@ -0,0 +1,259 @@
+# storage/models.py
+
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from anomaly_detection.forest_kernel import ARRAY_NAMES, FlatForest
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.thresholds import AdaptiveThresholds
+
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class ModelBundle:
+    """Everything a scoring worker needs, loaded from one registry version"""
+    version: str
+    if_model: IsolationForestModel
+    baseline: Dict[str, Dict[str, float]]
+    feature_names: List[str]
+    metadata: dict = field(default_factory=dict)
+    thresholds: Optional[AdaptiveThresholds] = None
+
+
+class ModelRegistry:
+    """
+    Versioned on-disk store of fitted models.
+
+    Layout:
+      <root>/CURRENT          name of the live version
+      <root>/v000001/
+          manifest.json       schema, calibration, sha256 of every file
+          isolation_forest.pkl
+          forest_<array>.npy  flattened forest, memory-mapped on load
+          baseline.json
+          thresholds.npz      adaptive alert thresholds (optional)
+
+    A version directory is fully written under a temporary name, then
+    renamed into place; CURRENT is swapped with os.replace. Readers
+    therefore only ever see complete versions, and publishing never
+    blocks them.
+
+    thresholds.npz is state, not part of the fitted model: live scoring
+    keeps adapting it, so it is outside the manifest checksums and
+    save_thresholds() rewrites it (atomically) in place.
+    """
+
+    def __init__(self, root="data/models", keep: int = 5):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.keep = keep
+
+    # ------------------------------
+    # Publish
+    # ------------------------------
+    def publish(
+        self,
+        if_model: IsolationForestModel,
+        baseline: Dict[str, Dict[str, float]],
+        feature_names: List[str],
+        metadata: Optional[dict] = None,
+        activate: bool = True,
+        thresholds: Optional[AdaptiveThresholds] = None,
+    ) -> str:
+        if not if_model.fitted:
+            raise RuntimeError("IsolationForestModel is not fitted")
+
+        staging = self.root / f".staging-{uuid.uuid4().hex}"
+        staging.mkdir()
+
+        files = {
+            "isolation_forest.pkl": pickle.dumps(
+                if_model.model, protocol=pickle.HIGHEST_PROTOCOL
+            ),
+            "baseline.json": json.dumps(
+                {f: {k: float(v) for k, v in s.items()} for f, s in baseline.items()}
+            ).encode(),
+        }
+
+        kernel = if_model.kernel or FlatForest.from_sklearn(if_model.model)
+        for name, array in kernel.to_arrays().items():
+            buffer = io.BytesIO()
+            np.save(buffer, np.ascontiguousarray(array))
+            files[f"forest_{name}.npy"] = buffer.getvalue()
+
+        for name, payload in files.items():
+            self._write(staging / name, payload)
+
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "created_at": datetime.utcnow().isoformat(),
+            "fitted_at": if_model.fitted_at.isoformat() if if_model.fitted_at else None,
+            "feature_names": list(feature_names),
+            "calibration": if_model.calibration,
+            "forest": kernel.meta(),
+            "metadata": metadata or {},
+            "files": {
+                name: {
+                    "sha256": hashlib.sha256(payload).hexdigest(),
+                    "bytes": len(payload),
+                }
+                for name, payload in files.items()
+            },
+        }
+        self._write(staging / "manifest.json", json.dumps(manifest, indent=2).encode())
+        if thresholds is not None:
+            self._write(staging / "thresholds.npz", self._dump_thresholds(thresholds))
+
+        version = self._claim_version(staging)
+
+        if activate:
+            self.activate(version)
+        self._prune()
+
+        return version
+
+    def activate(self, version: str):
+        """Atomically point CURRENT at an existing version (also used for rollback)"""
+        if not (self.root / version / "manifest.json").exists():
+            raise FileNotFoundError(f"Unknown model version: {version}")
+        self._write(self.root / "CURRENT", version.encode())
+
+    def save_thresholds(self, thresholds: AdaptiveThresholds, version: Optional[str] = None):
+        """Persist the current threshold state with a version (default: CURRENT)"""
+        version = version or self.current_version()
+        if version is None or not (self.root / version / "manifest.json").exists():
+            raise FileNotFoundError(f"Unknown model version: {version}")
+        self._write(self.root / version / "thresholds.npz", self._dump_thresholds(thresholds))
+
+    # ------------------------------
+    # Load
+    # ------------------------------
+    def current_version(self) -> Optional[str]:
+        current = self.root / "CURRENT"
+        if not current.exists():
+            return None
+        return current.read_text().strip() or None
+
+    def versions(self) -> List[str]:
+        return sorted(
+            p.name for p in self.root.glob("v*") if (p / "manifest.json").exists()
+        )
+
+    def load(
+        self,
+        version: Optional[str] = None,
+        backend: str = "auto",
+    ) -> Optional[ModelBundle]:
+        """
+        Load a version (default: CURRENT). Every file is checked against
+        the manifest checksum; a mismatch raises ValueError.
+        The flattened forest arrays are memory-mapped, so workers on one
+        host share them through the page cache.
+        """
+        version = version or self.current_version()
+        if version is None:
+            return None
+
+        directory = self.root / version
+        with open(directory / "manifest.json") as f:
+            manifest = json.load(f)
+
+        if manifest["format_version"] != FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported model format {manifest['format_version']} in {version}"
+            )
+
+        payloads = {}
+        for name, info in manifest["files"].items():
+            payload = (directory / name).read_bytes()
+            if hashlib.sha256(payload).hexdigest() != info["sha256"]:
+                raise ValueError(f"Checksum mismatch for {version}/{name}")
+            payloads[name] = payload
+
+        kernel = None
+        if backend != "sklearn":
+            kernel = FlatForest.from_arrays(
+                {
+                    name: np.load(directory / f"forest_{name}.npy", mmap_mode="r")
+                    for name in ARRAY_NAMES
+                },
+                manifest["forest"],
+            )
+
+        if_model = IsolationForestModel.from_fitted(
+            pickle.loads(payloads["isolation_forest.pkl"]),
+            manifest["calibration"],
+            fitted_at=(
+                datetime.fromisoformat(manifest["fitted_at"])
+                if manifest["fitted_at"] else None
+            ),
+            backend=backend,
+            kernel=kernel,
+        )
+
+        return ModelBundle(
+            version=version,
+            if_model=if_model,
+            baseline=json.loads(payloads["baseline.json"]),
+            feature_names=manifest["feature_names"],
+            metadata=manifest["metadata"],
+            thresholds=self.load_thresholds(version),
+        )
+
+    def load_thresholds(self, version: Optional[str] = None) -> Optional[AdaptiveThresholds]:
+        version = version or self.current_version()
+        path = self.root / version / "thresholds.npz" if version else None
+        if path is None or not path.exists():
+            return None
+
+        with np.load(path, allow_pickle=False) as data:
+            return AdaptiveThresholds.from_state(dict(data))
+
+    # ------------------------------
+    # Internal helpers
+    # ------------------------------
+    @staticmethod
+    def _dump_thresholds(thresholds: AdaptiveThresholds) -> bytes:
+        buffer = io.BytesIO()
+        np.savez(buffer, **thresholds.state_dict())
+        return buffer.getvalue()
+
+    @staticmethod
+    def _write(path: Path, payload: bytes):
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _claim_version(self, staging: Path) -> str:
+        while True:
+            existing = [int(v[1:]) for v in self.versions() if v[1:].isdigit()]
+            version = f"v{max(existing, default=0) + 1:06d}"
+            try:
+                staging.rename(self.root / version)
+                return version
+            except OSError:
+                # Another publisher claimed this number first
+                if not (self.root / version).exists():
+                    raise
+
+    def _prune(self):
+        current = self.current_version()
+        for version in self.versions()[: -self.keep]:
+            if version != current:
+                shutil.rmtree(self.root / version, ignore_errors=True)
@@ -0,0 +1,311 @@
+# storage/rule_repository.py
+
+import json
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from rule_engine.confidence_decay import ConfidenceDecay
+from rule_engine.enforcer import rule_id
+
+
+DAY_NS = 86_400_000_000_000
+
+# Statuses that still decay; expired / rejected rules leave the index
+CLOSED_STATUSES = ("expired", "rejected")
+
+# Most common explanations kept per rule
+MAX_EVIDENCE = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rule_repository (
+    rule_id            TEXT PRIMARY KEY,
+    rule_type          TEXT NOT NULL,
+    endpoint           TEXT,
+    src_ip             TEXT,
+    status             TEXT NOT NULL,
+    confidence         REAL NOT NULL,
+    confidence_decayed REAL NOT NULL,
+    age_days           INTEGER NOT NULL,
+    detections         INTEGER NOT NULL,
+    created_at         INTEGER NOT NULL,
+    last_seen          INTEGER NOT NULL,
+    due_at             INTEGER,
+    action             TEXT NOT NULL,
+    evidence           TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rule_repository_due
+    ON rule_repository (due_at) WHERE due_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS rule_repository_status
+    ON rule_repository (status, confidence_decayed);
+"""
+
+COLUMNS = (
+    "rule_id", "rule_type", "endpoint", "src_ip", "status", "confidence",
+    "confidence_decayed", "age_days", "detections", "created_at", "last_seen",
+    "due_at", "action", "evidence",
+)
+
+
+def _ns(value) -> int:
+    return pd.Timestamp(value).as_unit("ns").value
+
+
+def _chunks(items: list, size: int = 500):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+class RuleRepository:
+    """
+    Lifecycle store for generated rules (SQLite).
+
+    Rules are deduplicated by (rule_type, endpoint, src_ip): a repeated
+    detection merges its evidence into the existing rule, bumps the
+    detection count and renews the decay (confidence = max of the new
+    and the currently decayed confidence, decayed from last_seen).
+
+    Decay follows ConfidenceDecay (whole days since last_seen), so the
+    next change of every open rule is known in advance: due_at, kept in
+    a partial index. sweep() reads only the rules that are due, in
+    batches, updates their decayed confidence and expires those below
+    the threshold - nothing else is touched.
+    """
+
+    def __init__(self, path="data/waf.db", decay: Optional[ConfidenceDecay] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.decay = decay or ConfidenceDecay()
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------
+    # Write
+    # ------------------------------
+    def upsert(self, rules: Iterable[dict], now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Insert new rules and merge repeated detections.
+        Returns {"inserted": n, "merged": n}.
+        """
+        now_ns = _ns(now or datetime.utcnow())
+
+        # Duplicates within the batch first
+        batch: Dict[str, dict] = {}
+        for rule in rules:
+            key = rule_id(rule)
+            merged = batch.get(key)
+            if merged is None:
+                batch[key] = merged = {
+                    "rule": rule,
+                    "confidence": float(rule["confidence"]),
+                    "evidence": Counter(),
+                    "detections": 0,
+                    "created_at": _ns(rule["created_at"]) if rule.get("created_at") else now_ns,
+                }
+            merged["confidence"] = max(merged["confidence"], float(rule["confidence"]))
+            merged["evidence"].update(dict(map(tuple, rule.get("evidence", []))))
+            merged["detections"] += int(rule.get("detections", 1))
+
+        if not batch:
+            return {"inserted": 0, "merged": 0}
+
+        with self._connect() as conn:
+            existing = {}
+            for keys in _chunks(list(batch)):
+                marks = ", ".join("?" * len(keys))
+                for row in conn.execute(
+                    "SELECT rule_id, status, confidence, detections, created_at, last_seen, evidence "
+                    f"FROM rule_repository WHERE rule_id IN ({marks})",
+                    keys,
+                ):
+                    existing[row[0]] = row
+
+            rows = []
+            for key, merged in batch.items():
+                rule = merged["rule"]
+                confidence, evidence = merged["confidence"], merged["evidence"]
+                detections, created_at, status = merged["detections"], merged["created_at"], rule.get("status", "proposed")
+
+                old = existing.get(key)
+                if old is not None:
+                    _, old_status, old_confidence, old_detections, created_at, last_seen, old_evidence = old
+                    age_days = max(now_ns - last_seen, 0) // DAY_NS
+                    confidence = max(confidence, float(self.decay.decayed(old_confidence, age_days)))
+                    evidence = evidence + Counter(dict(map(tuple, json.loads(old_evidence))))
+                    detections += old_detections
+                    # A closed rule detected again is proposed again
+                    status = "proposed" if old_status in CLOSED_STATUSES else old_status
+
+                if confidence < self.decay.expire_below:
+                    status, due_at = "expired", None
+                else:
+                    due_at = now_ns + DAY_NS if status not in CLOSED_STATUSES else None
+
+                rows.append((
+                    key,
+                    rule["rule_type"],
+                    rule.get("match", {}).get("endpoint"),
+                    rule.get("match", {}).get("src_ip"),
+                    status,
+                    round(confidence, 4),
+                    round(confidence, 4),
+                    0,
+                    detections,
+                    created_at,
+                    now_ns,
+                    due_at,
+                    json.dumps(rule.get("action", {})),
+                    json.dumps([list(item) for item in evidence.most_common(MAX_EVIDENCE)]),
+                ))
+
+            updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS[1:])
+            conn.executemany(
+                f"INSERT INTO rule_repository ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT (rule_id) DO UPDATE SET {updates}",
+                rows,
+            )
+
+        return {"inserted": len(batch) - len(existing), "merged": len(existing)}
+
+    def sweep(self, now: Optional[datetime] = None, batch_size: int = 10_000) -> Dict[str, int]:
+        """
+        Apply decay to the rules that are due and expire those that fell
+        below the threshold. Returns {"decayed": n, "expired": n}.
+        """
+        now_ns = _ns(now or datetime.utcnow())
+        decayed = expired = 0
+
+        while True:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT rule_id, confidence, last_seen FROM rule_repository "
+                    "WHERE due_at IS NOT NULL AND due_at <= ? ORDER BY due_at LIMIT ?",
+                    (now_ns, batch_size),
+                ).fetchall()
+                if not rows:
+                    break
+
+                ids = [r[0] for r in rows]
+                confidence = np.array([r[1] for r in rows], dtype=np.float64)
+                last_seen = np.array([r[2] for r in rows], dtype=np.int64)
+
+                age_days = (now_ns - last_seen) // DAY_NS
+                values = self.decay.decayed(confidence, age_days)
+                is_expired = values < self.decay.expire_below
+                due_at = last_seen + (age_days + 1) * DAY_NS
+
+                conn.executemany(
+                    "UPDATE rule_repository SET confidence_decayed = ?, age_days = ?, due_at = ?, "
+                    "status = CASE WHEN ? THEN 'expired' ELSE status END WHERE rule_id = ?",
+                    zip(
+                        np.round(values, 4).tolist(),
+                        age_days.tolist(),
+                        [None if e else int(d) for e, d in zip(is_expired.tolist(), due_at.tolist())],
+                        is_expired.tolist(),
+                        ids,
+                    ),
+                )
+
+            decayed += len(rows)
+            expired += int(is_expired.sum())
+
+        return {"decayed": decayed, "expired": expired}
+
+    def set_status(self, rule_ids: Sequence[str], status: str) -> int:
+        """Approve / reject / ... rules; closing a rule drops it from the due index"""
+        closed = status in CLOSED_STATUSES
+        with self._connect() as conn:
+            return conn.executemany(
+                "UPDATE rule_repository SET status = ?, "
+                "due_at = CASE WHEN ? THEN NULL ELSE COALESCE(due_at, last_seen + ?) END "
+                "WHERE rule_id = ?",
+                [(status, closed, DAY_NS, key) for key in rule_ids],
+            ).rowcount
+
+    # ------------------------------
+    # Read
+    # ------------------------------
+    def rules(
+        self,
+        status: Union[str, Sequence[str], None] = None,
+        min_confidence: Optional[float] = None,
+        limit: Optional[int] = 100,
+    ) -> List[dict]:
+        """Rules in generator format (plus lifecycle fields), most confident first"""
+        sql, params = f"SELECT {', '.join(COLUMNS)} FROM rule_repository", []
+        clauses = []
+        if status is not None:
+            statuses = [status] if isinstance(status, str) else list(status)
+            clauses.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params += statuses
+        if min_confidence is not None:
+            clauses.append("confidence_decayed >= ?")
+            params.append(float(min_confidence))
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY confidence_decayed DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+
+        with self._connect() as conn:
+            return [self._to_rule(row) for row in conn.execute(sql, params)]
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM rule_repository WHERE rule_id = ?", (key,)
+            ).fetchone()
+        return self._to_rule(row) if row else None
+
+    def count(self, status: Optional[str] = None) -> int:
+        with self._connect() as conn:
+            if status is None:
+                return conn.execute("SELECT COUNT(*) FROM rule_repository").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM rule_repository WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+    def due(self, now: Optional[datetime] = None) -> int:
+        """How many rules the next sweep would touch"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM rule_repository WHERE due_at IS NOT NULL AND due_at <= ?",
+                (_ns(now or datetime.utcnow()),),
+            ).fetchone()[0]
+
+    @staticmethod
+    def _to_rule(row) -> dict:
+        record = dict(zip(COLUMNS, row))
+        return {
+            "rule_id": record["rule_id"],
+            "rule_type": record["rule_type"],
+            "match": {"endpoint": record["endpoint"], "src_ip": record["src_ip"]},
+            "action": json.loads(record["action"]),
+            "confidence": record["confidence"],
+            "confidence_decayed": record["confidence_decayed"],
+            "age_days": record["age_days"],
+            "created_at": pd.Timestamp(record["created_at"]).to_pydatetime(),
+            "last_seen": pd.Timestamp(record["last_seen"]).to_pydatetime(),
+            "status": record["status"],
+            "detections": record["detections"],
+            "evidence": json.loads(record["evidence"]),
+        }
@@ -0,0 +1,502 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+
+from anomaly_detection import autoencoder, forest_kernel
+from anomaly_detection.autoencoder import HalfSpaceTreesModel
+from anomaly_detection.forest_kernel import FlatForest
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.scorer import AnomalyScorer
+from anomaly_detection.scoring_service import ScoringService
+from anomaly_detection.thresholds import AdaptiveThresholds
+from baseline.baseline_store import BaselineStore
+from baseline.baseline_trainer import BaselineTrainer, StreamingBaselineTrainer
+from baseline.sketches import FrequencySketch
+from storage.models import ModelRegistry
+from training.retrain_pipeline import RetrainService
+from training.retraining_hooks import RetrainingHooks
+from training.train_anomaly_model import split_holdout, train_isolation_forest, validate_model
+
+
+def _features(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        rng.normal(size=(n, 4)),
+        columns=["req_rate", "payload_size_mean", "error_rate_4xx", "burstiness"],
+        index=pd.date_range("2025-01-01", periods=n, freq="s"),
+    )
+
+
+@pytest.fixture(scope="module")
+def fitted_model():
+    model = IsolationForestModel(n_estimators=50)
+    model.fit(_features())
+    return model
+
+
+def test_score_does_not_depend_on_batch_composition(fitted_model):
+    X = _features(seed=1)
+    full = fitted_model.score(X)
+    single = pd.concat([fitted_model.score(X.iloc[[i]]) for i in range(20)])
+
+    np.testing.assert_allclose(single.to_numpy(), full.iloc[:20].to_numpy())
+    assert full.between(0, 1).all()
+
+
+def test_save_load_roundtrip(fitted_model, tmp_path):
+    path = tmp_path / "model.pkl"
+    fitted_model.save(path)
+    loaded = IsolationForestModel.load(path)
+
+    X = _features(seed=2)
+    np.testing.assert_array_equal(loaded.score(X), fitted_model.score(X))
+    assert loaded.calibration == fitted_model.calibration
+    assert IsolationForestModel.load(tmp_path / "missing.pkl") is None
+
+
+def test_scoring_service_refits_in_background(fitted_model, tmp_path):
+    trainer = BaselineTrainer()
+    trainer.fit(_features())
+
+    registry = ModelRegistry(tmp_path / "models")
+    hooks = RetrainingHooks(drift_threshold=-1.0)  # always due
+    service = ScoringService(
+        fitted_model,
+        trainer,
+        hooks=hooks,
+        registry=registry,
+        check_interval=0.0,
+    )
+
+    results = service.score(_features(n=64, seed=3))
+    assert list(results.columns) == ["if_score", "baseline_score", "final_score", "is_anomaly"]
+
+    assert service.maybe_refit()
+    service.wait_for_refit()
+
+    assert service.if_model is not fitted_model
+    assert registry.current_version() == "v000001"
+
+
+def test_registry_roundtrip_and_warm_start(fitted_model, tmp_path):
+    registry = ModelRegistry(tmp_path / "models")
+    assert registry.load() is None
+
+    trainer = BaselineTrainer()
+    trainer.fit(_features())
+    version = registry.publish(fitted_model, trainer.get_baseline(), list(_features().columns))
+
+    bundle = registry.load()
+    assert bundle.version == version
+    assert bundle.feature_names == list(_features().columns)
+    assert bundle.baseline.keys() == trainer.get_baseline().keys()
+
+    X = _features(seed=4)
+    np.testing.assert_array_equal(bundle.if_model.score(X), fitted_model.score(X))
+
+    service = ScoringService.load(registry)
+    assert service.if_model.calibration == fitted_model.calibration
+
+
+def test_registry_detects_corruption(fitted_model, tmp_path):
+    registry = ModelRegistry(tmp_path / "models")
+    version = registry.publish(fitted_model, {}, [])
+
+    with open(tmp_path / "models" / version / "isolation_forest.pkl", "ab") as f:
+        f.write(b"\0")
+
+    with pytest.raises(ValueError):
+        registry.load()
+
+
+def test_registry_activate_and_prune(fitted_model, tmp_path):
+    registry = ModelRegistry(tmp_path / "models", keep=2)
+    versions = [registry.publish(fitted_model, {}, []) for _ in range(4)]
+
+    assert registry.versions() == versions[-2:]
+    assert registry.current_version() == versions[-1]
+
+    registry.activate(versions[-2])
+    assert registry.load().version == versions[-2]
+
+    with pytest.raises(FileNotFoundError):
+        registry.activate(versions[0])
+
+
+@pytest.mark.parametrize("use_numba", [False, True])
+@pytest.mark.parametrize("max_features", [1.0, 0.5])
+def test_flat_forest_matches_sklearn(use_numba, max_features):
+    if use_numba and forest_kernel.numba is None:
+        pytest.skip("numba not installed")
+
+    X = _features(n=2_000).to_numpy()
+    model = IsolationForest(n_estimators=40, max_features=max_features, random_state=0).fit(X)
+    kernel = FlatForest.from_sklearn(model, use_numba=use_numba)
+
+    Y = _features(n=300, seed=5).to_numpy() * 3
+    np.testing.assert_array_equal(kernel.score_samples(Y), model.score_samples(Y))
+    np.testing.assert_array_equal(kernel.score_samples(Y[:1]), model.score_samples(Y[:1]))
+
+
+def test_scoring_backends_agree():
+    X = _features()
+    scores = {}
+    for backend in ("sklearn", "flat", "auto"):
+        model = IsolationForestModel(n_estimators=50, backend=backend)
+        model.fit(X)
+        scores[backend] = model.score(_features(seed=6))
+
+    np.testing.assert_array_equal(scores["flat"], scores["sklearn"])
+    np.testing.assert_array_equal(scores["auto"], scores["sklearn"])
+
+
+def test_streaming_baseline_matches_batch_stats():
+    rng = np.random.default_rng(3)
+    X = pd.DataFrame({"payload_size_mean": rng.lognormal(6, 1, size=200_000)})
+
+    streaming = StreamingBaselineTrainer()
+    for chunk in np.array_split(np.arange(len(X)), 20):
+        streaming.update(X.iloc[chunk])
+
+    exact = BaselineTrainer()
+    exact.fit(X)
+
+    got = streaming.get_baseline()["payload_size_mean"]
+    want = exact.get_baseline()["payload_size_mean"]
+    assert got["mean"] == pytest.approx(want["mean"], rel=1e-9)
+    assert got["std"] == pytest.approx(want["std"], rel=1e-9)
+    assert got["p95"] == pytest.approx(want["p95"], rel=0.01)
+    assert got["p99"] == pytest.approx(want["p99"], rel=0.01)
+
+
+def test_streaming_baseline_merge_and_store(tmp_path):
+    X = _features(n=20_000)
+
+    whole = StreamingBaselineTrainer()
+    whole.fit(X)
+
+    left, right = StreamingBaselineTrainer(), StreamingBaselineTrainer()
+    left.fit(X.iloc[:7_000])
+    right.fit(X.iloc[7_000:])
+    left.merge(right)
+
+    for col in X.columns:
+        for k in ("mean", "std"):
+            assert left.baseline[col][k] == pytest.approx(whole.baseline[col][k], rel=1e-9)
+        for k in ("p95", "p99"):
+            assert left.baseline[col][k] == pytest.approx(whole.baseline[col][k], abs=0.05)
+
+    store = BaselineStore(tmp_path / "baseline.pkl")
+    store.save_sketches(left.state_dict())
+
+    restored = StreamingBaselineTrainer()
+    restored.load_state(store.load_sketches())
+    assert restored.get_baseline() == left.get_baseline()
+
+
+def test_frequency_sketch_counts_merges_and_decays(tmp_path):
+    rng = np.random.default_rng(0)
+    keys = np.array([f"/p{i}" for i in rng.zipf(1.5, size=50_000) % 5_000], dtype=object)
+    exact = pd.Series(keys).value_counts()
+
+    whole = FrequencySketch(width=2**12, top_k=20)
+    left, right = FrequencySketch(width=2**12, top_k=20), FrequencySketch(width=2**12, top_k=20)
+    for i in range(0, len(keys), 4_096):
+        whole.update(keys[i : i + 4_096])
+    left.update(keys[:20_000])
+    right.update(keys[20_000:])
+    left.merge(right)
+
+    # Count-min never underestimates; heavy hitters are (near) exact
+    estimate = whole.estimate(exact.index.to_numpy())
+    assert (estimate >= exact.to_numpy()).all()
+    assert list(whole.top(5).index) == list(exact.index[:5])
+    np.testing.assert_allclose(whole.top(5).to_numpy(), exact.to_numpy()[:5], rtol=1e-3)
+    assert left.total == whole.total == len(keys)
+    assert (left.estimate(exact.index.to_numpy()) >= exact.to_numpy()).all()
+    assert whole.estimate([None, "/never-seen-path"])[0] == 0
+
+    # Counts halve every half_life events, whatever the batch sizes
+    decaying = FrequencySketch(half_life=1_000)
+    decaying.update(["/a"] * 1_000)
+    decaying.update(["/b"] * 500)
+    decaying.update(["/b"] * 500)
+    assert decaying.estimate(["/a"])[0] == pytest.approx(500)
+    assert decaying.frequency(["/a", "/b"]).sum() == pytest.approx(1.0)
+
+    store = BaselineStore(tmp_path / "baseline.pkl")
+    store.save_endpoints(whole.to_dict())
+    restored = FrequencySketch.from_dict(store.load_endpoints())
+    np.testing.assert_array_equal(restored.estimate(exact.index.to_numpy()), estimate)
+    assert restored.top(5).equals(whole.top(5))
+
+
+@pytest.mark.parametrize("use_numba", [False, True])
+def test_half_space_trees_scores_and_slides(use_numba, tmp_path):
+    if use_numba and autoencoder.numba is None:
+        pytest.skip("numba not installed")
+
+    X = _features(n=4_000)
+    model = HalfSpaceTreesModel(n_trees=20, height=8, window_size=1_000, use_numba=use_numba)
+    model.fit(X)
+
+    scores = model.score(_features(n=200, seed=1))
+    outliers = model.score(_features(n=200, seed=2) + 6)
+    assert scores.between(0, 1).all() and outliers.between(0, 1).all()
+    assert (scores.index == _features(n=200, seed=1).index).all()
+    assert outliers.mean() > scores.mean() + 0.3
+
+    # Same rows, one by one or in one batch
+    single = pd.concat([model.score(X.iloc[[i]]) for i in range(10)])
+    np.testing.assert_array_equal(single.to_numpy(), model.score(X.iloc[:10]).to_numpy())
+
+    # A full window of shifted traffic becomes the new reference
+    shifted = _features(n=1_000, seed=3) + 6
+    model.update(shifted.iloc[:600])
+    assert model.score(shifted).mean() > scores.mean() + 0.3
+    model.update(shifted.iloc[600:])
+    assert model.window_count == 0
+    assert model.score(_features(n=200, seed=4) + 6).mean() < outliers.mean() - 0.3
+
+    model.save(tmp_path / "hst.pkl")
+    loaded = HalfSpaceTreesModel.load(tmp_path / "hst.pkl")
+    np.testing.assert_array_equal(loaded.score(X).to_numpy(), model.score(X).to_numpy())
+    assert HalfSpaceTreesModel.load(tmp_path / "missing.pkl") is None
+
+
+def test_half_space_trees_kernels_agree():
+    if autoencoder.numba is None:
+        pytest.skip("numba not installed")
+
+    models = [
+        HalfSpaceTreesModel(n_trees=10, height=8, window_size=500, use_numba=use_numba).fit(_features(n=2_000))
+        for use_numba in (False, True)
+    ]
+    stream = _features(n=1_700, seed=7) * 2
+    for model in models:
+        model.update(stream)
+
+    np.testing.assert_array_equal(models[0].reference, models[1].reference)
+    np.testing.assert_array_equal(models[0].latest, models[1].latest)
+    np.testing.assert_array_equal(models[0].score(stream).to_numpy(), models[1].score(stream).to_numpy())
+
+
+def test_scoring_service_blends_online_model(fitted_model):
+    trainer = BaselineTrainer()
+    trainer.fit(_features())
+
+    online = HalfSpaceTreesModel(n_trees=10, height=6, window_size=600)
+    scorer = AnomalyScorer(if_weight=0.5, baseline_weight=0.3, online_weight=0.2)
+    service = ScoringService(
+        fitted_model, trainer, scorer=scorer, check_interval=float("inf"), online_model=online,
+    )
+
+    # Unfitted: the other two scores are blended with rescaled weights
+    first = service.score(_features(n=500, seed=1))
+    assert "online_score" not in first
+    np.testing.assert_allclose(
+        first["final_score"], 0.625 * first["if_score"] + 0.375 * first["baseline_score"]
+    )
+    assert not online.fitted
+
+    # Fitted once a window of history is remembered
+    service.score(_features(n=200, seed=2))
+    assert online.fitted and online.window_count == 0
+
+    batch = pd.concat([_features(n=100, seed=3), _features(n=5, seed=4) + 8])
+    results = service.score(batch)
+    np.testing.assert_allclose(
+        results["final_score"],
+        0.5 * results["if_score"] + 0.3 * results["baseline_score"] + 0.2 * results["online_score"],
+    )
+    assert results["is_anomaly"].iloc[-5:].all()
+    # Only rows that were not flagged are learned
+    assert online.window_count == (~results["is_anomaly"]).sum()
+
+
+def test_adaptive_thresholds_hit_target_rate_and_follow_shift():
+    rng = np.random.default_rng(0)
+    thresholds = AdaptiveThresholds(target_rate=0.05, half_life=5_000, min_weight=500)
+
+    # Cold: the caller's default
+    assert thresholds.cutoffs(3, default=0.7).tolist() == [0.7, 0.7, 0.7]
+
+    scores = rng.beta(2, 8, size=40_000)
+    flagged = 0
+    for start in range(0, len(scores), 100):
+        batch = scores[start : start + 100]
+        flagged += (batch > thresholds.cutoffs(len(batch))).sum()
+        thresholds.update(batch)
+
+    assert abs(flagged / len(scores) - 0.05) < 0.005
+    assert abs(thresholds.cutoffs(1)[0] - np.quantile(scores, 0.95)) < 0.01
+
+    # Scores shift up: the old traffic decays away within a few half-lives
+    shifted = 0.3 + 0.7 * rng.beta(2, 8, size=30_000)
+    thresholds.update(shifted)
+    assert abs(thresholds.cutoffs(1)[0] - np.quantile(shifted, 0.95)) < 0.02
+    assert thresholds.weight() == pytest.approx(5_000 / np.log(2), rel=0.05)
+
+
+def test_adaptive_thresholds_per_key_and_registry_roundtrip(fitted_model, tmp_path):
+    rng = np.random.default_rng(1)
+    thresholds = AdaptiveThresholds(target_rate=0.01, min_weight=1_000)
+
+    keys = np.where(rng.random(20_000) < 0.5, "/login", "/api")
+    keys[:50] = "/rare"
+    scores = np.where(keys == "/login", rng.uniform(0.5, 1.0, len(keys)), rng.uniform(0, 0.5, len(keys)))
+    thresholds.update(scores, keys)
+
+    cutoffs = thresholds.cutoffs(4, ["/login", "/api", "/rare", "/new"])
+    assert cutoffs[0] == pytest.approx(0.995, abs=0.01)
+    assert cutoffs[1] == pytest.approx(0.495, abs=0.01)
+    # Too few rows / unseen key: the global cutoff
+    assert cutoffs[2] == cutoffs[3] == thresholds.cutoffs(1)[0]
+
+    # Persisted with the model and restored by the warm-started service
+    trainer = BaselineTrainer()
+    trainer.fit(_features())
+    registry = ModelRegistry(tmp_path / "models")
+    version = registry.publish(
+        fitted_model, trainer.get_baseline(), list(_features().columns), thresholds=thresholds
+    )
+    assert registry.load().thresholds.cutoffs(4, ["/login", "/api", "/rare", "/new"]).tolist() == cutoffs.tolist()
+
+    thresholds.update(np.ones(5_000), np.full(5_000, "/api"))
+    registry.save_thresholds(thresholds, version)
+    assert registry.load_thresholds(version).weight("/api") == pytest.approx(thresholds.weight("/api"))
+
+    scorer = AnomalyScorer(thresholds=AdaptiveThresholds())
+    service = ScoringService.load(registry, scorer=scorer)
+    assert scorer.thresholds.weight() == pytest.approx(thresholds.weight())
+
+    X = _features(n=8, seed=5)
+    results = service.score(X, keys=["/api"] * 8)
+    np.testing.assert_allclose(results["threshold"], thresholds.cutoffs(8, ["/api"] * 8))
+    assert (results["is_anomaly"] == (results["final_score"] > results["threshold"])).all()
+    assert scorer.thresholds.weight("/api") > thresholds.weight("/api")
+
+
+def test_retraining_hooks_triggers_and_persist(tmp_path):
+    path = tmp_path / "hooks.json"
+    hooks = RetrainingHooks(max_fp_rate=0.2, drift_threshold=0.4, retrain_interval_days=7, path=path)
+    now = datetime(2025, 1, 10)
+
+    assert hooks.trigger(0.5, 0.0, now) == "fp_rate"
+    assert hooks.trigger(0.0, 0.5, now) == "drift"
+    assert hooks.trigger(0.0, 0.0, now) == "cold_start"
+
+    hooks.mark_retrained("drift", now=now)
+    restored = RetrainingHooks(path=path)
+    assert restored.last_retrain == now and restored.last_trigger == "drift"
+    assert restored.trigger(0.0, 0.0, now + timedelta(days=1)) is None
+    assert restored.trigger(0.0, 0.0, now + timedelta(days=8)) == "interval"
+
+
+def test_validate_model_on_time_ordered_holdout(fitted_model):
+    train, holdout = split_holdout(_features(n=1000, seed=4), fraction=0.2)
+    assert len(holdout) == 200 and train.index.max() < holdout.index.min()
+
+    model = train_isolation_forest(train, n_estimators=50, n_jobs=1)
+    report = validate_model(model, holdout, live_model=fitted_model)
+    assert report["passed"] and report["rows"] == 200
+
+    # Held-out traffic unlike anything trained on: most rows alert
+    spread = validate_model(model, holdout * 5.0, threshold=0.6, max_alert_rate=0.1)
+    assert not spread["passed"] and spread["reason"] == "alert_rate"
+    # ... or all isolate at the same depth
+    assert validate_model(model, holdout + 25.0)["reason"] == "degenerate_scores"
+    assert validate_model(model, holdout.iloc[:0])["reason"] == "empty_holdout"
+
+
+def test_retrain_service_refits_out_of_process_and_swaps(fitted_model, tmp_path):
+    trainer = BaselineTrainer()
+    trainer.fit(_features())
+
+    registry = ModelRegistry(tmp_path / "models")
+    hooks = RetrainingHooks(drift_threshold=-1.0, path=tmp_path / "hooks.json")
+    with RetrainService(registry, cooldown=3600.0) as retrainer:
+        service = ScoringService(
+            fitted_model,
+            trainer,
+            scorer=AnomalyScorer(thresholds=AdaptiveThresholds(min_weight=10)),
+            hooks=hooks,
+            registry=registry,
+            check_interval=0.0,
+            retrainer=retrainer,
+        )
+        service.score(_features(n=400, seed=5))
+
+        assert service.maybe_refit()
+        # Scoring carries on with the live model while the worker fits
+        service.score(_features(n=16, seed=6))
+        service.wait_for_refit()
+
+        assert not service.refitting
+        assert service.if_model is not fitted_model
+        assert retrainer.last_report["passed"]
+        # Cooldown: no second refit right away
+        assert not service.maybe_refit()
+
+    bundle = registry.load()
+    assert registry.current_version() == "v000001"
+    assert bundle.metadata["trigger"] == "drift"
+    assert bundle.thresholds is not None
+    assert RetrainingHooks(path=tmp_path / "hooks.json").last_trigger == "drift"
+
+
+def test_drift_refit_rebuilds_baseline_and_does_not_refire(fitted_model, tmp_path):
+    trainer = BaselineTrainer()
+    trainer.fit(_features())
+
+    registry = ModelRegistry(tmp_path / "models")
+    hooks = RetrainingHooks(drift_threshold=0.4)
+    with RetrainService(registry, cooldown=0.0) as retrainer:
+        service = ScoringService(
+            fitted_model, trainer, hooks=hooks, registry=registry,
+            check_interval=0.0, retrainer=retrainer,
+        )
+        # Traffic moved away from the baseline
+        service.score(_features(n=1000, seed=7) + 2.0)
+        assert hooks.trigger(0.0, service._baseline_score_sum / service._scored) == "drift"
+        assert service.maybe_refit()
+        service.wait_for_refit()
+
+        assert service.baseline_trainer is not trainer
+        assert registry.load().baseline == service.baseline_trainer.get_baseline()
+
+        # Same traffic against the rebuilt baseline: no drift, no new refit
+        service.score(_features(n=1000, seed=8) + 2.0)
+        assert not service.maybe_refit()
+        assert registry.current_version() == "v000001"
+
+
+def test_feature_grouping_keeps_baselines_and_models_apart(fitted_model, tmp_path):
+    trainer = StreamingBaselineTrainer()
+    trainer.fit(_features())
+
+    grouped = BaselineStore(tmp_path / "baseline.pkl", group_by="src_ip")
+    grouped.save_sketches(trainer.state_dict())
+    assert BaselineStore(tmp_path / "baseline.pkl").load_sketches() is None
+    assert grouped.load_sketches() is not None
+    assert grouped.endpoint_path == BaselineStore(tmp_path / "baseline.pkl").endpoint_path
+
+    registry = ModelRegistry(tmp_path / "models")
+    registry.publish(
+        fitted_model, trainer.get_baseline(), list(_features().columns), metadata={"group_by": "src_ip"},
+    )
+
+    # Global-window consumers refuse a per-IP model
+    with pytest.raises(ValueError, match="group_by"):
+        ScoringService.load(registry)
+
+    service = ScoringService.load(
+        registry, group_by="src_ip", hooks=RetrainingHooks(drift_threshold=-1.0), check_interval=0.0,
+    )
+    service.score(_features(n=64, seed=9))
+    assert service.maybe_refit()
+    service.wait_for_refit()
+    assert registry.load().metadata["group_by"] == "src_ip"
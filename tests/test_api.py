@@ -0,0 +1,107 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from api.batcher import MicroBatcher
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_micro_batcher_coalesces_and_splits_in_order():
+    calls = []
+
+    def score(frame):
+        calls.append(len(frame))
+        return frame.assign(score=frame["x"] * 2)
+
+    async def main():
+        batcher = MicroBatcher(score, max_batch_size=64, max_wait_ms=50)
+        await batcher.start()
+        requests = [pd.DataFrame({"x": np.arange(i, i + 3)}) for i in range(0, 60, 3)]
+        results = await asyncio.gather(*(batcher.submit(r) for r in requests))
+        await batcher.stop()
+        return requests, results, batcher.stats()
+
+    requests, results, stats = _run(main())
+
+    assert len(calls) < len(requests)
+    assert stats["requests"] == 20 and stats["rows"] == 60
+    for rows, result in zip(requests, results):
+        np.testing.assert_array_equal(result["score"].to_numpy(), rows["x"].to_numpy() * 2)
+
+
+def test_micro_batcher_caps_batch_size_and_propagates_errors():
+    sizes = []
+
+    def score(frame):
+        sizes.append(len(frame))
+        if (frame["x"] < 0).any():
+            raise ValueError("bad row")
+        return frame
+
+    async def main():
+        batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=20)
+        await batcher.start()
+        await asyncio.gather(*(batcher.submit(pd.DataFrame({"x": [i]})) for i in range(40)))
+        with pytest.raises(ValueError):
+            await batcher.submit(pd.DataFrame({"x": [-1]}))
+        await batcher.stop()
+
+    _run(main())
+    assert max(sizes) <= 8 and sum(sizes) == 41
+
+
+FEATURES = ["req_rate", "payload_size_mean", "error_rate_4xx", "burstiness"]
+
+
+@pytest.fixture
+def client(tmp_path):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+
+    from anomaly_detection.isolation_forest import IsolationForestModel
+    from api.main import create_app
+    from baseline.baseline_trainer import BaselineTrainer
+    from storage.models import ModelRegistry
+
+    X = pd.DataFrame(np.random.default_rng(0).normal(size=(400, 4)), columns=FEATURES)
+    model = IsolationForestModel(n_estimators=25)
+    model.fit(X)
+    trainer = BaselineTrainer()
+    trainer.fit(X)
+    ModelRegistry(tmp_path / "models").publish(model, trainer.get_baseline(), FEATURES)
+
+    app = create_app(str(tmp_path / "models"), str(tmp_path / "waf.db"), max_wait_ms=1.0)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_api_scores_feature_rows(client):
+    health = client.get("/health").json()
+    assert health == {"status": "ok", "model_version": "v000001"}
+
+    rows = [dict(zip(FEATURES, values)) for values in np.random.default_rng(1).normal(size=(5, 4)).tolist()]
+    response = client.post("/score/features", json={"rows": rows})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["model_version"] == "v000001"
+    assert len(body["results"]) == 5
+    assert all(0.0 <= r["final_score"] <= 1.0 and "explanations" in r for r in body["results"])
+
+    metrics = client.get("/metrics").json()
+    assert metrics["features"]["requests"] == 1 and metrics["features"]["rows"] == 5
+    assert client.get("/metrics/prometheus").headers["content-type"].startswith("text/plain")
+
+
+def test_api_rejects_wrong_feature_columns(client):
+    response = client.post("/score/features", json={"rows": [{"req_rate": 1.0, "unknown": 2.0}]})
+    assert response.status_code == 422
+    assert "burstiness" in response.json()["detail"]
+
+    # Not a {feature: number} mapping
+    assert client.post("/score/features", json={"rows": [{"req_rate": "fast"}]}).status_code == 422
+    assert client.post("/score/features", json={}).status_code == 422
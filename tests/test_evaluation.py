@@ -0,0 +1,86 @@
+import numpy as np
+
+from evaluation.metrics import StageProfiler, compare_reports, detection_metrics
+from evaluation.scenarios import (
+    AttackBurst,
+    TrafficScenario,
+    generate_traffic,
+    write_nginx_log_batches,
+)
+from ingestion.log_reader import NginxLogReader
+from ingestion.schema import EventBatch
+
+
+def _scenario():
+    return TrafficScenario(
+        n_events=150_000,
+        n_ips=500,
+        events_per_sec=100.0,
+        attacks=[
+            AttackBurst("scan", start=100.0, duration=10.0, rate=20.0),
+            AttackBurst("exfiltration", start=900.0, duration=10.0, rate=5.0),
+        ],
+    )
+
+
+def test_generator_is_deterministic_across_chunk_sizes():
+    small = EventBatch.concat(list(generate_traffic(_scenario(), chunk_size=65_536)))
+    large = EventBatch.concat(list(generate_traffic(_scenario(), chunk_size=1_000_000)))
+
+    assert len(small) == len(large) == 150_000 + 200 + 50
+    assert small.timestamp.equals(large.timestamp)
+    assert small.timestamp.is_monotonic_increasing
+    assert (small.src_ip == large.src_ip).all()
+    assert (small.uri_path == large.uri_path).all()
+
+
+def test_generator_labels_attack_bursts():
+    pairs = list(generate_traffic(_scenario(), chunk_size=65_536, with_labels=True))
+    batch = EventBatch.concat([b for b, _ in pairs])
+    labels = np.concatenate([l for _, l in pairs])
+
+    assert labels.sum() == 250
+    # scan burst first, then exfiltration
+    assert (batch.status_code[labels][:200] == 404).all()
+    assert batch.payload_size[labels][200:].min() > batch.payload_size[~labels].max()
+
+
+def test_generated_log_round_trips(tmp_path):
+    scenario = TrafficScenario(n_events=5_000, attacks=[AttackBurst("flood", start=10.0, duration=5.0)])
+    path = tmp_path / "access.log"
+
+    n = write_nginx_log_batches(generate_traffic(scenario), path)
+    expected = EventBatch.concat(list(generate_traffic(scenario)))
+    read = EventBatch.concat(list(NginxLogReader(path).read_batches()))
+
+    assert n == len(read) == len(expected)
+    assert (read.src_ip == expected.src_ip).all()
+    assert (read.status_code == expected.status_code).all()
+    assert np.allclose(read.response_time_ms, expected.response_time_ms, atol=0.5)
+
+
+def test_stage_profiler_report_and_compare(tmp_path):
+    profiler = StageProfiler()
+    with profiler.stage("alloc", rows=1_000_000):
+        np.ones(1_000_000)
+    with profiler.stage("count") as stage:
+        stage["rows"] = 10
+
+    report = profiler.report(n_events=10)
+    assert [s["stage"] for s in report["stages"]] == ["alloc", "count"]
+    assert report["stages"][0]["peak_alloc_mb"] >= 7.5
+    assert report["stages"][1]["rows"] == 10
+    assert report["run"]["params"] == {"n_events": 10}
+
+    path = profiler.save(tmp_path / "run.json")
+    assert path.exists()
+    rows = compare_reports(report, report)
+    assert [r["stage"] for r in rows] == ["alloc", "count"]
+    assert rows[0]["speedup"] == 1.0
+
+
+def test_detection_metrics():
+    m = detection_metrics([1, 1, 0, 0], [1, 0, 1, 0])
+    assert m["precision"] == 0.5
+    assert m["recall"] == 0.5
+    assert m["true_positives"] == 1
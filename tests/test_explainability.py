@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseline.baseline_trainer import BaselineTrainer
+from explainability.explanation_builder import ExplanationBuilder
+from explainability.feature_diff import FeatureDiff
+from explainability.templates import ExplanationTemplates
+
+
+def _features(n=600, seed=0, duplicates=False):
+    rng = np.random.default_rng(seed)
+    cols = list(ExplanationTemplates.TEMPLATES) + ["status_4xx_count"]
+    index = pd.date_range("2025-01-01", periods=n, freq="s")
+    if duplicates:
+        index = index[rng.integers(0, n // 4, size=n)]
+    return pd.DataFrame(
+        rng.standard_t(2, size=(n, len(cols))), columns=cols, index=index
+    )
+
+
+@pytest.mark.parametrize("duplicates", [False, True])
+def test_vectorized_explanations_match_rowwise(duplicates):
+    trainer = BaselineTrainer()
+    trainer.fit(_features(seed=1))
+    baseline = trainer.get_baseline()
+
+    X = _features(duplicates=duplicates)
+    diffs = FeatureDiff(baseline).diff(X)
+    builder = ExplanationBuilder(baseline)
+
+    expected = builder._build_rowwise(X, diffs)
+    assert builder.build(X, diffs) == expected
+    assert any(expected.values())
+
+    # Anomaly-only path: same lists for every flagged label
+    mask = np.random.default_rng(2).random(len(X)) < 0.1
+    subset = builder.build(X, mask=mask)
+    assert set(subset) == set(X.index[mask])
+    assert all(subset[idx] == expected[idx] for idx in subset)
@@ -0,0 +1,319 @@
+import os
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import entropy
+
+from baseline.baseline_store import BaselineStore
+from baseline.sketches import FrequencySketch
+from evaluation.scenarios import synthetic_events
+from feature_engineering.cache import FeatureCache
+from feature_engineering.encoders import EventEncoders
+from feature_engineering.aggregations import rolling_entropy, rolling_nunique
+from feature_engineering.extractor import FeatureExtractor, StreamingFeatureExtractor
+from rule_engine.rule_generator import RuleGenerator
+
+
+def _windows(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    timestamps = np.sort(rng.integers(0, 2_000, n))
+    starts = np.searchsorted(timestamps, timestamps - 60, side="right")
+    codes = rng.integers(0, 12, n)
+    return codes, starts
+
+
+def test_rolling_nunique_matches_bruteforce():
+    codes, starts = _windows()
+    expected = [len(set(codes[s : i + 1])) for i, s in enumerate(starts)]
+    np.testing.assert_array_equal(rolling_nunique(codes, starts), expected)
+
+
+def test_rolling_entropy_matches_scipy():
+    codes, starts = _windows()
+    expected = [entropy(np.bincount(codes[s : i + 1])) for i, s in enumerate(starts)]
+    np.testing.assert_allclose(rolling_entropy(codes, starts), expected, atol=1e-12)
+
+
+def test_vectorized_engine_matches_rolling_reference():
+    events = synthetic_events(1_500, n_ips=40, n_endpoints=25, events_per_sec=5)
+    # Duplicate timestamps must follow pandas' window semantics too
+    for e in events[100:110]:
+        e.timestamp = events[100].timestamp
+
+    reference = FeatureExtractor(engine="rolling").extract(events)
+    vectorized = FeatureExtractor(engine="vectorized").extract(events)
+
+    ref = reference["behavioral_features"]
+    vec = vectorized["behavioral_features"]
+
+    assert list(vec.columns) == list(ref.columns)
+    assert vec.index.equals(ref.index)
+    np.testing.assert_allclose(vec.to_numpy(), ref.to_numpy(), rtol=1e-9, atol=1e-9)
+    assert list(vectorized["ml_features"].columns) == list(reference["ml_features"].columns)
+
+
+def test_unknown_engine_rejected():
+    with pytest.raises(ValueError):
+        FeatureExtractor(engine="numba")
+
+
+def test_group_by_matches_per_entity_extraction():
+    events = synthetic_events(2_000, n_ips=5, n_endpoints=25, events_per_sec=5)
+
+    grouped = FeatureExtractor(group_by="src_ip").extract(events)
+    features = grouped["behavioral_features"].drop(columns="endpoint_rarity")
+    context = grouped["context"]
+
+    assert features.index.equals(context.index)
+
+    for ip in context["src_ip"].unique()[:3]:
+        subset = [e for e in events if e.src_ip == ip]
+        expected = FeatureExtractor().extract(subset)["behavioral_features"]
+
+        got = features[(context["src_ip"] == ip).to_numpy()]
+        np.testing.assert_allclose(
+            got.to_numpy(),
+            expected.drop(columns="endpoint_rarity").to_numpy(),
+            rtol=1e-9,
+            atol=1e-9,
+        )
+
+
+def test_group_by_keeps_ml_feature_schema():
+    events = synthetic_events(500)
+    plain = FeatureExtractor().extract(events)["ml_features"]
+    grouped = FeatureExtractor(group_by=["src_ip", "user_agent"]).extract(events)["ml_features"]
+
+    assert list(grouped.columns) == list(plain.columns)
+    assert grouped.index.equals(plain.index)
+
+
+def test_group_by_requires_vectorized_engine():
+    with pytest.raises(ValueError):
+        FeatureExtractor(engine="rolling", group_by="src_ip")
+
+
+@pytest.mark.parametrize("group_by", [None, "src_ip"])
+def test_streaming_extractor_matches_batch(group_by):
+    events = synthetic_events(1_200, n_ips=15, events_per_sec=5)
+    extractor = FeatureExtractor(group_by=group_by)
+    full = extractor.extract(events)["ml_features"]
+
+    stream = StreamingFeatureExtractor(extractor)
+    parts = []
+    for i in range(0, len(events), 97):
+        frame = pd.DataFrame([asdict(e) for e in events[i : i + 97]])
+        parts.append(stream.update(frame)["ml_features"])
+
+    incremental = pd.concat(parts)
+
+    # endpoint_rarity is a per-batch frequency, everything else is windowed
+    cols = [c for c in full.columns if c != "endpoint_rarity"]
+    np.testing.assert_allclose(
+        incremental[cols].to_numpy(), full[cols].to_numpy(), rtol=1e-9, atol=1e-9
+    )
+
+
+def test_streaming_extractor_rarity_uses_history_sketch():
+    events = synthetic_events(1_000, n_ips=10, events_per_sec=5)
+    frame = pd.DataFrame([asdict(e) for e in events])
+
+    sketch = FrequencySketch()
+    stream = StreamingFeatureExtractor(FeatureExtractor(endpoint_freq=sketch))
+    for i in range(0, len(frame), 128):
+        last = stream.update(frame.iloc[i : i + 128])
+
+    # Halo rows are not recounted: the sketch saw every event once
+    assert sketch.total == len(frame)
+
+    freq = frame["uri_path"].value_counts(normalize=True)
+    want = 1 / last["context"]["uri_path"].map(freq).to_numpy()
+    np.testing.assert_allclose(last["ml_features"]["endpoint_rarity"].to_numpy(), want)
+
+
+@pytest.mark.parametrize("group_by", [None, "src_ip"])
+def test_feature_cache_matches_uncached_extraction(group_by, tmp_path):
+    events = synthetic_events(6_000, n_ips=20, events_per_sec=1)
+    extractor = FeatureExtractor(group_by=group_by)
+    df = extractor.events_to_df(events)
+    expected = extractor.extract_frame(df.copy())["behavioral_features"]
+
+    cache = FeatureCache(tmp_path, partition="30min")
+    cached = FeatureExtractor(group_by=group_by, cache=cache)
+    for _ in range(2):
+        got = cached.extract_frame(df.copy())["behavioral_features"]
+        pd.testing.assert_frame_equal(got, expected, rtol=1e-9, check_freq=False)
+
+    # 6000 events at 1/s: 4 partitions, the open last one is never stored
+    assert (cache.misses, cache.hits, len(cache)) == (5, 3, 3)
+
+    # A changed event invalidates its own partition, and the next one
+    # only when it falls in that partition's halo
+    df.loc[df.index[2_000], "payload_size"] += 1
+    cached.extract_frame(df.copy())
+    assert (cache.misses, cache.hits) == (7, 5)
+
+    partitions = df["timestamp"].dt.floor("30min")
+    last_of_second = df.index[partitions == partitions.unique()[1]][-1]
+    df.loc[last_of_second, "payload_size"] += 1
+    got = cached.extract_frame(df.copy())["behavioral_features"]
+    assert (cache.misses, cache.hits) == (10, 6)
+    pd.testing.assert_frame_equal(
+        got, extractor.extract_frame(df.copy())["behavioral_features"], rtol=1e-9, check_freq=False
+    )
+
+
+def test_feature_cache_versioning_and_lru(tmp_path):
+    frame = pd.DataFrame(
+        {"req_rate": np.arange(100.0)},
+        index=pd.date_range("2025-01-01", periods=100, freq="s", name="timestamp"),
+    )
+    cache = FeatureCache(tmp_path, version="v1")
+    cache.save("a", frame)
+    pd.testing.assert_frame_equal(cache.load("a"), frame, check_freq=False)
+
+    entry = cache.size_bytes()
+    cache.max_bytes = 2 * entry
+    cache.save("b", frame)
+    os.utime(tmp_path / "v1" / "a.npz", ns=(1, 1))
+    os.utime(tmp_path / "v1" / "b.npz", ns=(2, 2))
+    cache.load("a")  # a is now more recent than b
+    cache.save("c", frame)
+    assert cache.load("b") is None
+    assert cache.load("a") is not None and cache.load("c") is not None
+
+    # A new feature code version drops every older entry
+    assert len(FeatureCache(tmp_path, version="v2")) == 0
+    assert not (tmp_path / "v1").exists()
+
+
+def test_encoders_keep_codes_stable_across_batches_and_runs(tmp_path):
+    encoders = EventEncoders()
+    first = encoders.encode(pd.DataFrame({"uri_path": ["/a", "/b", None], "status_code": [200, 404, 500]}))
+    assert first["uri_path"].cat.codes.tolist() == [0, 1, -1]
+    assert first["status_code"].dtype == np.int16
+
+    # New values are appended: old codes keep their meaning
+    second = encoders.encode(pd.DataFrame({"uri_path": ["/c", "/a"]}))
+    assert second["uri_path"].cat.codes.tolist() == [2, 0]
+
+    # Stale categoricals are brought to the current categories, so
+    # frames from different batches concatenate as categoricals
+    merged = pd.concat([encoders.categorize(first), second])
+    assert isinstance(merged["uri_path"].dtype, pd.CategoricalDtype)
+    assert merged["uri_path"].tolist()[3:] == ["/c", "/a"]
+
+    store = BaselineStore(tmp_path / "baseline.pkl")
+    store.save_encoders(encoders.state_dict())
+    restored = EventEncoders.from_state(store.load_encoders())
+    assert restored["uri_path"].encode(["/a", "/c", "/d"]).tolist() == [0, 2, 3]
+    assert restored["uri_path"].decode(np.array([1, -1])).tolist() == ["/b", None]
+
+
+def test_encoded_rarity_is_per_batch_and_dictionaries_evict():
+    events = pd.DataFrame([asdict(e) for e in synthetic_events(600, n_ips=10, events_per_sec=5)])
+
+    class CountingSketch(FrequencySketch):
+        def frequency(self, keys):
+            self.queried = len(keys)
+            return super().frequency(keys)
+
+    # A dictionary that has seen many more endpoints than this batch holds
+    encoders = EventEncoders()
+    encoders["uri_path"].encode([f"/old/{i}" for i in range(50_000)])
+    sketch = CountingSketch()
+    sketch.update(events["uri_path"].to_numpy(dtype=object))
+
+    encoded = FeatureExtractor(endpoint_freq=sketch, encoders=encoders).extract_frame(events)
+    assert sketch.queried == events["uri_path"].nunique()
+    plain = FeatureExtractor(endpoint_freq=sketch).extract_frame(events)
+    np.testing.assert_allclose(
+        encoded["ml_features"]["endpoint_rarity"].to_numpy(),
+        plain["ml_features"]["endpoint_rarity"].to_numpy(),
+    )
+
+    decoder = encoders["uri_path"]
+    decoder.decode(np.array([0]))
+    cached = decoder._decoded
+    decoder.decode(np.array([1, -1]))
+    assert decoder._decoded is cached
+
+    # A URI scan past the cap evicts the least recently seen values;
+    # everything kept still decodes to itself
+    capped = EventEncoders(max_sizes={"uri_path": 100})
+    capped["uri_path"].encode([f"/scan/{i}" for i in range(10_000)])
+    capped["uri_path"].encode(["/scan/1"])
+    remap = capped["uri_path"].evict(keep=np.array([capped["uri_path"].codes["/scan/2"], -1]))
+    kept = capped["uri_path"].values
+    assert len(kept) == 76 and len(remap) == 10_000
+    assert {"/scan/1", "/scan/2", "/scan/9999"} <= set(kept) and "/scan/5000" not in kept
+    assert capped["uri_path"].decode(remap[[1, 2, 9999]]).tolist() == ["/scan/1", "/scan/2", "/scan/9999"]
+    assert capped["uri_path"].evict() is None
+
+    # Restarts past the cap get the exact values back
+    restored = EventEncoders.from_state(capped.state_dict(), max_sizes={"uri_path": 100})
+    assert restored["uri_path"].values == kept
+    assert restored["uri_path"].encode(["/scan/9999", "/scan/5000"]).tolist() == [75, 76]
+
+
+@pytest.mark.parametrize("group_by", [None, "src_ip"])
+def test_encoded_extraction_matches_plain(group_by):
+    events = synthetic_events(1_500, n_ips=20, events_per_sec=5)
+    plain = FeatureExtractor(group_by=group_by).extract(events)
+
+    extractor = FeatureExtractor(group_by=group_by, encoders=EventEncoders())
+    encoded = extractor.extract(events)
+    assert isinstance(encoded["context"]["src_ip"].dtype, pd.CategoricalDtype)
+    assert encoded["context"]["response_time_ms"].dtype == np.float32
+
+    # Only avg_response_time sees the float32 rounding of response times
+    np.testing.assert_allclose(
+        encoded["ml_features"].to_numpy(), plain["ml_features"].to_numpy(), rtol=1e-6, atol=1e-6
+    )
+
+    # Streaming: the halo is kept as codes across batches
+    stream = StreamingFeatureExtractor(FeatureExtractor(group_by=group_by, encoders=EventEncoders()))
+    frame = pd.DataFrame([asdict(e) for e in events])
+    parts = [stream.update(frame.iloc[i : i + 128])["ml_features"] for i in range(0, len(frame), 128)]
+    assert stream.halo["uri_path"].dtype == np.int32
+
+    cols = [c for c in plain["ml_features"].columns if c != "endpoint_rarity"]
+    np.testing.assert_allclose(
+        pd.concat(parts)[cols].to_numpy(), plain["ml_features"][cols].to_numpy(), rtol=1e-6, atol=1e-6
+    )
+
+
+def test_streaming_past_the_dictionary_cap_keeps_real_values():
+    events = synthetic_events(3_000, n_ips=200, events_per_sec=0.5)
+    frame = pd.DataFrame([asdict(e) for e in events])
+    plain = FeatureExtractor().extract(events)
+
+    encoders = EventEncoders(max_sizes={"src_ip": 40})
+    stream = StreamingFeatureExtractor(FeatureExtractor(encoders=encoders))
+    parts = [stream.update(frame.iloc[i : i + 100]) for i in range(0, len(frame), 100)]
+    context = pd.concat([p["context"] for p in parts])
+    assert len(encoders["src_ip"]) <= 40
+
+    # Evicted IPs are re-added when they come back: context values and
+    # features are those of an uncapped run
+    assert context["src_ip"].astype(str).tolist() == frame["src_ip"].tolist()
+    cols = [c for c in plain["ml_features"].columns if c != "endpoint_rarity"]
+    np.testing.assert_allclose(
+        pd.concat([p["ml_features"] for p in parts])[cols].to_numpy(),
+        plain["ml_features"][cols].to_numpy(),
+        rtol=1e-6, atol=1e-6,
+    )
+
+    results = pd.DataFrame(
+        {
+            "final_score": 0.9,
+            "is_anomaly": True,
+            "explanations": [["Request rate is 120.0/min, exceeding baseline (p99=40.0)"]] * len(context),
+        },
+        index=context.index,
+    )
+    rules = RuleGenerator("rule_engine/rule_templates.yaml", min_occurrences=3).generate(context, results)
+    assert rules
+    assert {rule["match"]["src_ip"] for rule in rules} <= set(frame["src_ip"])
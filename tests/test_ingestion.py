@@ -0,0 +1,260 @@
+import asyncio
+from dataclasses import asdict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from evaluation.scenarios import synthetic_events, write_nginx_log
+from feature_engineering.extractor import FeatureExtractor
+from ingestion.api_receiver import IngestQueue, PushReceiver, parse_push_lines
+from ingestion.log_reader import NginxLogReader, ReaderCheckpoint
+from ingestion.schema import EventBatch
+
+
+def test_read_batches_matches_read(tmp_path):
+    log_path = tmp_path / "access.log"
+    write_nginx_log(synthetic_events(250), log_path)
+
+    reader = NginxLogReader(log_path)
+    events = list(reader.read())
+    batches = list(reader.read_batches(batch_size=64))
+
+    assert [len(b) for b in batches] == [64, 64, 64, 58]
+
+    frame = pd.concat([b.to_frame() for b in batches], ignore_index=True)
+    expected = pd.DataFrame([asdict(e) for e in events])
+
+    for col in expected.columns:
+        if col == "timestamp":
+            assert (pd.to_datetime(expected[col]) == frame[col]).all()
+        else:
+            assert (expected[col] == frame[col]).all(), col
+
+
+def test_read_batches_skips_blank_lines(tmp_path):
+    log_path = tmp_path / "access.log"
+    write_nginx_log(synthetic_events(10), log_path)
+    with open(log_path, "a") as f:
+        f.write("\n\n")
+
+    batches = list(NginxLogReader(log_path).read_batches(batch_size=4))
+    assert sum(len(b) for b in batches) == 10
+
+
+def test_extract_batches_matches_extract(tmp_path):
+    log_path = tmp_path / "access.log"
+    write_nginx_log(synthetic_events(400), log_path)
+
+    reader = NginxLogReader(log_path)
+    extractor = FeatureExtractor()
+
+    from_events = extractor.extract(list(reader.read()))["ml_features"]
+    from_batches = extractor.extract_batches(reader.read_batches(batch_size=50))["ml_features"]
+
+    assert from_batches.index.equals(from_events.index)
+    np.testing.assert_allclose(from_batches.to_numpy(), from_events.to_numpy())
+
+
+def _append(path, events):
+    with open(path, "a") as f:
+        tmp = path.with_name("chunk.log")
+        write_nginx_log(events, tmp)
+        f.write(tmp.read_text())
+
+
+def _follow(reader, checkpoint):
+    batches = reader.follow(checkpoint, poll_interval=0.01, idle_timeout=0.05)
+    return sum(len(b) for b in batches)
+
+
+def test_follow_resumes_from_checkpoint(tmp_path):
+    log_path = tmp_path / "access.log"
+    events = synthetic_events(120)
+    write_nginx_log(events[:100], log_path)
+
+    reader = NginxLogReader(log_path, batch_size=32)
+    checkpoint = ReaderCheckpoint(tmp_path / "checkpoint.json")
+
+    assert _follow(reader, checkpoint) == 100
+    assert _follow(reader, checkpoint) == 0
+
+    _append(log_path, events[100:])
+    assert _follow(reader, checkpoint) == 20
+    assert checkpoint.load()["offset"] == log_path.stat().st_size
+
+
+def test_follow_holds_back_partial_line(tmp_path):
+    log_path = tmp_path / "access.log"
+    write_nginx_log(synthetic_events(5), log_path)
+    full = log_path.read_bytes()
+    log_path.write_bytes(full[:-10])
+
+    reader = NginxLogReader(log_path)
+    checkpoint = ReaderCheckpoint(tmp_path / "checkpoint.json")
+    assert _follow(reader, checkpoint) == 4
+
+    log_path.write_bytes(full)
+    assert _follow(reader, checkpoint) == 1
+
+
+def test_follow_handles_rename_rotation(tmp_path):
+    log_path = tmp_path / "access.log"
+    events = synthetic_events(60)
+    write_nginx_log(events[:20], log_path)
+
+    reader = NginxLogReader(log_path)
+    checkpoint = ReaderCheckpoint(tmp_path / "checkpoint.json")
+    assert _follow(reader, checkpoint) == 20
+
+    # Lines land in the old file, then logrotate renames it while we are down
+    _append(log_path, events[20:30])
+    log_path.rename(tmp_path / "access.log.1")
+    write_nginx_log(events[30:], log_path)
+
+    assert _follow(reader, checkpoint) == 40
+
+
+def test_follow_checkpoints_while_draining_rotated_file(tmp_path):
+    log_path = tmp_path / "access.log"
+    events = synthetic_events(100)
+    write_nginx_log(events[:10], log_path)
+
+    reader = NginxLogReader(log_path, batch_size=8)
+    checkpoint = ReaderCheckpoint(tmp_path / "checkpoint.json")
+    assert _follow(reader, checkpoint) == 10
+
+    _append(log_path, events[10:50])
+    log_path.rename(tmp_path / "access.log.1")
+    write_nginx_log(events[50:], log_path)
+
+    # Crash after two batches of the rotated file's tail were consumed
+    batches = reader.follow(checkpoint, poll_interval=0.01, idle_timeout=0.05)
+    consumed = sum(len(next(batches)) for _ in range(3))  # the third save is pending
+    batches.close()
+    assert consumed == 24
+
+    # Resumes inside the rotated file: nothing replayed beyond one batch, nothing lost
+    assert _follow(reader, checkpoint) == 90 - 16
+
+
+def test_follow_handles_copytruncate(tmp_path):
+    log_path = tmp_path / "access.log"
+    events = synthetic_events(30)
+    write_nginx_log(events[:20], log_path)
+
+    reader = NginxLogReader(log_path)
+    checkpoint = ReaderCheckpoint(tmp_path / "checkpoint.json")
+    assert _follow(reader, checkpoint) == 20
+
+    write_nginx_log(events[20:], log_path)  # truncated in place
+    assert _follow(reader, checkpoint) == 10
+
+
+def _pushed_lines(n, tmp_path):
+    log_path = tmp_path / "push.log"
+    write_nginx_log(synthetic_events(n), log_path)
+    return log_path.read_bytes().splitlines()
+
+
+def test_push_lines_reject_invalid_rows(tmp_path):
+    lines = _pushed_lines(20, tmp_path)
+    lines[3] = b"{not json"
+    lines[7] = lines[7].replace(b'"status_code"', b'"status"')
+
+    batch, rejected = parse_push_lines(lines)
+
+    assert rejected == 2 and len(batch) == 18
+    expected = NginxLogReader.parse_lines(lines[:3] + lines[4:7] + lines[8:])
+    assert (batch.to_frame() == expected.to_frame()).all().all()
+
+
+@pytest.mark.parametrize("policy", ["drop_newest", "drop_oldest"])
+def test_ingest_queue_drop_policies(tmp_path, policy):
+    batch = NginxLogReader.parse_lines(_pushed_lines(100, tmp_path))
+
+    async def main():
+        queue = IngestQueue(max_events=60, policy=policy)
+        await queue.put(batch.slice(0, 40))
+        await queue.put(batch.slice(40))
+        out = await queue.get_batch(max_events=1000, linger=0)
+        return queue.stats(), out
+
+    stats, out = asyncio.run(main())
+
+    assert stats["dropped"] == 40 and stats["depth"] == 0 and len(out) == 60
+    kept = batch.slice(0, 60) if policy == "drop_newest" else batch.slice(40)
+    assert (out.timestamp == kept.timestamp).all()
+
+
+def test_push_receiver_socket_with_backpressure(tmp_path):
+    lines = _pushed_lines(500, tmp_path)
+
+    async def main():
+        queue = IngestQueue(max_events=100, policy="block")
+        receiver = PushReceiver(queue, block_lines=50, read_size=1024)
+        await receiver.start(port=0)
+        port = receiver.sockets[0].getsockname()[1]
+
+        async def send():
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"\n".join(lines) + b"\n")
+            await writer.drain()
+            writer.close()
+
+        async def consume():
+            got, max_depth = [], 0
+            while sum(len(b) for b in got) < len(lines):
+                max_depth = max(max_depth, queue.depth)
+                got.append(await queue.get_batch(max_events=64, linger=0.01))
+            return got, max_depth
+
+        _, (got, max_depth) = await asyncio.gather(send(), consume())
+        await receiver.stop()
+        return queue.stats(), got, max_depth
+
+    stats, got, max_depth = asyncio.run(main())
+
+    assert stats["accepted"] == stats["consumed"] == 500 and stats["dropped"] == 0
+    assert max_depth <= 100
+    expected = NginxLogReader.parse_lines(lines)
+    assert (EventBatch.concat(got).timestamp == expected.timestamp).all()
+
+
+def test_push_receiver_flushes_slow_senders_and_survives_failed_blocks(tmp_path):
+    lines = _pushed_lines(30, tmp_path)
+
+    async def main():
+        queue = IngestQueue(max_events=1_000)
+        receiver = PushReceiver(queue, block_lines=4096, linger=0.05)
+        ingest, calls = receiver.ingest, []
+
+        async def failing_once(block, timeout=None):
+            calls.append(len(block))
+            if len(calls) == 1:
+                raise RuntimeError("feature stage is gone")
+            return await ingest(block, timeout)
+
+        receiver.ingest = failing_once
+        await receiver.start(port=0)
+        port = receiver.sockets[0].getsockname()[1]
+        _, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        # Far below block_lines, connection kept open: flushed after linger
+        writer.write(b"\n".join(lines[:10]) + b"\n")
+        await writer.drain()
+        await asyncio.sleep(0.3)
+        writer.write(b"\n".join(lines[10:]) + b"\n")
+        await writer.drain()
+        batch = await queue.get_batch(max_events=100, linger=0, timeout=2.0)
+
+        writer.close()
+        await receiver.stop()
+        return queue.stats(), batch, calls
+
+    stats, batch, calls = asyncio.run(main())
+
+    # The first block failed: dropped and counted, the connection went on
+    assert calls == [10, 20]
+    assert stats["dropped"] == 10 and stats["accepted"] == 20
+    assert (batch.timestamp == NginxLogReader.parse_lines(lines[10:]).timestamp).all()
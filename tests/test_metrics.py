@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detection.scorer import AnomalyScorer
+from storage.metrics_store import MetricsStore
+from utils.metrics import METRICS, MetricsRegistry, histogram_quantile
+
+
+def test_registry_metrics_and_prometheus_text():
+    registry = MetricsRegistry()
+    registry.counter("events_total", "Events", ("stage",)).labels("read").inc(5)
+    registry.gauge("depth", "Queue depth").set_function(lambda: 7)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value)
+
+    text = registry.to_prometheus()
+    assert "# TYPE events_total counter" in text
+    assert 'events_total{stage="read"} 5' in text
+    assert "depth 7" in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    assert "latency_seconds_sum 4.05" in text
+
+    with pytest.raises(ValueError):
+        registry.gauge("events_total", "wrong type")
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    counter = registry.counter("n_total", "n")
+    histogram = registry.histogram("h", "h")
+    counter.inc(3)
+    histogram.observe(1.0)
+
+    samples = {name: value for name, _, value in registry.snapshot()}
+    assert samples["n_total"] == 0
+    assert samples["h_count"] == 0
+
+
+def test_histogram_quantile():
+    buckets = [(1.0, 50), (2.0, 100), (float("inf"), 100)]
+    assert histogram_quantile(0.5, buckets) == 1.0
+    assert histogram_quantile(0.75, buckets) == 1.5
+    assert histogram_quantile(0.5, [(1.0, 0), (float("inf"), 0)]) is None
+
+
+def test_instrumented_stages_persist_to_metrics_store(tmp_path):
+    n = 1000
+    scores = pd.Series(np.linspace(0, 1, n))
+    calls_before = {
+        name: value for name, labels, value in METRICS.snapshot() if labels.get("stage") == "scorer"
+    }
+
+    AnomalyScorer().score(scores, scores)
+    AnomalyScorer().score(scores, scores)
+
+    store = MetricsStore(tmp_path / "waf.db")
+    assert store.record(source="test", ts="2025-01-01 00:00") > 0
+    store.record(source="test", ts="2025-01-01 00:01")
+
+    summary = store.stage_summary("test").set_index("stage")
+    assert summary.loc["scorer", "calls"] == calls_before.get("waf_stage_seconds_count", 0) + 2
+    assert summary.loc["scorer", "rows"] == calls_before.get("waf_stage_rows_total", 0) + 2 * n
+    assert summary.loc["scorer", "p95_seconds"] > 0
+
+    series = store.series("waf_stage_rows_total", {"stage": "scorer"}, source="test")
+    assert len(series) == 2
+    assert store.sources() == ["test"]
+    assert store.prune("2025-01-01 00:01") > 0
+    assert len(store.series("waf_stage_rows_total", {"stage": "scorer"})) == 1
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.scorer import AnomalyScorer
+from anomaly_detection.thresholds import AdaptiveThresholds
+from baseline.baseline_trainer import BaselineTrainer
+from baseline.sketches import FrequencySketch
+from evaluation.scenarios import synthetic_events
+from feature_engineering.extractor import FeatureExtractor
+from pipeline.sharded import ShardedPipeline
+from storage.models import ModelRegistry
+
+
+@pytest.fixture(scope="module")
+def events():
+    extractor = FeatureExtractor(group_by="src_ip")
+    df = extractor.events_to_df(synthetic_events(8_000, n_ips=200))
+    # A few missing IPs / URIs must shard and window like missing strings
+    df.loc[df.index[::97], "src_ip"] = None
+    df.loc[df.index[::89], "uri_path"] = None
+    return df.sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+
+def test_sharded_pipeline_matches_single_process(events, tmp_path):
+    expected = FeatureExtractor(group_by="src_ip").extract_frame(events.copy())["ml_features"]
+
+    if_model = IsolationForestModel(n_estimators=50)
+    if_model.fit(expected)
+    baseline_trainer = BaselineTrainer()
+    baseline_trainer.fit(expected)
+
+    registry = ModelRegistry(tmp_path / "models")
+    registry.publish(if_model, baseline_trainer.get_baseline(), list(expected.columns))
+
+    expected_results = AnomalyScorer().score(
+        if_model.score(expected), baseline_trainer.score_deviation(expected)
+    )
+
+    with ShardedPipeline(n_workers=2, shards_per_worker=3) as pipeline:
+        output = pipeline.extract(events)
+        scored = pipeline.score(output["ml_features"], registry)
+        one_pass = pipeline.extract_and_score(events, registry)
+
+    np.testing.assert_array_equal(output["ml_features"].to_numpy(), expected.to_numpy())
+    assert (output["ml_features"].index == expected.index).all()
+    assert (output["context"]["src_ip"].fillna("") == events["src_ip"].fillna("").to_numpy()).all()
+
+    for results in (scored, one_pass["results"]):
+        np.testing.assert_allclose(
+            results["final_score"].to_numpy(), expected_results["final_score"].to_numpy()
+        )
+        assert (results["is_anomaly"].to_numpy() == expected_results["is_anomaly"].to_numpy()).all()
+
+    # Adaptive cutoffs are applied in the parent, in row order
+    keys = events["uri_path"].to_numpy()
+    scorer = AnomalyScorer(thresholds=AdaptiveThresholds(min_weight=100))
+    for _ in range(2):
+        expected_results = scorer.score(
+            if_model.score(expected), baseline_trainer.score_deviation(expected), keys=keys
+        )
+
+    scorer = AnomalyScorer(thresholds=AdaptiveThresholds(min_weight=100))
+    with ShardedPipeline(n_workers=2, shards_per_worker=3, scorer=scorer) as pipeline:
+        for _ in range(2):
+            scored = pipeline.score(output["ml_features"], registry, keys=keys)
+
+    np.testing.assert_allclose(scored["threshold"].to_numpy(), expected_results["threshold"].to_numpy())
+    assert (scored["is_anomaly"].to_numpy() == expected_results["is_anomaly"].to_numpy()).all()
+    assert scored["threshold"].nunique() > 1
+
+
+def test_sharded_pipeline_uses_endpoint_sketch(events):
+    sketch = FrequencySketch(half_life=10_000)
+    sketch.update(events["uri_path"].iloc[:3_000])
+    sketch.update(events["uri_path"])
+
+    expected = FeatureExtractor(group_by="src_ip", endpoint_freq=sketch).extract_frame(events.copy())["ml_features"]
+    with ShardedPipeline(n_workers=2, shards_per_worker=2, endpoint_freq=sketch) as pipeline:
+        output = pipeline.extract(events)
+
+    np.testing.assert_allclose(output["ml_features"].to_numpy(), expected.to_numpy(), rtol=1e-12)
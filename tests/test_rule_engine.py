@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+import pytest
+
+from rule_engine.enforcer import RuleEngine, parse_limit
+from rule_engine.rule_generator import RuleGenerator
+
+TEMPLATES = "rule_engine/rule_templates.yaml"
+
+REASONS = [
+    "Request rate is 120.0/min, exceeding baseline (p99=40.0)",
+    "Traffic burst behavior detected",
+    "Rare endpoint accessed",
+    "High-entropy payload detected (entropy=5.10)",
+    "Non-human timing pattern detected",
+    "High rate of client errors (4xx responses)",
+]
+
+
+def _traffic(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2025-01-01", periods=n, freq="s")
+    context = pd.DataFrame(
+        {
+            "src_ip": rng.choice([f"10.0.0.{i}" for i in range(15)], size=n),
+            "uri_path": rng.choice(["/login", "/api/items", "/admin", "/health"], size=n),
+        },
+        index=index,
+    )
+    results = pd.DataFrame(
+        {
+            "final_score": rng.uniform(0.5, 1.0, size=n),
+            "is_anomaly": rng.random(n) < 0.4,
+            "explanations": [
+                list(rng.choice(REASONS, size=rng.integers(0, 4), replace=False))
+                for _ in range(n)
+            ],
+        },
+        index=index,
+    )
+    return context, results
+
+
+def _comparable(rules):
+    return [{k: v for k, v in r.items() if k != "created_at"} for r in rules]
+
+
+def test_columnar_rules_match_rowwise():
+    context, results = _traffic()
+    gen = RuleGenerator(TEMPLATES, min_occurrences=3, min_avg_score=0.76)
+
+    expected = gen._generate_rowwise(context, results)
+    assert expected
+    assert _comparable(gen.generate(context, results)) == _comparable(expected)
+
+
+def test_columnar_rules_handle_duplicate_timestamps():
+    context, results = _traffic()
+    gen = RuleGenerator(TEMPLATES, min_occurrences=3, min_avg_score=0.76)
+    expected = gen.generate(context, results)
+
+    # Joined by position, so repeated timestamps do not change anything
+    index = pd.DatetimeIndex(np.repeat(context.index[::3], 3)[: len(context)])
+    got = gen.generate(context.set_axis(index), results.set_axis(index))
+    assert _comparable(got) == _comparable(expected)
+
+    # Same rows, results re-indexed (e.g. reset_index): still positional
+    got = gen.generate(context.set_axis(index), results.reset_index(drop=True))
+    assert _comparable(got) == _comparable(expected)
+
+    with pytest.raises(ValueError, match="cannot align"):
+        gen.generate(context.set_axis(index), results.iloc[:-1])
+
+
+def _rule(action, src_ip=None, endpoint=None, limit=None, status="approved", confidence=0.9):
+    action = {"type": action, **({"limit": limit} if limit else {})}
+    return {
+        "rule_type": action["type"],
+        "match": {"src_ip": src_ip, "endpoint": endpoint},
+        "action": action,
+        "confidence": confidence,
+        "status": status,
+    }
+
+
+def test_parse_limit():
+    assert parse_limit("10/min") == (10.0, 60.0)
+    assert parse_limit("100/5min") == (100.0, 300.0)
+    assert parse_limit("2/second") == (2.0, 1.0)
+    with pytest.raises(ValueError):
+        parse_limit("ten per minute")
+
+
+def test_rule_engine_indexes_and_priority():
+    engine = RuleEngine([
+        _rule("block_ip", src_ip="10.1.0.0/16"),
+        _rule("endpoint_protection", endpoint="/admin"),
+        _rule("rate_limit", src_ip="10.0.0.1", endpoint="/login", limit="2/min"),
+        _rule("block_ip", src_ip="10.0.0.9", status="proposed"),
+    ])
+
+    assert engine.decide("10.1.200.3", "/anything", 0.0) == ("block", "block_ip:10.1.0.0/16:*")
+    assert engine.decide("10.2.0.1", "/admin", 0.0)[0] == "challenge"
+    assert engine.decide("10.0.0.9", "/", 0.0)[0] == "allow"  # proposed: not enforced
+    assert engine.decide(None, "/admin", 0.0)[0] == "challenge"
+
+    # 2/min burst, then one token every 30s
+    assert [engine.decide("10.0.0.1", "/login", t)[0] for t in (0, 1, 2, 31)] == [
+        "allow", "allow", "rate_limit", "allow",
+    ]
+
+    shadow = RuleEngine([_rule("block_ip", src_ip="10.0.0.9", status="proposed")], statuses=None)
+    assert shadow.decide("10.0.0.9", "/", 0.0)[0] == "block"
+
+
+def test_rule_engine_replay_matches_per_event_decisions():
+    rng = np.random.default_rng(1)
+    n = 5000
+    ips = np.array([f"10.0.{i // 256}.{i % 256}" for i in range(300)], dtype=object)
+    events = pd.DataFrame(
+        {
+            "src_ip": rng.choice(ips, n),
+            "uri_path": rng.choice(["/login", "/api", "/admin"], n),
+        },
+        index=pd.Timestamp("2025-01-01") + pd.to_timedelta(np.sort(rng.uniform(0, 600, n)), unit="s"),
+    )
+    rules = [
+        _rule("rate_limit", endpoint="/login", limit="3/min", confidence=0.95),
+        _rule("rate_limit", src_ip="10.0.0.7", limit="5/min"),
+        _rule("block_ip", src_ip="10.0.1.0/28"),
+        _rule("endpoint_protection", endpoint="/admin"),
+    ]
+
+    batch = RuleEngine(rules)
+    # Two replays: bucket state must carry over between blocks
+    decided = pd.concat([batch.replay(events.iloc[:2000]), batch.replay(events.iloc[2000:])])
+
+    single = RuleEngine(rules)
+    ts = events.index.as_unit("ns").asi8 / 1e9
+    expected = [single.decide(ip, ep, t) for ip, ep, t in zip(events["src_ip"], events["uri_path"], ts)]
+
+    assert list(decided["decision"]) == [d for d, _ in expected]
+    assert [r if isinstance(r, str) else None for r in decided["rule_id"]] == [r for _, r in expected]
+    assert batch.fired == single.fired and batch.matched == single.matched
+    assert set(decided["decision"]) == {"allow", "rate_limit", "block", "challenge"}
+
+    report = batch.report().set_index("rule_id")
+    assert report.loc["rate_limit:*:/login", "fired"] > 0
@@ -0,0 +1,265 @@
+import numpy as np
+import pandas as pd
+
+from evaluation.scenarios import synthetic_events
+from feature_engineering.encoders import MAX_DICTIONARY_SIZES
+from feature_engineering.extractor import FeatureExtractor, StreamingFeatureExtractor
+from storage.archive import EventArchive
+from storage.database import ResultsStore
+from storage.rule_repository import RuleRepository
+
+
+def _run(n=600, start="2025-01-01", seed=0):
+    rng = np.random.default_rng(seed)
+    events = FeatureExtractor().events_to_df(
+        synthetic_events(n, n_ips=2, n_endpoints=5, events_per_sec=0.1, seed=seed)
+    )
+    # Coarse timestamps repeat, as with nginx' one-second resolution
+    events["timestamp"] = (
+        events["timestamp"] - pd.Timestamp("2025-01-01") + pd.Timestamp(start)
+    ).dt.floor("10s")
+    output = FeatureExtractor().extract_frame(events)
+    context = output["context"]
+    index = context.index
+    score = rng.random(n)
+    results = pd.DataFrame(
+        {
+            "if_score": score,
+            "baseline_score": score,
+            "final_score": score,
+            "is_anomaly": score > 0.9,
+            "explanations": [["Rare endpoint accessed"] if s > 0.9 else [] for s in score],
+        },
+        index=index,
+    )
+    features = output["ml_features"][["req_rate", "burstiness"]]
+    return context, results, features
+
+
+def test_results_store_pushes_filters_down(tmp_path):
+    store = ResultsStore(tmp_path / "waf.db")
+    context, results, features = _run()
+    rules = [{"rule_type": "block_ip", "match": {"endpoint": "/login", "src_ip": "10.0.0.1"},
+              "confidence": 0.91, "status": "proposed", "created_at": pd.Timestamp("2025-01-01")}]
+    baseline = {"req_rate": {"mean": 0.5, "std": 0.3, "p95": 0.9, "p99": 0.99}}
+
+    store.append_run(results, context, features, rules=rules, baseline=baseline)
+
+    start = pd.Timestamp("2025-01-01 01:00")
+    expected = results[results["is_anomaly"] & (results.index >= start)]
+    assert store.count_anomalies(start=start) == len(expected)
+
+    top = store.anomalies(start=start, min_score=0.95, limit=5)
+    assert len(top) <= 5
+    assert (top["final_score"] >= 0.95).all()
+    assert top.index.is_monotonic_decreasing and (top.index >= start).all()
+    assert top["explanations"].map(len).eq(1).all()
+    assert top["status"].notna().all() and top["uri_path"].str.startswith("/api").all()
+
+    series = store.feature_series("req_rate", limit=100)
+    np.testing.assert_allclose(series.to_numpy(), features["req_rate"].to_numpy()[-100:])
+
+    assert store.latest_baseline() == baseline
+    assert store.rules()[0]["match"]["src_ip"] == "10.0.0.1"
+
+
+def test_results_store_appends_and_prunes_partitions(tmp_path):
+    store = ResultsStore(tmp_path / "waf.db")
+    for day, seed in (("2025-01-01", 0), ("2025-01-02", 1)):
+        context, results, features = _run(start=day, seed=seed)
+        store.append_run(results, context, features)
+
+    lo, hi = store.time_range()
+    assert lo.floor("D") == pd.Timestamp("2025-01-01") and hi.day == 2
+
+    removed = store.prune(before="2025-01-02")
+    assert removed == 600
+    assert store.time_range()[0].floor("D") == pd.Timestamp("2025-01-02")
+
+
+def test_results_store_replace_is_idempotent(tmp_path):
+    store = ResultsStore(tmp_path / "waf.db")
+    context, results, features = _run()
+
+    # The batch pipeline rescores the whole log on every run
+    for _ in range(2):
+        store.append_run(results, context, features, replace=True)
+
+    assert store.count_anomalies() == int(results["is_anomaly"].sum())
+    assert len(store.feature_series("req_rate", limit=10_000)) == len(features)
+
+    # A later run only replaces the range it covers
+    later_context, later_results, later_features = _run(start="2025-01-02", seed=1)
+    store.append_run(later_results, later_context, later_features, replace=True)
+    assert store.count_anomalies() == int(results["is_anomaly"].sum() + later_results["is_anomaly"].sum())
+
+
+def _rule(ip, confidence=0.9, endpoint="/login", evidence=(("high rate", 3),)):
+    return {
+        "rule_type": "rate_limit",
+        "match": {"endpoint": endpoint, "src_ip": ip},
+        "action": {"type": "rate_limit", "limit": "10/min"},
+        "confidence": confidence,
+        "created_at": pd.Timestamp("2024-01-01").to_pydatetime(),
+        "status": "proposed",
+        "evidence": [list(e) for e in evidence],
+    }
+
+
+def test_rule_repository_dedups_and_merges_evidence(tmp_path):
+    repo = RuleRepository(tmp_path / "waf.db")
+    day0 = pd.Timestamp("2024-01-01")
+
+    assert repo.upsert([_rule("1.1.1.1"), _rule("1.1.1.1", 0.8), _rule("2.2.2.2")], now=day0) == {
+        "inserted": 2, "merged": 0,
+    }
+    repo.set_status(["rate_limit:1.1.1.1:/login"], "approved")
+
+    # Detected again three days later with weaker confidence: the decayed
+    # confidence (0.9 * e^-0.3 = 0.667) still wins, evidence is merged
+    repo.upsert([_rule("1.1.1.1", 0.6, evidence=[("high rate", 2), ("new path", 1)])], now=day0 + pd.Timedelta(days=3))
+
+    rule = repo.get("rate_limit:1.1.1.1:/login")
+    assert repo.count() == 2
+    assert rule["status"] == "approved"
+    assert rule["detections"] == 3
+    assert rule["confidence"] == round(0.9 * np.exp(-0.3), 4)
+    assert rule["evidence"] == [["high rate", 8], ["new path", 1]]
+    assert rule["last_seen"] == day0 + pd.Timedelta(days=3)
+
+
+def test_rule_repository_sweep_touches_only_due_rules(tmp_path):
+    repo = RuleRepository(tmp_path / "waf.db")
+    day0 = pd.Timestamp("2024-01-01")
+
+    repo.upsert([_rule(f"10.0.0.{i}") for i in range(50)], now=day0)
+    repo.upsert([_rule(f"10.0.1.{i}") for i in range(20)], now=day0 + pd.Timedelta(days=2))
+
+    # Only the first batch is a day old
+    assert repo.due(day0 + pd.Timedelta(days=1)) == 50
+    assert repo.sweep(day0 + pd.Timedelta(days=1), batch_size=16) == {"decayed": 50, "expired": 0}
+    assert repo.sweep(day0 + pd.Timedelta(days=1, hours=12)) == {"decayed": 0, "expired": 0}
+
+    # 0.9 * e^-0.1d < 0.5 from day 6 on
+    assert repo.sweep(day0 + pd.Timedelta(days=6)) == {"decayed": 70, "expired": 50}
+    assert repo.count("expired") == 50
+    assert repo.due(day0 + pd.Timedelta(days=365)) == 20
+
+    expired = repo.rules(status="expired", limit=1)[0]
+    assert expired["age_days"] == 6
+    assert expired["confidence_decayed"] == round(0.9 * np.exp(-0.6), 4)
+
+    # A new detection reopens an expired rule
+    repo.upsert([_rule("10.0.0.0")], now=day0 + pd.Timedelta(days=7))
+    assert repo.get("rate_limit:10.0.0.0:/login")["status"] == "proposed"
+
+
+def _archived_events(n=6_000):
+    # ~20 events/s: spans several hour partitions
+    return FeatureExtractor().events_to_df(synthetic_events(n, n_ips=50, events_per_sec=0.5))
+
+
+def test_event_archive_prunes_filters_and_projects(tmp_path):
+    events = _archived_events()
+    archive = EventArchive(tmp_path / "archive")
+    assert archive.append(events.iloc[:4_000]) == 4_000
+    assert archive.append(events.iloc[4_000:]) == 2_000
+
+    hours = [p.name for p in (tmp_path / "archive").iterdir() if p.is_dir()]
+    assert len(hours) > 1
+    assert archive.count() == len(events)
+
+    # Reopened: codes decode through the persisted dictionary
+    archive = EventArchive(tmp_path / "archive")
+    full = archive.read()
+    assert (full["uri_path"].astype(object).to_numpy() == events["uri_path"].to_numpy()).all()
+    assert (full["timestamp"].to_numpy() == events["timestamp"].to_numpy(dtype="M8[ns]")).all()
+
+    start, end = events["timestamp"].iloc[1_000], events["timestamp"].iloc[5_000]
+    endpoints = events["uri_path"].iloc[:3].tolist()
+    expected = events[
+        (events["timestamp"] >= start) & (events["timestamp"] < end)
+        & events["uri_path"].isin(endpoints) & (events["status_code"] == 200)
+    ]
+    subset = archive.read(start, end, columns=["timestamp", "src_ip"], endpoints=endpoints, status=[200])
+    assert list(subset.columns) == ["timestamp", "src_ip"]
+    assert (subset["src_ip"].astype(object).to_numpy() == expected["src_ip"].to_numpy()).all()
+
+    assert archive.read(endpoints=["/never-seen"]).empty
+    # Whole hours before the first selected one are never opened
+    assert archive.count(start=end) < archive.count()
+
+    removed = archive.prune(end)
+    assert removed > 0 and archive.count() == len(events) - removed
+    assert archive.time_range()[0] >= end.floor("1h")
+
+
+def test_event_archive_streams_training_features(tmp_path):
+    events = _archived_events()
+    archive = EventArchive(tmp_path / "archive", compress=False)
+    archive.append(events)
+
+    expected = FeatureExtractor().extract_frame(events.copy())["ml_features"]
+
+    extractor = FeatureExtractor(encoders=archive.encoders)
+    stream = StreamingFeatureExtractor(extractor)
+    parts = [
+        stream.update(frame)["ml_features"]
+        for frame in archive.scan(columns=extractor.input_columns)
+    ]
+    streamed = pd.concat(parts)
+
+    cols = [c for c in expected.columns if c != "endpoint_rarity"]
+    np.testing.assert_allclose(
+        streamed[cols].to_numpy(), expected[cols].to_numpy(), rtol=1e-6, atol=1e-6
+    )
+
+
+def test_event_archive_keeps_late_events_of_its_last_second(tmp_path):
+    # One-second log timestamps: the last events share one second
+    events = _archived_events().iloc[:1_000].copy()
+    events["timestamp"] = events["timestamp"].dt.floor("s")
+    last = events["timestamp"].iloc[-6]
+    events.loc[events.index[-5:], "timestamp"] = last
+    events.iloc[-2] = events.iloc[-3]  # a repeated request
+
+    archive = EventArchive(tmp_path / "archive")
+    # An earlier run saw the log up to the first events of that second
+    archive.append(archive.unarchived(events.iloc[:-2]))
+
+    # The reread log has two more events in that second (one identical to
+    # an archived row) and a later one
+    log = pd.concat(
+        [events, events.iloc[[-1]].assign(timestamp=last + pd.Timedelta(seconds=1))],
+        ignore_index=True,
+    )
+    new = archive.unarchived(log)
+    assert len(new) == 3
+    archive.append(new)
+    assert archive.count() == len(log)
+    assert len(archive.unarchived(log)) == 0
+
+
+def test_event_archive_reopens_a_dictionary_past_the_caps(tmp_path, monkeypatch):
+    # Dictionaries far smaller than what the archive holds: the archive
+    # keeps every value exactly, however often it is reopened
+    monkeypatch.setitem(MAX_DICTIONARY_SIZES, "src_ip", 10)
+    monkeypatch.setitem(MAX_DICTIONARY_SIZES, "uri_path", 5)
+    events = _archived_events(3_000)
+    reader = EventArchive(tmp_path / "archive")
+
+    # One run per restart, each appending what the reread log adds
+    for end in (1_000, 2_000, 3_000):
+        archive = EventArchive(tmp_path / "archive")
+        archive.append(archive.unarchived(events.iloc[:end]))
+
+    reopened = EventArchive(tmp_path / "archive")
+    assert len(reopened.encoders["src_ip"]) == events["src_ip"].nunique()
+    assert len(reopened.unarchived(events)) == 0
+
+    # Opened before the other writers: picks up their codes as stored
+    for archive in (reopened, reader):
+        full = archive.read()
+        assert (full["src_ip"].astype(object).to_numpy() == events["src_ip"].to_numpy()).all()
+        assert (full["uri_path"].astype(object).to_numpy() == events["uri_path"].to_numpy()).all()
+        assert sum(len(part) for part in archive.scan(columns=["src_ip"])) == len(events)
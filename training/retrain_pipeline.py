@@ -0,0 +1,251 @@
+# training/retrain_pipeline.py
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+
+from anomaly_detection.isolation_forest import IsolationForestModel
+from anomaly_detection.thresholds import AdaptiveThresholds
+from storage.models import ModelRegistry
+from training.train_anomaly_model import split_holdout, train_isolation_forest, validate_model
+from training.train_baseline import train_baseline
+from utils.metrics import METRICS
+
+
+RETRAINS = METRICS.counter(
+    "waf_retrains_total", "Out-of-process refits by outcome", ("result",)
+)
+
+
+# ------------------------------
+# Worker side
+# ------------------------------
+def _init_worker(nice: int):
+    # Below the scoring process: a refit only gets otherwise idle CPU
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _retrain(
+    history: pd.DataFrame,
+    live_model: Optional[IsolationForestModel],
+    baseline: Dict[str, Dict[str, float]],
+    thresholds: Optional[AdaptiveThresholds],
+    registry_root: Optional[str],
+    trigger: Optional[str],
+    params: dict,
+    holdout_fraction: float,
+    validation: dict,
+    baseline_alpha: float,
+    metadata: dict,
+) -> dict:
+    """Fit on the older rows, validate on the newest, publish if it passes"""
+    train, holdout = split_holdout(history, holdout_fraction)
+    model = train_isolation_forest(train, **params)
+    report = validate_model(model, holdout, live_model=live_model, **validation)
+
+    # Drift means the baseline itself is stale: rebuild it from the
+    # recent window instead of nudging it, or the trigger keeps firing
+    baseline = train_baseline(
+        history, previous=None if trigger == "drift" else baseline, alpha=baseline_alpha
+    )
+
+    version = None
+    if report["passed"] and registry_root is not None:
+        version = ModelRegistry(registry_root).publish(
+            model,
+            baseline,
+            feature_names=list(history.columns),
+            metadata={**metadata, "trigger": trigger, "rows": len(train), "validation": report},
+            thresholds=thresholds,
+        )
+
+    return {
+        "model": model if report["passed"] else None,
+        "baseline": baseline if report["passed"] else None,
+        "version": version,
+        "trigger": trigger,
+        "report": report,
+    }
+
+
+# ------------------------------
+# Service
+# ------------------------------
+class RetrainService:
+    """
+    Runs Isolation Forest refits in a separate, lower-priority process.
+
+    submit() hands a history snapshot to a single worker process and
+    returns at once; the fit (single-threaded by default), the baseline
+    update (rebuilt from the window on a drift trigger, EMA-updated with
+    baseline_alpha otherwise), the holdout validation (validate_model on
+    the newest rows) and the registry publish all happen there. When a
+    model passes, on_done receives it and its baseline in a background
+    thread - ScoringService swaps them in by replacing references, so
+    scoring never waits for a refit.
+
+    CPU taken from the scoring process is bounded: one refit at a time,
+    n_jobs threads at `nice` priority, and at least `cooldown` seconds
+    between refits (a rejected model does not trigger a refit loop).
+    """
+
+    def __init__(
+        self,
+        registry: Optional[ModelRegistry] = None,
+        holdout_fraction: float = 0.2,
+        n_jobs: int = 1,
+        nice: int = 10,
+        cooldown: float = 600.0,
+        validation: Optional[dict] = None,
+        baseline_alpha: float = 0.1,
+        mp_context: Optional[str] = None,
+    ):
+        """
+        validation: keyword arguments for validate_model (threshold,
+        max_alert_rate, ...)
+        mp_context: multiprocessing start method. Defaults to fork where
+        available (the run_* scripts have no __main__ guard); start()
+        forks the worker early, before the caller starts any threads.
+        """
+        self.registry = registry
+        self.holdout_fraction = holdout_fraction
+        self.n_jobs = n_jobs
+        self.nice = nice
+        self.cooldown = cooldown
+        self.validation = validation or {}
+        self.baseline_alpha = baseline_alpha
+        if mp_context is None:
+            mp_context = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        self.mp_context = mp_context
+
+        self.last_report = None
+        self._executor = None
+        self._future: Optional[Future] = None
+        self._finished_at = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self) -> "RetrainService":
+        """Start the worker process now rather than on the first refit"""
+        self._pool().submit(os.getpid).result()
+        return self
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    # ------------------------------
+    # Refits
+    # ------------------------------
+    @property
+    def busy(self) -> bool:
+        return self._future is not None and not self._future.done()
+
+    def ready(self) -> bool:
+        """No refit running and the cooldown since the last one is over"""
+        if self.busy:
+            return False
+        return self._finished_at is None or time.monotonic() - self._finished_at >= self.cooldown
+
+    def submit(
+        self,
+        history: pd.DataFrame,
+        live_model: Optional[IsolationForestModel],
+        baseline: Dict[str, Dict[str, float]],
+        thresholds: Optional[AdaptiveThresholds] = None,
+        trigger: Optional[str] = None,
+        metadata: Optional[dict] = None,
+        on_done: Optional[Callable[[dict], None]] = None,
+    ) -> bool:
+        """
+        Start a refit on history; False if one is running or the
+        cooldown is not over. metadata is added to the published
+        version's manifest. on_done(result) runs when it finished,
+        result = {model, baseline (both None if rejected), version,
+        trigger, report}.
+        """
+        with self._lock:
+            if not self.ready():
+                return False
+
+            params = {"n_jobs": self.n_jobs}
+            if live_model is not None:
+                live_params = live_model.model.get_params()
+                params.update(
+                    n_estimators=live_params["n_estimators"],
+                    contamination=live_params["contamination"],
+                    random_state=live_params["random_state"],
+                )
+
+            future = self._pool().submit(
+                _retrain,
+                history,
+                live_model,
+                baseline,
+                thresholds,
+                str(self.registry.root) if self.registry is not None else None,
+                trigger,
+                params,
+                self.holdout_fraction,
+                self.validation,
+                self.baseline_alpha,
+                metadata or {},
+            )
+            self._future = future
+
+        future.add_done_callback(lambda f: self._finish(f, on_done))
+        return True
+
+    def wait(self, timeout: Optional[float] = None):
+        future = self._future
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+            # Callbacks run right after the result is set
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while self._finished_at is None or self.busy:
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+                time.sleep(0.01)
+
+    def _finish(self, future: Future, on_done: Optional[Callable[[dict], None]]):
+        try:
+            result = future.result()
+        except Exception as exc:  # a crashed fit never takes scoring down
+            result = {"model": None, "baseline": None, "version": None, "trigger": None,
+                      "report": {"passed": False, "reason": f"error: {exc!r}"}}
+
+        self.last_report = result["report"]
+        RETRAINS.labels("published" if result["model"] is not None else "rejected").inc()
+        try:
+            if on_done is not None:
+                on_done(result)
+        finally:
+            self._finished_at = time.monotonic()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context(self.mp_context),
+                initializer=_init_worker,
+                initargs=(self.nice,),
+            )
+        return self._executor
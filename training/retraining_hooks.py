@@ -1,4 +1,8 @@
+import json
+import os
 from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
 
 
 class RetrainingHooks:
@@ -7,11 +11,26 @@ class RetrainingHooks:
         max_fp_rate: float = 0.2,
         drift_threshold: float = 0.4,
         retrain_interval_days: int = 7,
+        path=None,
     ):
+        """
+        path: JSON file keeping the hook state (last retrain, its
+        trigger), so the retrain interval survives process restarts;
+        None keeps it in memory only
+        """
         self.max_fp_rate = max_fp_rate
         self.drift_threshold = drift_threshold
         self.retrain_interval = timedelta(days=retrain_interval_days)
+        self.path = Path(path) if path is not None else None
         self.last_retrain = None
+        self.last_trigger = None
+
+        if self.path is not None and self.path.exists():
+            with open(self.path) as f:
+                state = json.load(f)
+            if state.get("last_retrain"):
+                self.last_retrain = datetime.fromisoformat(state["last_retrain"])
+            self.last_trigger = state.get("last_trigger")
 
     def should_retrain(
         self,
@@ -19,21 +38,51 @@ class RetrainingHooks:
         avg_baseline_score: float,
         now: datetime = None,
     ) -> bool:
+        return self.trigger(fp_rate, avg_baseline_score, now) is not None
+
+    def trigger(
+        self,
+        fp_rate: float,
+        avg_baseline_score: float,
+        now: datetime = None,
+    ) -> Optional[str]:
+        """
+        Why a retrain is due (fp_rate / drift / cold_start / interval),
+        None if it is not
+        """
         now = now or datetime.utcnow()
 
         if fp_rate > self.max_fp_rate:
-            return True
+            return "fp_rate"
 
         if avg_baseline_score > self.drift_threshold:
-            return True
+            return "drift"
 
         if self.last_retrain is None:
-            return True
+            return "cold_start"
 
         if now - self.last_retrain > self.retrain_interval:
-            return True
+            return "interval"
+
+        return None
+
+    def mark_retrained(self, trigger: Optional[str] = None, now: datetime = None):
+        self.last_retrain = now or datetime.utcnow()
+        self.last_trigger = trigger
+        self._save()
 
-        return False
+    def _save(self):
+        if self.path is None:
+            return
 
-    def mark_retrained(self):
-        self.last_retrain = datetime.utcnow()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "last_retrain": self.last_retrain.isoformat() if self.last_retrain else None,
+                    "last_trigger": self.last_trigger,
+                },
+                f,
+            )
+        os.replace(tmp, self.path)
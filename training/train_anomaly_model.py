@@ -0,0 +1,82 @@
+# training/train_anomaly_model.py
+
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from anomaly_detection.isolation_forest import IsolationForestModel
+
+
+def split_holdout(ml_features: pd.DataFrame, fraction: float = 0.2) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Time-ordered split: the most recent rows are the holdout, so a
+    model is validated on traffic it has not seen, like in production
+    """
+    n_holdout = int(len(ml_features) * fraction)
+    cut = len(ml_features) - n_holdout
+    return ml_features.iloc[:cut], ml_features.iloc[cut:]
+
+
+def train_isolation_forest(
+    ml_features: pd.DataFrame,
+    n_estimators: int = 200,
+    contamination: float = 0.02,
+    random_state: int = 42,
+    n_jobs: Optional[int] = None,
+) -> IsolationForestModel:
+    model = IsolationForestModel(
+        n_estimators=n_estimators,
+        contamination=contamination,
+        random_state=random_state,
+    )
+    if n_jobs is not None:
+        model.model.set_params(n_jobs=n_jobs)
+    model.fit(ml_features)
+    return model
+
+
+def validate_model(
+    model: IsolationForestModel,
+    holdout: pd.DataFrame,
+    live_model: Optional[IsolationForestModel] = None,
+    threshold: float = 0.75,
+    max_alert_rate: float = 0.1,
+    max_alert_rate_ratio: float = 2.0,
+    min_score_std: float = 1e-3,
+) -> dict:
+    """
+    Holdout checks a refit must pass before it goes live:
+      - finite scores that still spread (not a collapsed calibration)
+      - alert rate (score > threshold) at most max_alert_rate
+      - with a live model, at most max_alert_rate_ratio times its alert
+        rate on the same rows (plus one point of slack)
+    Returns a report with "passed" and, if not, the failed "reason".
+    """
+    report = {"passed": False, "reason": None, "rows": len(holdout)}
+    if len(holdout) == 0:
+        report["reason"] = "empty_holdout"
+        return report
+
+    scores = model.score(holdout).to_numpy(dtype=np.float64)
+    report["alert_rate"] = float(np.mean(scores > threshold)) if np.isfinite(scores).all() else None
+    report["score_std"] = float(np.std(scores))
+
+    if live_model is not None:
+        live_scores = live_model.score(holdout).to_numpy(dtype=np.float64)
+        report["live_alert_rate"] = float(np.mean(live_scores > threshold))
+
+    if report["alert_rate"] is None:
+        report["reason"] = "non_finite_scores"
+    elif report["score_std"] < min_score_std:
+        report["reason"] = "degenerate_scores"
+    elif report["alert_rate"] > max_alert_rate:
+        report["reason"] = "alert_rate"
+    elif live_model is not None and (
+        report["alert_rate"] > max_alert_rate_ratio * report["live_alert_rate"] + 0.01
+    ):
+        report["reason"] = "alert_rate_vs_live"
+    else:
+        report["passed"] = True
+
+    return report
@@ -0,0 +1,27 @@
+# training/train_baseline.py
+
+import copy
+from typing import Dict, Optional
+
+import pandas as pd
+
+from baseline.baseline_trainer import BaselineTrainer
+
+
+def train_baseline(
+    ml_features: pd.DataFrame,
+    previous: Optional[Dict[str, Dict[str, float]]] = None,
+    alpha: float = 0.1,
+) -> Dict[str, Dict[str, float]]:
+    """
+    Baseline for a refit: the previous baseline updated adaptively with
+    the new rows, or a fresh one when there is none (previous is left
+    untouched)
+    """
+    trainer = BaselineTrainer()
+    if previous:
+        trainer.baseline = copy.deepcopy(previous)
+        trainer.update(ml_features, alpha=alpha)
+    else:
+        trainer.fit(ml_features)
+    return trainer.get_baseline()
@@ -0,0 +1,43 @@
+# utils/logger.py
+
+import logging
+import os
+import sys
+
+from utils.metrics import METRICS, MetricsRegistry
+
+
+def get_logger(name: str = "waf") -> logging.Logger:
+    """
+    Logger printing "[LEVEL] message" to stdout like the pipeline
+    scripts; level from WAF_LOG_LEVEL (default INFO)
+    """
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(os.environ.get("WAF_LOG_LEVEL", "INFO").upper())
+        logger.propagate = False
+    return logger
+
+
+def log_stage_summary(logger: logging.Logger, registry: MetricsRegistry = METRICS):
+    """One line per instrumented stage: calls, seconds, rows/s"""
+    if not registry.enabled:
+        return
+
+    stages = {}
+    for name, labels, value in registry.snapshot():
+        field = {
+            "waf_stage_seconds_sum": "seconds",
+            "waf_stage_seconds_count": "calls",
+            "waf_stage_rows_total": "rows",
+        }.get(name)
+        if field:
+            stages.setdefault(labels["stage"], {})[field] = value
+
+    for stage, s in sorted(stages.items(), key=lambda item: -item[1].get("seconds", 0.0)):
+        seconds, n = s.get("seconds", 0.0), s.get("rows", 0)
+        rate = f"{n / seconds:,.0f} rows/s" if seconds and n else "-"
+        logger.info(f"stage {stage:<24} {int(s.get('calls', 0)):>6} calls {seconds:>9.3f}s  {rate}")
@@ -0,0 +1,326 @@
+# utils/metrics.py
+
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# Seconds: sub-ms request scoring up to multi-minute batch stages
+TIME_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0,
+)
+# Rows / events per batch
+SIZE_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+# ------------------------------
+# Metric types
+# ------------------------------
+class _Metric:
+    """
+    A metric family; label values select a child (cached, so hot paths
+    resolve it once). Every update first checks registry.enabled, which
+    is all a disabled metric costs.
+    """
+
+    kind = ""
+
+    def __init__(self, registry: "MetricsRegistry", name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._child())
+        return child
+
+    def _child(self):
+        raise NotImplementedError
+
+    def _default(self):
+        return self.labels()
+
+    def samples(self) -> List[Tuple[str, dict, float]]:
+        out = []
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            out += [(self.name + suffix, {**labels, **extra}, value) for suffix, extra, value in child.samples()]
+        return out
+
+
+class _CounterChild:
+    def __init__(self, registry):
+        self._registry = registry
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, n: float = 1.0):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._value += n
+
+    def samples(self):
+        return [("", {}, self._value)]
+
+
+class _GaugeChild:
+    def __init__(self, registry):
+        self._registry = registry
+        self._value = 0.0
+        self._fn: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        if self._registry.enabled:
+            self._value = float(value)
+
+    def set_function(self, fn: Callable[[], float]):
+        """Evaluated at collection time only: free on the hot path"""
+        self._fn = fn
+
+    def samples(self):
+        value = self._value
+        if self._fn is not None:
+            try:
+                value = float(self._fn())
+            except Exception:
+                value = float("nan")
+        return [("", {}, value)]
+
+
+class _HistogramChild:
+    def __init__(self, registry, bounds):
+        self._registry = registry
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        if not self._registry.enabled:
+            return
+        i = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def samples(self):
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+
+        out, cumulative = [], 0
+        for bound, count in zip(self._bounds + (float("inf"),), counts):
+            cumulative += count
+            out.append(("_bucket", {"le": _format_le(bound)}, cumulative))
+        out.append(("_sum", {}, total))
+        out.append(("_count", {}, cumulative))
+        return out
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterChild(self.registry)
+
+    def inc(self, n: float = 1.0):
+        self._default().inc(n)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeChild(self.registry)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, fn: Callable[[], float]):
+        self._default().set_function(fn)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        super().__init__(registry, name, help, labelnames)
+        self.buckets = tuple(float(b) for b in sorted(buckets))
+
+    def _child(self):
+        return _HistogramChild(self.registry, self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+
+# ------------------------------
+# Registry
+# ------------------------------
+class MetricsRegistry:
+    """
+    Process-wide metric families. Disabled (WAF_METRICS=0, or
+    enabled=False) every update returns immediately.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=TIME_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(self, name, help, labelnames, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metric {name} already registered as a {metric.kind}")
+        return metric
+
+    def collect(self) -> List[_Metric]:
+        return list(self._metrics.values())
+
+    def snapshot(self) -> List[Tuple[str, dict, float]]:
+        """Flat (sample name, labels, value) list, as in the text format"""
+        return [sample for metric in self.collect() for sample in metric.samples()]
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        lines = []
+        for metric in self.collect():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_le(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def histogram_quantile(q: float, buckets: List[Tuple[float, float]]) -> Optional[float]:
+    """
+    Quantile estimate from cumulative (upper bound, count) buckets,
+    interpolating linearly inside the bucket (as PromQL does)
+    """
+    buckets = sorted(buckets)
+    if not buckets or buckets[-1][1] == 0:
+        return None
+
+    rank = q * buckets[-1][1]
+    lower, below = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == float("inf"):
+                return lower
+            if count == below:
+                return bound
+            return lower + (bound - lower) * (rank - below) / (count - below)
+        lower, below = bound, count
+    return lower
+
+
+# ------------------------------
+# Process-wide registry and pipeline metrics
+# ------------------------------
+METRICS = MetricsRegistry(enabled=os.environ.get("WAF_METRICS", "1") != "0")
+
+STAGE_SECONDS = METRICS.histogram(
+    "waf_stage_seconds", "Wall time per pipeline stage call", ("stage",)
+)
+STAGE_ROWS = METRICS.counter(
+    "waf_stage_rows_total", "Rows processed per pipeline stage", ("stage",)
+)
+READ_BYTES = METRICS.counter("waf_reader_bytes_total", "Bytes read from access logs")
+READ_EVENTS = METRICS.counter("waf_reader_events_total", "Events parsed from access logs")
+
+
+def _max_rss_bytes() -> float:
+    if resource is None:
+        return float("nan")
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return float(rss if sys.platform == "darwin" else rss * 1024)
+
+
+METRICS.gauge("waf_process_max_rss_bytes", "Peak resident set size of this process").set_function(_max_rss_bytes)
+
+
+def instrumented(stage: str):
+    """
+    Decorator for stage entry points: observes the call's wall time and
+    counts rows as the length of the first sized argument after self.
+    """
+    seconds = STAGE_SECONDS.labels(stage)
+    rows = STAGE_ROWS.labels(stage)
+
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not METRICS.enabled:
+                return fn(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                seconds.observe(time.perf_counter() - start)
+                rows.inc(_rows(args[1:], kwargs))
+
+        return wrapper
+
+    return decorate
+
+
+def _rows(args, kwargs) -> int:
+    for value in (*args, *kwargs.values()):
+        if hasattr(value, "__len__") and not isinstance(value, (str, bytes, dict)):
+            return len(value)
+    return 0